@@ -0,0 +1,186 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import config
+import metrics
+
+
+class AttachmentCache:
+    """
+    Content-addressed cache for downloaded attachments.
+
+    Files are stored once under the SHA-256 of their content, with the
+    extracted text memoized next to them (`<hash>.txt`). A small SQLite index
+    maps a Drive file ID plus its version (md5Checksum, or modifiedTime for
+    files without one) to the stored content, so a re-sync or resubmission of
+    an unchanged file only costs the metadata request.
+    """
+    def __init__(self, directory=config.RESUME_CV_DIR,
+                 max_bytes=config.ATTACHMENT_CACHE_MAX_BYTES,
+                 max_age_days=config.ATTACHMENT_CACHE_MAX_AGE_DAYS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 3600
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(
+            os.path.join(directory, 'cache_index.sqlite3'),
+            timeout=config.SQLITE_BUSY_TIMEOUT,
+            check_same_thread=False
+        )
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "content_hash TEXT PRIMARY KEY, extension TEXT, size INTEGER, last_used REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "file_id TEXT, version TEXT, content_hash TEXT, PRIMARY KEY (file_id, version))"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_hash ON files (content_hash)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_used ON blobs (last_used)")
+
+    def _blob_path(self, content_hash, extension):
+        return os.path.join(self.directory, f"{content_hash}.{extension}")
+
+    def _text_path(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.txt")
+
+    def lookup(self, file_id, version):
+        """
+        Look up a Drive file version.
+
+        Returns:
+            dict with 'content_hash', 'local_path' and 'extracted_text' (None if
+            the text was not memoized yet), or None on a cache miss
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT b.content_hash, b.extension FROM files f "
+                "JOIN blobs b ON b.content_hash = f.content_hash "
+                "WHERE f.file_id = ? AND f.version = ?",
+                (file_id, version)
+            ).fetchone()
+            if not row:
+                metrics.inc('cache_requests_total', cache='attachment', result='miss')
+                return None
+            content_hash, extension = row
+            path = self._blob_path(content_hash, extension)
+            if not os.path.exists(path):
+                # Removed from disk behind our back, forget it
+                with self.conn:
+                    self.conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+                    self.conn.execute("DELETE FROM files WHERE content_hash = ?", (content_hash,))
+                metrics.inc('cache_requests_total', cache='attachment', result='miss')
+                return None
+            metrics.inc('cache_requests_total', cache='attachment', result='hit')
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE blobs SET last_used = ? WHERE content_hash = ?",
+                    (time.time(), content_hash)
+                )
+
+        extracted_text = None
+        text_path = self._text_path(content_hash)
+        if os.path.exists(text_path):
+            with open(text_path, 'r', encoding='utf-8') as f:
+                extracted_text = f.read()
+
+        return {'content_hash': content_hash, 'local_path': path, 'extracted_text': extracted_text}
+
+    def store(self, file_id, version, content, extension):
+        """
+        Store downloaded content for a Drive file version.
+
+        Returns:
+            tuple (content_hash, local_path)
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(content_hash, extension)
+
+        if not os.path.exists(path):
+            # Write to a temporary name first so readers never see half a file
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        self._index(file_id, version, content_hash, extension, len(content))
+        self.evict()
+        return content_hash, path
+
+    def store_file(self, file_id, version, filepath, extension):
+        """
+        Move a file downloaded to disk into the cache for a Drive file version.
+
+        The file is hashed in chunks, so it never has to fit in memory.
+
+        Returns:
+            tuple (content_hash, local_path)
+        """
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(config.DOWNLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        path = self._blob_path(content_hash, extension)
+
+        if os.path.exists(path):
+            os.remove(filepath)
+        else:
+            os.replace(filepath, path)
+
+        self._index(file_id, version, content_hash, extension, os.path.getsize(path))
+        self.evict()
+        return content_hash, path
+
+    def _index(self, file_id, version, content_hash, extension, size):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO blobs (content_hash, extension, size, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (content_hash) DO UPDATE SET last_used = excluded.last_used",
+                (content_hash, extension, size, time.time())
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, version, content_hash) VALUES (?, ?, ?)",
+                (file_id, version, content_hash)
+            )
+
+    def store_text(self, content_hash, text):
+        """Memoize the extracted text of a stored file."""
+        text_path = self._text_path(content_hash)
+        tmp_path = f"{text_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, text_path)
+
+    def _remove(self, content_hash, extension):
+        for path in (self._blob_path(content_hash, extension), self._text_path(content_hash)):
+            if os.path.exists(path):
+                os.remove(path)
+        self.conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+        self.conn.execute("DELETE FROM files WHERE content_hash = ?", (content_hash,))
+
+    def evict(self):
+        """Drop entries unused for longer than max_age, then least recently used ones above max_bytes."""
+        with self.lock, self.conn:
+            expired = self.conn.execute(
+                "SELECT content_hash, extension FROM blobs WHERE last_used < ?",
+                (time.time() - self.max_age,)
+            ).fetchall()
+            for content_hash, extension in expired:
+                self._remove(content_hash, extension)
+
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for content_hash, extension, size in self.conn.execute(
+                "SELECT content_hash, extension, size FROM blobs ORDER BY last_used"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._remove(content_hash, extension)
+                total -= size
@@ -0,0 +1,571 @@
+"""
+Offline end-to-end benchmark of the pipeline.
+
+Google Sheets, Google Drive and the LLM endpoint are replaced by local
+stand-ins, so runs are repeatable and cost nothing:
+
+- a fake gspread client whose worksheets serve N synthetic form rows
+- a fake Drive service serving generated PDF resumes and DOCX/PDF answer
+  files of a set size, downloaded through the real drive_download engine
+- an OpenAI-compatible HTTP stub (own process) with configurable latency
+  and error rate, answering the structured, chained and streamed prompts
+
+Every candidate count runs in a fresh process and working directory, through
+process_responses, the question stage, process_answer_responses and the
+evaluation stage. The report has the wall time and throughput of each stage,
+p50/p99 latency of each operation (from the metrics module's observations)
+and peak RSS.
+
+Usage:
+    python benchmark.py --candidates 10 100 10000 --llm-latency 0.2 --output run.json
+    python benchmark.py --candidates 100 --compare run.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+POSITIONS = ['Backend Engineer', 'Data Analyst', 'Product Designer', 'QA Engineer', 'Marketing Staff']
+WORDS = ('python django postgres kubernetes analytics dashboard customer migration pipeline '
+         'testing automation design research roadmap stakeholder reporting optimisation '
+         'integration deployment monitoring leadership mentoring budget campaign').split()
+SECTIONS = ['Summary', 'Experience', 'Skills', 'Projects', 'Education', 'Certifications', 'Interests']
+LINES_PER_PAGE = 45
+QUESTION_COUNT = 5
+
+
+# Synthetic documents
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def resume_pages(seed, pages):
+    """Text of a synthetic resume, one string per page, unique per seed."""
+    rng = random.Random(seed)
+    lines = [f"Candidate {seed}", f"candidate{seed}@example.com | Jakarta"]
+    while len(lines) < pages * LINES_PER_PAGE:
+        lines.append(rng.choice(SECTIONS))
+        lines.extend(_sentence(rng) for _ in range(rng.randint(4, 10)))
+    lines = lines[:pages * LINES_PER_PAGE]
+    return ['\n'.join(lines[i:i + LINES_PER_PAGE]) for i in range(0, len(lines), LINES_PER_PAGE)]
+
+
+def answer_paragraphs(seed):
+    rng = random.Random(f"answers-{seed}")
+    return [f"{number}. " + ' '.join(_sentence(rng) for _ in range(4)) for number in range(1, QUESTION_COUNT + 1)]
+
+
+def make_pdf(pages):
+    """Minimal text PDF, one page per string (Helvetica, one line per text line)."""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>']
+    kids = ' '.join(f'{3 + 2 * i} 0 R' for i in range(len(pages)))
+    objects.append(f'<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>')
+    font = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        lines = (line.replace('\\', '').replace('(', '').replace(')', '') for line in text.split('\n'))
+        stream = 'BT /F1 9 Tf 40 760 Td 11 TL ' + ' '.join(f'({line}) Tj T*' for line in lines) + ' ET'
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R '
+                       f'/Resources << /Font << /F1 {font} 0 R >> >> >>')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    objects.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    out = '%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n{obj}\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets)
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'
+    return out.encode('latin-1')
+
+
+def make_docx(paragraphs):
+    """Minimal DOCX holding one paragraph per string."""
+    body = ''.join(f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>' for text in paragraphs)
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{body}</w:body></w:document>')
+    content_types = ('<?xml version="1.0" encoding="UTF-8"?>'
+                     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="xml" ContentType="application/xml"/>'
+                     '<Override PartName="/word/document.xml" ContentType="application/'
+                     'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', content_types)
+        archive.writestr('word/document.xml', document)
+    return buffer.getvalue()
+
+
+# Google stand-ins
+
+class FakeWorksheet:
+    """The part of a gspread worksheet fetch_new_responses uses: title and batch_get."""
+    def __init__(self, title, header, rows):
+        self.title = title
+        self.rows = [header] + rows
+
+    def _cell(self, row):
+        return self.rows[row - 1][0] if 0 < row <= len(self.rows) and self.rows[row - 1] else None
+
+    def batch_get(self, ranges):
+        values = []
+        for cell_range in ranges:
+            if cell_range == '1:1':
+                values.append([self.rows[0]])
+            elif re.fullmatch(r'A\d+', cell_range):
+                value = self._cell(int(cell_range[1:]))
+                values.append([[value]] if value else [])
+            else:
+                first_row = int(re.fullmatch(r'A(\d+):ZZZ', cell_range).group(1))
+                values.append([list(row) for row in self.rows[first_row - 1:]])
+        return values
+
+
+class FakeSheetsClient:
+    def __init__(self, worksheets):
+        self.worksheets = {sheet.title: sheet for sheet in worksheets}
+
+    def open(self, name):
+        return self
+
+    def worksheet(self, title):
+        return self.worksheets[title]
+
+
+class _Response(dict):
+    """httplib2.Response look-alike: header dict with a status."""
+    def __init__(self, status, headers):
+        super().__init__(headers)
+        self.status = status
+
+
+class _Execute:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeDrive:
+    """
+    Drive v3 service serving generated files.
+
+    File ids are 'resume-<n>' (PDF) and 'answer-<n>' (answer_format). Media
+    requests answer HTTP Range requests, so drive_download fetches them in
+    DOWNLOAD_CHUNK_SIZE chunks as it would from Google.
+    """
+    def __init__(self, pages=2, answer_format='docx', latency=0.0):
+        self.pages = pages
+        self.answer_format = answer_format
+        self.latency = latency
+        self.uri = None
+        self.headers = {}
+        self.content = b''
+
+    def _file(self, file_id):
+        kind, seed = file_id.split('-', 1)
+        if kind == 'resume':
+            return 'application/pdf', lambda: make_pdf(resume_pages(seed, self.pages))
+        if self.answer_format == 'pdf':
+            return 'application/pdf', lambda: make_pdf(['\n'.join(answer_paragraphs(seed))])
+        return ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                lambda: make_docx(answer_paragraphs(seed)))
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields=None):
+        time.sleep(self.latency)
+        mime_type, _ = self._file(fileId)
+        return _Execute({'mimeType': mime_type, 'md5Checksum': fileId,
+                         'modifiedTime': '2025-01-01T00:00:00.000Z'})
+
+    def get_media(self, fileId):
+        _, build = self._file(fileId)
+        self.uri = f"https://www.googleapis.com/drive/v3/files/{fileId}?alt=media"
+        self.content = build()
+        # drive_download sends its range requests to request.http
+        return self
+
+    @property
+    def http(self):
+        return self
+
+    def request(self, uri, method='GET', headers=None, **kwargs):
+        time.sleep(self.latency)
+        start, end = (int(n) for n in re.match(r'bytes=(\d+)-(\d+)', headers['range']).groups())
+        chunk = self.content[start:end + 1]
+        headers = {'content-range': f"bytes {start}-{start + len(chunk) - 1}/{len(self.content)}"}
+        return _Response(206, headers), chunk
+
+
+@contextmanager
+def offline_services(worksheets, drive):
+    """Point the service container at the fake Sheets client and Drive service."""
+    import services
+
+    originals = (services.load_credentials, services.authorize_sheets, services.build_drive_service)
+    services.load_credentials = lambda: None
+    services.authorize_sheets = lambda creds: FakeSheetsClient(worksheets)
+    # One fake per thread, like the real (not thread-safe) Drive client
+    services.build_drive_service = lambda creds: FakeDrive(drive.pages, drive.answer_format, drive.latency)
+    services.reset()
+    try:
+        yield
+    finally:
+        services.load_credentials, services.authorize_sheets, services.build_drive_service = originals
+        services.reset()
+
+
+def form_rows(count):
+    """Header and rows of the form sheet and the answer sheet for `count` candidates."""
+    started = datetime(2025, 1, 1)
+    form_header = ['Timestamp', 'Email Address', 'Phone Number', 'Nama Lengkap',
+                   'Posisi Yang Diinginkan', 'Resume/CV']
+    answer_header = ['Timestamp', 'Email Address', 'Phone Number', 'Answer File']
+    form, answers = [], []
+    for n in range(count):
+        timestamp = (started + timedelta(seconds=n)).strftime('%m/%d/%Y %H:%M:%S')
+        email = f"candidate{n}@example.com"
+        phone = str(628100000000 + n)
+        form.append([timestamp, email, phone, f"Candidate {n}", POSITIONS[n % len(POSITIONS)],
+                     f"https://drive.google.com/open?id=resume-{n}"])
+        answered = (started + timedelta(days=1, seconds=n)).strftime('%m/%d/%Y %H:%M:%S')
+        answers.append([answered, email, phone, f"https://drive.google.com/open?id=answer-{n}"])
+    return (form_header, form), (answer_header, answers)
+
+
+# LLM stand-in
+
+def llm_reply(body):
+    """Plausible reply to one of the pipeline's prompts."""
+    messages = body['messages']
+    system, user = messages[0]['content'], messages[1]['content'] if len(messages) > 1 else ''
+    rng = random.Random(user)
+    commentary = ' '.join(_sentence(rng) for _ in range(6))
+    schema = ((body.get('response_format') or {}).get('json_schema') or {}).get('name')
+
+    if schema == 'interview_package':
+        questions = [f"{n}. Benchmark question {n} about {rng.choice(WORDS)}?" for n in range(1, QUESTION_COUNT + 1)]
+        return json.dumps({'commentary': commentary, 'questions': questions})
+    if schema == 'evaluation':
+        asked = re.search(r'<parsed_question>(.*?)</parsed_question>', user, re.DOTALL)
+        count = len(re.findall(r'Benchmark question', asked.group(1))) if asked else QUESTION_COUNT
+        scores = [rng.randint(40, 95) for _ in range(count or 1)]
+        return json.dumps({'commentary': commentary, 'per_question_scores': scores,
+                           'overall_score': sum(scores) / len(scores)})
+    if 'score the result' in system:
+        return f"[Score: {rng.randint(40, 95)}]"
+    if 'interview question' in system:
+        return '\n'.join(f"[{n}. Benchmark question {n} about {rng.choice(WORDS)}?]"
+                         for n in range(1, QUESTION_COUNT + 1)) + '\nGood luck with the interview!'
+    return commentary
+
+
+class _LLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the request (e.g. a hedged request that lost)
+            pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.error_rate:
+            self._send_json(random.choice([429, 500, 503]), {'error': {'message': 'benchmark error'}})
+            return
+
+        content = llm_reply(body)
+        if not body.get('stream'):
+            self._send_json(200, {
+                'id': 'benchmark', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for i in range(0, len(content), 16):
+                chunk = {'id': 'benchmark', 'object': 'chat.completion.chunk', 'created': 0, 'model': body['model'],
+                         'choices': [{'index': 0, 'delta': {'content': content[i:i + 16]}, 'finish_reason': None}]}
+                self.wfile.write(b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n')
+                self.wfile.flush()
+            self.wfile.write(b'data: [DONE]\n\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream
+            pass
+
+
+def serve_llm_stub(latency, error_rate, port_pipe):
+    """Run the OpenAI-compatible stub (target of its own process); sends the port back."""
+    handler = type('LLMHandler', (_LLMHandler,), {'latency': latency, 'error_rate': error_rate})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    port_pipe.send(server.server_port)
+    server.serve_forever()
+
+
+# Benchmark run
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children, in MB."""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def percentile(samples, quantile):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+
+@contextmanager
+def recording_observations():
+    """Collect every histogram observation of the metrics module, unbucketed."""
+    import metrics
+    samples = {}
+    lock = threading.Lock()
+    observe = metrics.observe
+
+    def record(name, value, **labels):
+        observe(name, value, **labels)
+        if name == 'llm_request_duration_seconds':
+            key = f"llm:{labels.get('prompt_type')}"
+        elif name == 'llm_queue_wait_seconds':
+            key = f"llm_wait:{labels.get('priority')}"
+        else:
+            key = labels.get('stage')
+        with lock:
+            samples.setdefault(key, []).append(value)
+
+    metrics.observe = record
+    try:
+        yield samples
+    finally:
+        metrics.observe = observe
+
+
+def wait_for_status(db, status, count, timeout):
+    """Poll until `count` responses reached `status`; returns how many did."""
+    deadline = time.monotonic() + timeout
+    reached = 0
+    while time.monotonic() < deadline:
+        reached = db.count_by_status().get(status, 0)
+        if reached >= count:
+            break
+        time.sleep(0.1)
+    return reached
+
+
+def run_benchmark(options):
+    """
+    Run the whole pipeline once for options['candidates'] candidates.
+
+    Must run in its own process and working directory: it changes config and
+    swaps the clients of the service container.
+
+    Returns:
+        dict with 'stages' (seconds, candidates/s, completed), 'operations'
+        (count, p50, p99 in seconds) and 'peak_rss_mb'
+    """
+    os.chdir(options['workdir'])
+    os.environ.setdefault('API_KEY', 'benchmark')
+    logging.basicConfig(level=options['log_level'], format="%(message)s")
+
+    import config
+    config.LLM_BASE_URL = options['llm_url']
+    config.LLM_REQUESTS_PER_MINUTE = options['llm_rpm']
+    if options['llm_in_flight']:
+        config.LLM_MAX_IN_FLIGHT = options['llm_in_flight']
+    # Measure throughput, not the daily budget
+    config.LLM_DAILY_REQUEST_BUDGET = None
+    config.LLM_DAILY_TOKEN_BUDGET = None
+
+    from datamanager import ResponseDB, STATUS_QUESTIONS_GENERATED, STATUS_EVALUATED
+    from googlesheetfetcher import process_responses, process_answer_responses
+    from pipeline import MainPipeline, AnswerPipeline
+
+    count = options['candidates']
+    (form_header, form), (answer_header, answers) = form_rows(count)
+    form_sheet = FakeWorksheet(config.RESPONSE_WORKSHEET_NAME, form_header, form)
+    answer_sheet = FakeWorksheet(config.ANSWER_WORKSHEET_NAME, answer_header, [])
+    drive = FakeDrive(options['pages'], options['answer_format'], options['drive_latency'])
+
+    stages = {}
+
+    @contextmanager
+    def stage(name):
+        started = time.perf_counter()
+        result = {'completed': count}
+        yield result
+        seconds = time.perf_counter() - started
+        stages[name] = {'seconds': round(seconds, 3), 'completed': result['completed'],
+                        'per_second': round(result['completed'] / seconds, 2) if seconds else None}
+        logger.info(f"⏱️ {name}: {seconds:.2f}s")
+
+    db = ResponseDB()
+    with offline_services([form_sheet, answer_sheet], drive), recording_observations() as samples:
+        with stage('ingest'):
+            process_responses(db)
+            db.flush()
+
+        with stage('questions') as result:
+            pipeline = MainPipeline(sync=False)
+            pipeline.start()
+            result['completed'] = wait_for_status(db, STATUS_QUESTIONS_GENERATED, count, options['timeout'])
+            pipeline.stop()
+
+        # Candidates answer once they have their questions
+        answer_sheet.rows.extend(answers)
+        with stage('answers'):
+            process_answer_responses(db)
+            db.flush()
+
+        with stage('evaluation') as result:
+            pipeline = AnswerPipeline(sync=False)
+            pipeline.start()
+            result['completed'] = wait_for_status(db, STATUS_EVALUATED, count, options['timeout'])
+            pipeline.stop()
+    db.close()
+
+    total = sum(stage['seconds'] for stage in stages.values())
+    stages['total'] = {'seconds': round(total, 3), 'completed': stages['evaluation']['completed'],
+                       'per_second': round(stages['evaluation']['completed'] / total, 2) if total else None}
+    own, children = peak_rss_mb()
+    return {
+        'candidates': count,
+        'stages': stages,
+        'operations': {
+            name: {'count': len(values), 'p50': round(percentile(values, 0.5), 4),
+                   'p99': round(percentile(values, 0.99), 4)}
+            for name, values in sorted(samples.items())
+        },
+        'peak_rss_mb': own,
+        'peak_rss_children_mb': children,
+    }
+
+
+def _run_in_child(options, result_pipe):
+    try:
+        result_pipe.send(run_benchmark(options))
+    except Exception as e:
+        logger.exception("Benchmark run failed")
+        result_pipe.send({'candidates': options['candidates'], 'error': str(e)})
+
+
+def run_isolated(options):
+    """run_benchmark in a fresh process and temporary directory, so peak RSS is per run."""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    with tempfile.TemporaryDirectory(prefix='resume-benchmark-') as workdir:
+        process = context.Process(target=_run_in_child, args=({**options, 'workdir': workdir}, sender))
+        process.start()
+        result = receiver.recv()
+        process.join()
+    return result
+
+
+def print_report(result, baseline=None):
+    print(f"\n📊 {result['candidates']} candidates")
+    if 'error' in result:
+        print(f"   ❌ failed: {result['error']}")
+        return
+
+    before = (baseline or {}).get('stages', {})
+    print(f"   {'stage':<12}{'seconds':>10}{'done':>8}{'cand/s':>10}")
+    for name, stage in result['stages'].items():
+        line = f"   {name:<12}{stage['seconds']:>10.2f}{stage['completed']:>8}{stage['per_second'] or 0:>10.2f}"
+        old = before.get(name, {}).get('per_second')
+        if old and stage['per_second']:
+            line += f"   ({stage['per_second'] / old - 1:+.0%} vs baseline)"
+        print(line)
+
+    print(f"   {'operation':<28}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, operation in result['operations'].items():
+        print(f"   {name:<28}{operation['count']:>8}{operation['p50'] * 1000:>10.1f}{operation['p99'] * 1000:>10.1f}")
+    print(f"   peak RSS: {result['peak_rss_mb']} MB (extraction workers {result['peak_rss_children_mb']} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against local stand-ins")
+    parser.add_argument("--candidates", type=int, nargs='+', default=[10, 100],
+                        help="Candidate counts to run, each in a fresh process (e.g. 10 100 10000)")
+    parser.add_argument("--pages", type=int, default=2, help="Pages per generated resume PDF")
+    parser.add_argument("--answer-format", choices=['docx', 'pdf'], default='docx')
+    parser.add_argument("--drive-latency", type=float, default=0.0, help="Seconds per fake Drive request")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mean seconds per stub LLM reply")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0,
+                        help="Fraction of stub LLM requests failing with 429/5xx")
+    parser.add_argument("--llm-rpm", type=float, default=60000, help="LLM_REQUESTS_PER_MINUTE for the run")
+    parser.add_argument("--llm-in-flight", type=int, default=None, help="LLM_MAX_IN_FLIGHT for the run")
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds to wait for each LLM stage")
+    parser.add_argument("--log-level", default='WARNING')
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare throughput with")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    stub = context.Process(target=serve_llm_stub, args=(args.llm_latency, args.llm_error_rate, sender), daemon=True)
+    stub.start()
+    llm_url = f"http://127.0.0.1:{receiver.recv()}/v1"
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {run['candidates']: run for run in json.load(f)['runs']}
+
+    options = {
+        'pages': args.pages, 'answer_format': args.answer_format, 'drive_latency': args.drive_latency,
+        'llm_url': llm_url, 'llm_rpm': args.llm_rpm, 'llm_in_flight': args.llm_in_flight,
+        'timeout': args.timeout, 'log_level': args.log_level,
+    }
+    runs = []
+    for count in args.candidates:
+        result = run_isolated({**options, 'candidates': count})
+        print_report(result, baseline.get(count))
+        runs.append(result)
+    stub.terminate()
+
+    if args.output:
+        settings = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'runs': runs}, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
@@ -0,0 +1,222 @@
+import re
+import unicodedata
+from collections import Counter
+import llm
+import config
+
+# Resume section headings (English and Indonesian), most important first.
+# When a resume is over budget, sections are kept in this order and the
+# rest is cut.
+SECTION_PRIORITY = [
+    ('experience', r'(work |professional )?experiences?|employment( history)?|work history|pengalaman( kerja)?|riwayat pekerjaan'),
+    ('skills', r'(technical |core )?skills|competenc(y|ies)|keahlian|keterampilan|kemampuan'),
+    ('projects', r'projects?|portfolio|proyek|projek|portofolio'),
+    ('summary', r'summary|profile|about me|objective|ringkasan|profil|tentang saya'),
+    ('education', r'education|academic background|pendidikan|riwayat pendidikan'),
+    ('certifications', r'certifications?|licen[cs]es|courses|training|sertifikasi|sertifikat|pelatihan|kursus'),
+    ('achievements', r'achievements?|awards?|honou?rs|prestasi|penghargaan'),
+    ('organizations', r'organi[sz]ations?|volunteer(ing)?|leadership|organisasi|kepanitiaan|relawan'),
+    ('languages', r'languages?|bahasa'),
+    ('interests', r'interests|hobbies|minat|hobi'),
+    ('references', r'references?|referensi'),
+]
+
+# Lines at the top or bottom of a page that may be a running header/footer
+PAGE_EDGE_LINES = 3
+
+# Lines like "Page 2 of 3", "- 2 -" or "2/3"
+PAGE_NUMBER_PATTERN = re.compile(r'^(page|halaman|hal\.?)?\s*[-–]?\s*\d{1,3}\s*((of|dari|/)\s*\d{1,3})?\s*[-–]?$', re.IGNORECASE)
+
+_heading_patterns = [
+    (name, re.compile(rf'^({pattern})\s*:?$', re.IGNORECASE))
+    for name, pattern in SECTION_PRIORITY
+]
+
+
+def strip_glyphs(text):
+    """Drop icon-font glyphs, bullets, control and zero-width characters."""
+    kept = []
+    for char in text:
+        if char in '\n\t':
+            kept.append(char)
+            continue
+        category = unicodedata.category(char)
+        if category in ('Co', 'Cf', 'Cc', 'Cs', 'So'):
+            # Private use (icon fonts), format/zero-width, control, symbols (bullets, stars)
+            kept.append(' ')
+        elif category.startswith('Z'):
+            kept.append(' ')
+        elif char in '•·▪◦‣⁃∙':
+            kept.append(' ')
+        else:
+            kept.append(char)
+    return ''.join(kept)
+
+
+def normalise_whitespace(text):
+    """Collapse runs of spaces, strip every line and drop blank lines."""
+    lines = (re.sub(r'[ \t]+', ' ', line).strip() for line in text.splitlines())
+    return [line for line in lines if line]
+
+
+def page_furniture(text):
+    """
+    Running headers and footers: lines (casefolded) among the first or last
+    PAGE_EDGE_LINES lines of at least two pages.
+
+    Pages are told apart by the form feed googlesheetfetcher puts between
+    PDF pages (PAGE_BREAK); text without one has no furniture. Section
+    headings are never furniture, a page may well start with one.
+    """
+    pages = text.split('\f')
+    if len(pages) < 2:
+        return set()
+    counts = Counter()
+    for page in pages:
+        lines = normalise_whitespace(strip_glyphs(page))
+        counts.update({line.casefold() for line in lines[:PAGE_EDGE_LINES] + lines[-PAGE_EDGE_LINES:]})
+    return {line for line, count in counts.items() if count >= 2 and section_name(line) is None}
+
+
+def drop_page_furniture(lines, furniture=frozenset()):
+    """Drop page numbers and every repeat of a running header/footer line (see page_furniture)."""
+    seen = set()
+    kept = []
+    for line in lines:
+        key = line.casefold()
+        if PAGE_NUMBER_PATTERN.match(line) or (key in furniture and key in seen):
+            continue
+        seen.add(key)
+        kept.append(line)
+    return kept
+
+
+def dedupe_lines(lines):
+    """Drop every repeat of a line seen before (used within a section)."""
+    seen = set()
+    kept = []
+    for line in lines:
+        key = line.casefold()
+        if key not in seen:
+            seen.add(key)
+            kept.append(line)
+    return kept
+
+
+def section_name(line):
+    """Name of the resume section this line is the heading of, or None."""
+    if len(line) > 40:
+        return None
+    for name, pattern in _heading_patterns:
+        if pattern.match(line):
+            return name
+    return None
+
+
+def split_sections(lines):
+    """
+    Split resume lines into sections at recognised headings.
+
+    Returns:
+        list of (section name, lines). The text before the first heading
+        (name, contact details) is the 'header' section.
+    """
+    sections = [('header', [])]
+    for line in lines:
+        name = section_name(line)
+        if name:
+            sections.append((name, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [(name, lines) for name, lines in sections if lines]
+
+
+def _priority(name):
+    if name == 'header':
+        return -1
+    names = [section for section, _ in SECTION_PRIORITY]
+    return names.index(name)
+
+
+def cut_line(line, max_tokens):
+    """
+    Longest prefix of `line` within `max_tokens`, cut at a word boundary if it has one.
+    '' if the prefix has no word in it (e.g. just a bullet marker).
+    """
+    max_chars = max(0, (max_tokens - 1) * 4)  # inverse of llm.estimate_tokens
+    if len(line) <= max_chars:
+        return line
+    head = line[:max_chars + 1]
+    if ' ' in head:
+        head = head.rsplit(' ', 1)[0]
+    head = head[:max_chars].rstrip()
+    return head if re.search(r'\w', head) else ''
+
+
+def truncate_by_priority(sections, max_tokens):
+    """
+    Keep sections in priority order until the token budget is used up.
+
+    The line that crosses the budget is cut at a word boundary, the rest of
+    its section and lower priority sections are dropped. The kept sections
+    stay in their original order. Non-empty input never comes back empty:
+    if nothing fits, the start of the first line is kept.
+    """
+    budget = max_tokens
+    kept = {}
+    for index in sorted(range(len(sections)), key=lambda i: _priority(sections[i][0])):
+        lines = []
+        for line in sections[index][1]:
+            cost = llm.estimate_tokens(line)
+            if cost > budget:
+                line = cut_line(line, budget)
+                if line:
+                    lines.append(line)
+                budget = 0
+                break
+            lines.append(line)
+            budget -= cost
+        # A heading whose content did not fit is dropped with it
+        if lines and (len(lines) > 1 or sections[index][0] == 'header'):
+            kept[index] = lines
+        if budget <= 0:
+            break
+    if not kept and sections:
+        # Not even one word fits: its start, however long the word is
+        first = sections[0][1][0]
+        word = re.match(r'\W*\w+', first)
+        start = (word.group() if word else first)[:max(4, (max_tokens - 1) * 4)]
+        return [cut_line(first, max(max_tokens, 2)) or start]
+    return [line for index in sorted(kept) for line in kept[index]]
+
+
+def compact_resume(text, max_tokens=None):
+    """
+    Shrink extracted resume text before it goes into a prompt.
+
+    Normalises whitespace, strips glyphs, drops running page headers/footers
+    and page numbers, splits the text into sections and drops lines repeated
+    within a section, then truncates by section priority to fit `max_tokens`.
+
+    Args:
+        text: extracted resume text
+        max_tokens: token budget (config.RESUME_TOKEN_BUDGET)
+
+    Returns:
+        tuple (compacted text, {'tokens_before', 'tokens_after', 'tokens_saved'})
+    """
+    if not text:
+        return text, {'tokens_before': 0, 'tokens_after': 0, 'tokens_saved': 0}
+
+    lines = drop_page_furniture(normalise_whitespace(strip_glyphs(text)), page_furniture(text))
+    sections = [(name, dedupe_lines(section)) for name, section in split_sections(lines)]
+    lines = truncate_by_priority(sections, max_tokens or config.RESUME_TOKEN_BUDGET)
+    compacted = '\n'.join(lines)
+
+    tokens_before = llm.estimate_tokens(text)
+    tokens_after = llm.estimate_tokens(compacted)
+    return compacted, {
+        'tokens_before': tokens_before,
+        'tokens_after': tokens_after,
+        'tokens_saved': tokens_before - tokens_after,
+    }
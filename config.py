@@ -1,9 +1,113 @@
 CREDENTIALS_FILE= 'credentials.json'
 SPREADSHEET_NAME = 'Test Form 2 (Responses)'
+RESPONSE_WORKSHEET_NAME = 'Form Responses 1'
+ANSWER_WORKSHEET_NAME = 'Form Response 2'
 OUTPUT_DIR='responses'
 RESUME_CV_DIR = 'resume_cv'
 ANSWERS_DIR = 'ans_attachments'
-DATABASE_FILE= 'responses_db.json'  # New config entry
+DATABASE_FILE= 'responses_db.json'  # Legacy TinyDB file, migrated into SQLite on first run
+STORAGE_BACKEND = 'sqlite'  # 'sqlite' or 'tinydb'
+SQLITE_DATABASE_FILE = 'responses_db.sqlite3'
+# Attachment worker pools used by process_responses
+DOWNLOAD_WORKERS = 4  # concurrent Google Drive downloads (threads)
+EXTRACT_WORKERS = 2  # concurrent PDF text extractions (processes)
+# ResponseDB write-behind buffer: flush after this many pending responses or seconds
+DB_WRITE_BUFFER_SIZE = 100
+DB_WRITE_BUFFER_SECONDS = 2
+# Attachment download and text extraction limits
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # bytes per Drive download request, streamed to disk
+DOWNLOAD_RETRIES = 3  # failed chunk requests in a row retried (from the last byte received) before giving up
+DOWNLOAD_RETRY_DELAY = 1  # seconds before the first retry of a chunk, doubled per retry
+DOWNLOAD_PARALLEL_THRESHOLD = 8 * 1024 * 1024  # files this large are downloaded in parallel range segments
+DOWNLOAD_RANGE_WORKERS = 4  # concurrent range requests of one large download
+EXTRACT_MAX_CHARS = 24000  # stop reading a document after this much text (~6000 tokens)
+EXTRACT_TIMEOUT = 60  # seconds before extraction of a single document is abandoned
+DRIVE_REQUEST_TIMEOUT = 60  # socket timeout of every Drive request (metadata, one download chunk)
+SHEETS_REQUEST_TIMEOUT = 60  # timeout of every Sheets request
+# Deadlines (deadlines.py): past them the work is cancelled and the candidate retried later
+ATTACHMENT_DEADLINE = 180  # seconds to download and extract one attachment
+CANDIDATE_DEADLINE = 300  # seconds of work a candidate may take in a stage, waits for the LLM scheduler not counted
+# Job queue: every pipeline stage has its own worker threads
+EXTRACT_STAGE_WORKERS = 1  # retries failed attachment downloads/extractions
+QUESTION_STAGE_WORKERS = 2
+EVALUATION_STAGE_WORKERS = 2
+QUEUE_BATCH_SIZE = 10  # rows claimed per worker at once
+QUEUE_IDLE_TIMEOUT = 30  # seconds an idle worker waits for events before re-checking for due retries
+QUEUE_RETRY_BASE = 60  # seconds before a failed job is retried, doubled per attempt
+QUEUE_RETRY_MAX = 3600
+QUEUE_MAX_ATTEMPTS = 10  # failed attempts before a job is parked as a dead letter (python datamanager.py --retry-failed)
+QUEUE_LEASE_SECONDS = 600  # a claim expires (and the row is taken over) unless its worker renews it
+QUEUE_POLL_INTERVAL = 1  # seconds between checks for writes made by other processes
+SQLITE_BUSY_TIMEOUT = 30  # seconds to wait for another process's write lock
+# Content-addressed attachment cache (stored in RESUME_CV_DIR)
+ATTACHMENT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+ATTACHMENT_CACHE_MAX_AGE_DAYS = 90
+# LLM endpoint (OpenAI-compatible) and client limits
+LLM_BASE_URL = 'https://openrouter.ai/api/v1'
+LLM_MODEL = 'google/gemini-2.0-flash-exp:free'
+LLM_MAX_IN_FLIGHT = 4  # concurrent requests
+LLM_REQUESTS_PER_MINUTE = 20
+LLM_MAX_RETRIES = 5  # retries on 429/5xx/connection errors
+LLM_BACKOFF_BASE = 1  # seconds, doubled per retry
+LLM_BACKOFF_MAX = 60
+LLM_TIMEOUT = 120  # seconds per request
+LLM_STRUCTURED_OUTPUT = True  # model supports JSON-schema response_format
+LLM_STRUCTURED_OUTPUT_RETRY = 3600  # seconds a model that rejected response_format gets plain-text prompts only
+LLM_STREAMING = True  # stream question prompts and stop once all questions are parsed
+# Model pool of the router (llm.ModelRouter), in order of preference. Each entry is a dict with
+# 'model' and optionally 'base_url', 'api_key_env' (variable holding its API key, default API_KEY),
+# 'requests_per_minute' and 'max_in_flight'; missing values come from the settings above.
+# None uses LLM_BASE_URL / LLM_MODEL alone.
+LLM_ENDPOINTS = None
+# e.g. [{'model': 'google/gemini-2.0-flash-exp:free'}, {'model': 'meta-llama/llama-3.3-70b-instruct:free'}]
+LLM_ROUTER_WINDOW = 50  # recent calls per model its latency percentiles and error rate are taken over
+LLM_ROUTER_MIN_SAMPLES = 5  # calls before a model's statistics are trusted
+LLM_ROUTER_MAX_ERROR_RATE = 0.5  # above this a model is skipped for LLM_ROUTER_COOLDOWN seconds
+LLM_ROUTER_COOLDOWN = 300
+LLM_ROUTER_SLOWDOWN = 2.0  # a preferred model is passed over once its p50 is this many times the fastest's
+LLM_HEDGE_AFTER = 30  # seconds without a reply before the next model is asked as well (its p95 once known)
+LLM_HEDGE_MIN_SECONDS = 5
+LLM_HEDGE_SAME_MODEL = True  # with a single model in the pool, hedge by sending the slow request to it again
+# LLM scheduling (llm_scheduler.py): priority classes, fair share between positions, daily budget
+LLM_POSITION_WEIGHTS = {}  # desired position -> weight of its fair share within a priority class (default 1)
+LLM_BACKFILL_AGE_HOURS = 24  # question generation for applicants older than this runs as 'backfill'
+FORM_TIMESTAMP_FORMAT = '%m/%d/%Y %H:%M:%S'  # format of the form's Timestamp column
+LLM_DAILY_REQUEST_BUDGET = 1000  # requests per UTC day, None for no limit (OpenRouter free models: 50, 1000 with credits)
+LLM_DAILY_TOKEN_BUDGET = None  # estimated prompt + completion tokens per UTC day, None for no limit
+# Share of the daily budget each priority class may use; past it, its rows are deferred to the next day
+LLM_BUDGET_SHARES = {'evaluation': 1.0, 'questions': 0.9, 'backfill': 0.6}
+LLM_BUDGET_FILE = 'llm_budget.sqlite3'
+QUESTION_MODE = 'structured'  # 'structured' (one call) or 'chain' (commentary, then questions)
+EVALUATION_MODE = 'structured'  # 'structured' (one call) or 'chain' (judgement, then score)
+EVALUATION_SPLIT_MODE = 'auto'  # 'auto', 'fused' (all answers in one prompt) or 'split' (one prompt per question)
+EVALUATION_SPLIT_TOKENS = 6000  # 'auto' splits submissions whose fused prompt is longer than this
+# Resumes are compacted (whitespace, repeated headers, low-priority sections) to this many tokens before prompting
+RESUME_TOKEN_BUDGET = 3000
+# Persistent LLM response cache
+LLM_CACHE_ENABLED = True
+LLM_CACHE_BYPASS = False  # regenerate everything (results still refresh the cache)
+LLM_CACHE_FILE = 'llm_cache.sqlite3'
+LLM_CACHE_TTL_DAYS = 30
+LLM_CACHE_MAX_BYTES = 100 * 1024 * 1024
+# Near-duplicate resumes (MinHash/LSH index of the extracted text)
+RESUME_INDEX_FILE = 'resume_index.sqlite3'
+NEAR_DUP_THRESHOLD = 0.9  # estimated similarity from which a resume counts as a resubmission
+NEAR_DUP_REUSE = True  # reuse the earlier candidate's commentary and questions (same position only)
+SIMILAR_CANDIDATES_THRESHOLD = 0.5  # default of the similar-candidates lookup for recruiters
+# Candidate ranking (ranking.py)
+RANKING_HASH_DIMENSIONS = 1024  # buckets of the hashed resume term vectors
+RANKING_MATCH_WEIGHT = 0.25  # share of the resume/position match in the shortlist rank, the rest is the score
+# Text each desired position is matched against; positions not listed are matched by their name
+POSITION_DESCRIPTIONS = {
+    # 'Backend Engineer': 'Python Django PostgreSQL REST API Docker microservices',
+}
+# Logging and metrics
+LOG_LEVEL = 'INFO'  # DEBUG shows per-row progress and duplicate-check dumps
+METRICS_ENABLED = True
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9464  # /metrics (Prometheus) and /metrics.json; worker N of main.py uses METRICS_PORT + N
+METRICS_SNAPSHOT_FILE = 'metrics.json'  # worker N of main.py writes metrics.N.json
+METRICS_SNAPSHOT_INTERVAL = 60
 SCOPES = [
         'https://spreadsheets.google.com/feeds',
         'https://www.googleapis.com/auth/drive'
@@ -26,6 +130,16 @@ FIELD_MAPPINGS =  {
     # }
 }
 
+# Attachment fields of the answer sheet ('formats' lists every accepted type)
+ANSWER_FIELD_MAPPINGS = {
+    'Answer File': {
+        'type': 'attachment',
+        'formats': ['docx', 'pdf'],
+        'extract_text': True,
+        'directory': ANSWERS_DIR,
+    }
+}
+
 KEYMAP = {
     "timestamp": "timestamp",
     "email_address": "email_address",
@@ -41,4 +155,4 @@ KEYMAP = {
     "eval": "eval",
     "score": "score",
     "Resume/CV": "Resume/CV"
-}
\ No newline at end of file
+}
@@ -1,48 +1,1059 @@
 from tinydb import TinyDB, Query
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import JSONStorage
+from contextlib import contextmanager
+from datetime import datetime
 import config
+import json
+import logging
+import metrics
 import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pipeline status of a response, derived from which fields are filled in.
+# Stored in its own (indexed) column by the SQLite backend so the pipelines
+# can pick up work without scanning the whole table.
+STATUS_FETCHED = 'fetched'
+STATUS_EXTRACTED = 'extracted'
+STATUS_QUESTIONS_GENERATED = 'questions_generated'
+STATUS_ANSWERED = 'answered'
+STATUS_NO_ANSWER = 'no_answer'
+STATUS_EVALUATED = 'evaluated'
+
+# 'answer_status' of a candidate whose answer-sheet row had no answer file
+ANSWER_MISSING = 'missing'
+
+
+# Bump when derive_status/_score/submitted_at change so stored columns get recomputed
+DERIVED_COLUMNS_VERSION = 5
+
+
+def has_extracted_text(record):
+    """True once every attachment field configured with extract_text has usable text."""
+    for field_name, field_config in config.FIELD_MAPPINGS.items():
+        if field_config['type'] != 'attachment' or not field_config.get('extract_text'):
+            continue
+        text = (record.get(field_name) or {}).get('extracted_text')
+        if not text or text.startswith("Error processing"):
+            return False
+    return True
+
+
+def derive_status(record):
+    """
+    Work out the pipeline status of a response from its fields.
+
+    fetched -> extracted -> questions_generated -> answered -> evaluated
+
+    A candidate who sent the answer form without an answer file ends up in
+    no_answer instead of answered.
+    """
+    if record.get('eval'):
+        return STATUS_EVALUATED
+    # Answers that arrive before the questions wait for them
+    if record.get('answers') and record.get('questions'):
+        return STATUS_ANSWERED
+    if record.get('questions') and record.get('answer_status') == ANSWER_MISSING:
+        return STATUS_NO_ANSWER
+    if record.get('questions'):
+        return STATUS_QUESTIONS_GENERATED
+    if has_extracted_text(record):
+        return STATUS_EXTRACTED
+    return STATUS_FETCHED
+
+
+def retry_delay(attempts):
+    """Exponential backoff before a failed job may be claimed again."""
+    return min(config.QUEUE_RETRY_MAX, config.QUEUE_RETRY_BASE * 2 ** max(0, attempts - 1))
+
+
+def _key(value):
+    """Normalise a lookup value (phone numbers come back from gspread as int)."""
+    return '' if value is None else str(value)
+
+
+def _email_key(value):
+    return _key(value).strip().lower()
+
+
+def submitted_at(record):
+    """Epoch seconds of the form submission (config.FORM_TIMESTAMP_FORMAT), None if unparseable."""
+    try:
+        return datetime.strptime(str(record.get('timestamp')), config.FORM_TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+def _position(record):
+    return _key(record.get('posisi_yang_diinginkan'))
+
+
+def claim_order(records, backfill_before=None, weights=None):
+    """
+    Order in which claimable records are handed out (SQLiteStorage.claim does the same in SQL).
+
+    Records submitted before `backfill_before` (epoch seconds) come after
+    every fresher one. Within those two groups the desired positions take
+    turns, a position getting weights[position] records (default 1,
+    config.LLM_POSITION_WEIGHTS) per turn, so a burst of applicants for one
+    position can't hold up the others. Each position's records go in the
+    order they arrived.
+    """
+    weights = config.LLM_POSITION_WEIGHTS if weights is None else weights
+    turns = {}
+    keys = []
+    for arrival, record in enumerate(records):
+        submitted = submitted_at(record)
+        stale = backfill_before is not None and submitted is not None and submitted < backfill_before
+        position = _position(record)
+        turn = turns[stale, position] = turns.get((stale, position), 0) + 1
+        keys.append((stale, turn / weights.get(position, 1), arrival))
+    return [record for _, record in sorted(zip(keys, records), key=lambda pair: pair[0])]
+
+
+def _score(record):
+    """Numeric score of an evaluated response, None otherwise (not evaluated, or a legacy string)."""
+    score = record.get('score')
+    if derive_status(record) != STATUS_EVALUATED or isinstance(score, bool):
+        return None
+    return float(score) if isinstance(score, (int, float)) else None
+
+
+class TinyDBStorage:
+    """
+    Storage backend on top of the original TinyDB JSON file.
+
+    Single-process only: the JSON file is rewritten without any locking, so
+    multi-process deployments need the SQLite backend.
+
+    The file's contents are cached in memory, so every ResponseDB of a
+    process must use the same instance: open() hands out one per file.
+    """
+    _shared = {}  # absolute path -> TinyDBStorage
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, db_path=config.DATABASE_FILE):
+        """The process's storage of a JSON file, created on first use (close() once per open())."""
+        key = os.path.abspath(db_path)
+        with cls._shared_lock:
+            storage = cls._shared.get(key)
+            if storage is None:
+                storage = cls._shared[key] = cls(db_path)
+            storage.users += 1
+            return storage
 
-class ResponseDB:
-    """Handles database operations using TinyDB"""
     def __init__(self, db_path=config.DATABASE_FILE):
-        self.db = TinyDB(db_path)
+        self.db_path = db_path
+        # Writes are cached in memory and written out by _save(), once per call
+        # (so a batch rewrites the JSON file once instead of once per record)
+        self.db = TinyDB(db_path, storage=CachingMiddleware(JSONStorage))
         self.query = Query()
-   
+        self.lock = threading.RLock()
+        # Job claims (key -> (worker_id, lease expiry)) only live in memory,
+        # the JSON file is single-process anyway
+        self.claims = {}
+        self.retries = {}
+        # key -> change sequence of its last write in this process (see changed_since)
+        self.changes = {}
+        self.change_seq = 0
+        self.users = 0
+
+    def _by_phone(self, phone_number):
+        return self.query['phone_number'].test(lambda value: _key(value) == _key(phone_number))
+
+    def _save(self):
+        self.db.storage.flush()
+
+    def _touch(self, phone_number):
+        self.change_seq += 1
+        self.changes[_key(phone_number)] = self.change_seq
+
+    def upsert(self, record):
+        self.write_batch([record], [])
+
+    def upsert_many(self, records):
+        self.write_batch(records, [])
+
+    def update(self, phone_number, fields):
+        self.write_batch([], [(phone_number, fields)])
+
+    def write_batch(self, records, updates):
+        """Apply upserts and (phone_number, fields) updates with a single file write."""
+        with self.lock:
+            for record in records:
+                self.db.upsert(record, self._by_phone(record.get('phone_number')))
+                self._touch(record.get('phone_number'))
+            for phone_number, fields in updates:
+                self.db.update(fields, self._by_phone(phone_number))
+                self._touch(phone_number)
+            self._save()
+
+    def get(self, phone_number):
+        with self.lock:
+            return self.db.get(self._by_phone(phone_number))
+
+    def find_by_phone_and_timestamp(self, phone_number, timestamp):
+        with self.lock:
+            return self.db.search(
+                self._by_phone(phone_number) &
+                (self.query['timestamp'] == timestamp)
+            )
+
+    def find_by_email(self, email):
+        with self.lock:
+            return self.db.search(
+                self.query['email_address'].test(lambda value: _email_key(value) == _email_key(email))
+            )
+
+    def find_by_status(self, status):
+        with self.lock:
+            return [row for row in self.db.all() if derive_status(row) == status]
+
+    def count_by_status(self):
+        counts = {}
+        with self.lock:
+            for row in self.db.all():
+                status = derive_status(row)
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def _holds(self, key, worker_id):
+        return self.claims.get(key, (None, 0))[0] == worker_id
+
+    def claim(self, status, worker_id, limit, lease_seconds, max_attempts=None, backfill_before=None):
+        now = time.time()
+        with self.lock:
+            claimable = []
+            for row in self.db.all():
+                key = _key(row.get('phone_number'))
+                attempts, available_at = self.retries.get(key, (0, 0))
+                lease_expires_at = self.claims.get(key, (None, 0))[1]
+                if max_attempts is not None and attempts >= max_attempts:
+                    continue
+                if derive_status(row) == status and lease_expires_at < now and available_at <= now:
+                    claimable.append(row)
+            claimed = claim_order(claimable, backfill_before)[:limit]
+            for row in claimed:
+                self.claims[_key(row.get('phone_number'))] = (worker_id, now + lease_seconds)
+            return claimed
+
+    def renew(self, phone_numbers, worker_id, lease_seconds):
+        with self.lock:
+            keys = [_key(p) for p in phone_numbers if self._holds(_key(p), worker_id)]
+            for key in keys:
+                self.claims[key] = (worker_id, time.time() + lease_seconds)
+            return len(keys)
+
+    def complete(self, phone_number, fields, worker_id):
+        key = _key(phone_number)
+        with self.lock:
+            if not self._holds(key, worker_id):
+                return False
+            self.db.update(fields, self._by_phone(phone_number))
+            self._touch(phone_number)
+            self._save()
+            self.claims.pop(key, None)
+            self.retries.pop(key, None)
+            return True
+
+    def release(self, phone_number, worker_id, available_at=None):
+        with self.lock:
+            key = _key(phone_number)
+            if not self._holds(key, worker_id):
+                return
+            self.claims.pop(key, None)
+            attempts = self.retries.get(key, (0, 0))[0]
+            if available_at is None:
+                attempts += 1
+                available_at = time.time() + retry_delay(attempts)
+            self.retries[key] = (attempts, available_at)
+            return attempts
+
+    def dead_letters(self, max_attempts):
+        with self.lock:
+            counts = {}
+            for row in self.db.all():
+                if self.retries.get(_key(row.get('phone_number')), (0, 0))[0] >= max_attempts:
+                    status = derive_status(row)
+                    counts[status] = counts.get(status, 0) + 1
+            return counts
+
+    def retry_dead_letters(self, max_attempts):
+        with self.lock:
+            keys = [key for key, (attempts, _) in self.retries.items() if attempts >= max_attempts]
+            for key in keys:
+                del self.retries[key]
+            return len(keys)
+
+    def claimed_workers(self):
+        with self.lock:
+            return list({worker_id for worker_id, _ in self.claims.values()})
+
+    def release_claims(self, worker_ids):
+        with self.lock:
+            for key, (worker_id, _) in list(self.claims.items()):
+                if worker_id in worker_ids:
+                    del self.claims[key]
+
+    def data_version(self):
+        # Nothing outside this process writes to the file
+        return 0
+
+    def changed_since(self, seq):
+        # Rows loaded from the file count as written at sequence 0
+        with self.lock:
+            rows = [row for row in self.db.all() if self.changes.get(_key(row.get('phone_number')), 0) > seq]
+            return rows, self.change_seq
+
+    def find_top_scored(self, limit, position=None):
+        with self.lock:
+            rows = [
+                row for row in self.db.all()
+                if _score(row) is not None
+                and (position is None or row.get('posisi_yang_diinginkan') == position)
+            ]
+        return sorted(rows, key=_score, reverse=True)[:limit]
+
+    def all(self):
+        with self.lock:
+            return self.db.all()
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.db.table('meta').get(self.query['key'] == key)
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.db.table('meta').upsert({'key': key, 'value': value}, self.query['key'] == key)
+            self._save()
+
+    def close(self):
+        with self._shared_lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            if self._shared.get(os.path.abspath(self.db_path)) is self:
+                del self._shared[os.path.abspath(self.db_path)]
+        # CachingMiddleware writes out anything left on close
+        self.db.close()
+
+
+class SQLiteStorage:
+    """
+    Storage backend on SQLite in WAL mode.
+
+    Each response is kept as a JSON document in the `data` column. The fields
+    the pipelines look rows up by are copied into their own indexed columns.
+    """
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            phone_number  TEXT PRIMARY KEY,
+            timestamp     TEXT,
+            email_address TEXT,
+            status        TEXT NOT NULL,
+            score         REAL,
+            claimed_by    TEXT,
+            claimed_at    REAL,
+            lease_expires_at REAL,
+            available_at  REAL,
+            attempts      INTEGER NOT NULL DEFAULT 0,
+            change_seq    INTEGER NOT NULL DEFAULT 0,
+            position      TEXT,
+            submitted_at  REAL,
+            data          TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_responses_phone_timestamp ON responses (phone_number, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_responses_email ON responses (email_address)",
+        "CREATE INDEX IF NOT EXISTS idx_responses_status ON responses (status)",
+        "CREATE INDEX IF NOT EXISTS idx_responses_score ON responses (score)",
+        "CREATE INDEX IF NOT EXISTS idx_responses_queue ON responses (status, claimed_by, available_at)",
+        "CREATE INDEX IF NOT EXISTS idx_responses_change_seq ON responses (change_seq)",
+        "CREATE INDEX IF NOT EXISTS idx_responses_position ON responses (status, position)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    ]
+
+    def __init__(self, db_path=config.SQLITE_DATABASE_FILE):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        # The pipelines share one ResponseDB across threads, access is
+        # serialised through self.lock instead.
+        # Other processes may hold the write lock, wait for it instead of failing
+        self.conn = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.transaction():
+            self._add_missing_columns()
+            for statement in self.SCHEMA:
+                self.conn.execute(statement)
+        if self.get_meta('derived_columns_version') != DERIVED_COLUMNS_VERSION:
+            self._refresh_derived_columns()
+
+    # Columns added after the first release, with their definitions
+    ADDED_COLUMNS = {
+        'score': 'REAL',
+        'claimed_by': 'TEXT',
+        'claimed_at': 'REAL',
+        'lease_expires_at': 'REAL',
+        'available_at': 'REAL',
+        'attempts': 'INTEGER NOT NULL DEFAULT 0',
+        'change_seq': 'INTEGER NOT NULL DEFAULT 0',
+        'position': 'TEXT',
+        'submitted_at': 'REAL',
+    }
+
+    @contextmanager
+    def transaction(self):
+        """
+        Write transaction that takes the database write lock up front (BEGIN
+        IMMEDIATE), so a read-modify-write cannot interleave with another
+        process. Nested calls join the open transaction.
+        """
+        with self.lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+
+    def _add_missing_columns(self):
+        """Bring databases created by older versions up to the current columns."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(responses)")}
+        if not columns:
+            return
+        for name, definition in self.ADDED_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE responses ADD COLUMN {name} {definition}")
+
+    def _refresh_derived_columns(self):
+        """Recompute the derived columns of every row after the derivation rules changed."""
+        with self.transaction():
+            for phone_number, data in self.conn.execute("SELECT phone_number, data FROM responses").fetchall():
+                record = json.loads(data)
+                self.conn.execute(
+                    "UPDATE responses SET status = ?, score = ?, position = ?, submitted_at = ? "
+                    "WHERE phone_number = ?",
+                    (derive_status(record), _score(record), _position(record), submitted_at(record), phone_number)
+                )
+        self.set_meta('derived_columns_version', DERIVED_COLUMNS_VERSION)
+
+    def _load(self, rows):
+        return [json.loads(row[0]) for row in rows]
+
+    def _write(self, record):
+        # Writes hold the write lock, so change_seq grows in commit order
+        self.conn.execute(
+            """
+            INSERT INTO responses (phone_number, timestamp, email_address, status, score, position, submitted_at,
+                                   change_seq, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM responses), ?)
+            ON CONFLICT (phone_number) DO UPDATE SET
+                timestamp = excluded.timestamp,
+                email_address = excluded.email_address,
+                status = excluded.status,
+                score = excluded.score,
+                position = excluded.position,
+                submitted_at = excluded.submitted_at,
+                change_seq = excluded.change_seq,
+                data = excluded.data
+            """,
+            (
+                _key(record.get('phone_number')),
+                _key(record.get('timestamp')),
+                _email_key(record.get('email_address')),
+                derive_status(record),
+                _score(record),
+                _position(record),
+                submitted_at(record),
+                json.dumps(record),
+            )
+        )
+
+    def _merge(self, phone_number, fields):
+        """Merge fields into the stored record, like TinyDB's upsert/update."""
+        existing = self.get(phone_number)
+        if existing is None:
+            return None
+        existing.update(fields)
+        return existing
+
+    def upsert(self, record):
+        self.upsert_many([record])
+
+    def upsert_many(self, records):
+        """Upsert several records in a single transaction."""
+        self.write_batch(records, [])
+
+    def update(self, phone_number, fields):
+        self.write_batch([], [(phone_number, fields)])
+
+    def write_batch(self, records, updates):
+        """Apply upserts and (phone_number, fields) updates in a single transaction."""
+        with self.transaction():
+            for record in records:
+                merged = self._merge(record.get('phone_number'), record)
+                self._write(merged if merged is not None else record)
+            for phone_number, fields in updates:
+                merged = self._merge(phone_number, fields)
+                if merged is not None:
+                    self._write(merged)
+
+    def get(self, phone_number):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM responses WHERE phone_number = ?",
+                (_key(phone_number),)
+            ).fetchall()
+        records = self._load(rows)
+        return records[0] if records else None
+
+    def find_by_phone_and_timestamp(self, phone_number, timestamp):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM responses WHERE phone_number = ? AND timestamp = ?",
+                (_key(phone_number), _key(timestamp))
+            ).fetchall()
+        return self._load(rows)
+
+    def find_by_email(self, email):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM responses WHERE email_address = ?",
+                (_email_key(email),)
+            ).fetchall()
+        return self._load(rows)
+
+    def count_by_status(self):
+        """Number of responses in each pipeline status (from the status index)."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM responses GROUP BY status").fetchall())
+
+    def find_by_status(self, status):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM responses WHERE status = ?",
+                (status,)
+            ).fetchall()
+        return self._load(rows)
+
+    def claim(self, status, worker_id, limit, lease_seconds, max_attempts=None, backfill_before=None):
+        """
+        Atomically claim up to `limit` rows in `status` whose retry delay has passed.
+
+        Rows claimed by a worker whose lease expired (it died or hung) are
+        claimed again. Rows that failed `max_attempts` times are left alone
+        (dead letters, see retry_dead_letters). Rows are picked in
+        claim_order(): fresh before `backfill_before`, positions taking turns.
+        """
+        now = time.time()
+        weights = config.LLM_POSITION_WEIGHTS
+        weight = f"CASE position {' '.join('WHEN ? THEN ?' for _ in weights)} ELSE 1 END" if weights else "1"
+        with self.transaction():
+            rows = self.conn.execute(
+                f"""
+                UPDATE responses SET claimed_by = ?, claimed_at = ?, lease_expires_at = ?
+                WHERE phone_number IN (
+                    SELECT phone_number FROM (
+                        SELECT phone_number, arrival, stale, position,
+                               ROW_NUMBER() OVER (PARTITION BY stale, position ORDER BY arrival) AS turn
+                        FROM (
+                            SELECT phone_number, rowid AS arrival, position,
+                                   COALESCE(submitted_at < ?, 0) AS stale
+                            FROM responses
+                            WHERE status = ?
+                              AND (claimed_by IS NULL OR lease_expires_at < ?)
+                              AND (available_at IS NULL OR available_at <= ?)
+                              AND (? IS NULL OR attempts < ?)
+                        )
+                    )
+                    ORDER BY stale, turn * 1.0 / {weight}, arrival
+                    LIMIT ?
+                )
+                RETURNING data
+                """,
+                (worker_id, now, now + lease_seconds, backfill_before, status, now, now, max_attempts, max_attempts,
+                 *(value for item in weights.items() for value in item), limit)
+            ).fetchall()
+        return self._load(rows)
+
+    def renew(self, phone_numbers, worker_id, lease_seconds):
+        """Extend the leases a worker still holds. Returns how many were renewed."""
+        with self.transaction():
+            return self.conn.execute(
+                f"UPDATE responses SET lease_expires_at = ? "
+                f"WHERE claimed_by = ? AND phone_number IN ({', '.join('?' * len(phone_numbers))})",
+                (time.time() + lease_seconds, worker_id, *(_key(p) for p in phone_numbers))
+            ).rowcount
+
+    def complete(self, phone_number, fields, worker_id):
+        """
+        Store a job's result and drop its claim in the same transaction.
+
+        Returns False (and stores nothing) if the worker lost its claim, e.g.
+        because its lease expired and another worker took the row over.
+        """
+        with self.transaction():
+            held = self.conn.execute(
+                "SELECT 1 FROM responses WHERE phone_number = ? AND claimed_by = ?",
+                (_key(phone_number), worker_id)
+            ).fetchone()
+            if not held:
+                return False
+            merged = self._merge(phone_number, fields)
+            if merged is not None:
+                self._write(merged)
+            self.conn.execute(
+                "UPDATE responses SET claimed_by = NULL, claimed_at = NULL, lease_expires_at = NULL, "
+                "available_at = NULL, attempts = 0 WHERE phone_number = ?",
+                (_key(phone_number),)
+            )
+            return True
+
+    def release(self, phone_number, worker_id, available_at=None):
+        """
+        Give a failed job back, claimable again after an exponential backoff.
+
+        With `available_at` the job was deferred rather than failed: it
+        becomes claimable at that time and no attempt is counted.
+
+        Returns:
+            the job's failed attempts so far, None if the worker did not hold it
+        """
+        with self.transaction():
+            row = self.conn.execute(
+                "SELECT attempts FROM responses WHERE phone_number = ? AND claimed_by = ?",
+                (_key(phone_number), worker_id)
+            ).fetchone()
+            if not row:
+                return
+            attempts = row[0]
+            if available_at is None:
+                attempts += 1
+                available_at = time.time() + retry_delay(attempts)
+            self.conn.execute(
+                "UPDATE responses SET claimed_by = NULL, claimed_at = NULL, lease_expires_at = NULL, "
+                "attempts = ?, available_at = ? WHERE phone_number = ?",
+                (attempts, available_at, _key(phone_number))
+            )
+            return attempts
+
+    def dead_letters(self, max_attempts):
+        """Number of rows in each status that failed `max_attempts` times and are no longer claimed."""
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT status, COUNT(*) FROM responses WHERE attempts >= ? GROUP BY status", (max_attempts,)
+            ).fetchall())
+
+    def retry_dead_letters(self, max_attempts):
+        """Make the dead letters claimable again, with their attempts reset. Returns how many."""
+        with self.transaction():
+            return self.conn.execute(
+                "UPDATE responses SET attempts = 0, available_at = NULL WHERE attempts >= ?", (max_attempts,)
+            ).rowcount
+
+    def claimed_workers(self):
+        """Ids of the workers currently holding claims."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT claimed_by FROM responses WHERE claimed_by IS NOT NULL"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def release_claims(self, worker_ids):
+        """Drop the claims of the given workers (e.g. left behind by a process that died mid-job)."""
+        with self.transaction():
+            for worker_id in worker_ids:
+                self.conn.execute(
+                    "UPDATE responses SET claimed_by = NULL, claimed_at = NULL, lease_expires_at = NULL "
+                    "WHERE claimed_by = ?",
+                    (worker_id,)
+                )
+
+    def data_version(self):
+        """Changes whenever another connection (or process) commits to the database."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_since(self, seq):
+        """Rows written after change sequence `seq`, and the sequence they bring it up to."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT change_seq, data FROM responses WHERE change_seq > ? ORDER BY change_seq", (seq,)
+            ).fetchall()
+        return [json.loads(data) for _, data in rows], (rows[-1][0] if rows else seq)
+
+    def find_top_scored(self, limit, position=None):
+        query = "SELECT data FROM responses WHERE score IS NOT NULL"
+        params = []
+        if position is not None:
+            query += " AND json_extract(data, '$.posisi_yang_diinginkan') = ?"
+            params.append(position)
+        query += " ORDER BY score DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return self._load(rows)
+
+    def all(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM responses").fetchall()
+        return self._load(rows)
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value))
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def migrate_tinydb_to_sqlite(tinydb_path=config.DATABASE_FILE, sqlite_path=config.SQLITE_DATABASE_FILE):
+    """
+    One-shot migration of the legacy TinyDB JSON file into SQLite.
+
+    Args:
+        tinydb_path (str): path of the TinyDB JSON file
+        sqlite_path (str): path of the SQLite database to fill
+
+    Returns:
+        int: number of migrated responses (0 if already migrated or nothing to migrate)
+    """
+    storage = SQLiteStorage(sqlite_path)
+    try:
+        if storage.get_meta('migrated_from_tinydb') or not os.path.exists(tinydb_path):
+            return 0
+
+        with storage.transaction():
+            # Checked again under the write lock, another process may have just migrated
+            if storage.get_meta('migrated_from_tinydb'):
+                return 0
+            legacy = TinyDB(tinydb_path)
+            records = legacy.all()
+            legacy.close()
+
+            for record in records:
+                if record.get('phone_number'):
+                    storage._write(dict(record))
+            storage.set_meta('migrated_from_tinydb', tinydb_path)
+        logger.info(f"📦 Migrated {len(records)} responses from {tinydb_path} to {sqlite_path}")
+        return len(records)
+    finally:
+        storage.close()
+
+
+def create_storage(backend=None, db_path=None):
+    """Create the storage backend selected in config.STORAGE_BACKEND."""
+    backend = backend or config.STORAGE_BACKEND
+    if backend == 'sqlite':
+        db_path = db_path or config.SQLITE_DATABASE_FILE
+        migrate_tinydb_to_sqlite(config.DATABASE_FILE, db_path)
+        return SQLiteStorage(db_path)
+    if backend == 'tinydb':
+        return TinyDBStorage.open(db_path or config.DATABASE_FILE)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class ResponseDB:
+    """
+    Handles database operations through the configured storage backend.
+
+    Writes (upsert_response/upsert_many/update_response/update_many) go to a
+    write-behind buffer, merged per phone number, and reach the storage in
+    one batch once config.DB_WRITE_BUFFER_SIZE responses are pending or
+    config.DB_WRITE_BUFFER_SECONDS have passed. get_response and
+    check_duplicate see buffered writes; every other query and the job queue
+    operations flush the buffer first. Call flush() or close() on shutdown.
+    """
+    def __init__(self, db_path=None, backend=None,
+                 buffer_size=config.DB_WRITE_BUFFER_SIZE,
+                 flush_interval=config.DB_WRITE_BUFFER_SECONDS):
+        self.storage = create_storage(backend, db_path)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        # phone key -> {'phone_number', 'upsert', 'fields'}
+        self.pending = {}
+        self.timer = None
+        # Per-thread buffer of an open transaction()
+        self.local = threading.local()
+
+    def _stage(self, buffer, phone_number, fields, upsert):
+        entry = buffer.setdefault(
+            _key(phone_number),
+            {'phone_number': phone_number, 'upsert': False, 'fields': {}}
+        )
+        entry['upsert'] = entry['upsert'] or upsert
+        entry['fields'].update(fields)
+
+    def _buffer_write(self, phone_number, fields, upsert):
+        transaction = getattr(self.local, 'transaction', None)
+        with self.lock:
+            if transaction is not None:
+                self._stage(transaction, phone_number, fields, upsert)
+                return
+            self._stage(self.pending, phone_number, fields, upsert)
+            if len(self.pending) >= self.buffer_size:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _write_entries(self, entries):
+        upserts = [entry['fields'] for entry in entries if entry['upsert']]
+        updates = [(entry['phone_number'], entry['fields']) for entry in entries if not entry['upsert']]
+        if upserts or updates:
+            with metrics.timer('stage_duration_seconds', stage='db_write'):
+                self.storage.write_batch(upserts, updates)
+
+    def _buffered(self, phone_number):
+        """Pending (not yet flushed) entry for a phone number, transaction first."""
+        key = _key(phone_number)
+        entries = [self.pending.get(key)]
+        transaction = getattr(self.local, 'transaction', None)
+        if transaction is not None:
+            entries.append(transaction.get(key))
+        entries = [entry for entry in entries if entry]
+        if not entries:
+            return None
+        merged = {'upsert': False, 'fields': {}}
+        for entry in entries:
+            merged['upsert'] = merged['upsert'] or entry['upsert']
+            merged['fields'].update(entry['fields'])
+        return merged
+
+    def flush(self):
+        """Write every buffered response to the storage in one batch."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            pending, self.pending = self.pending, {}
+            self._write_entries(list(pending.values()))
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes so they are committed together.
+
+        Writes made by this thread inside the block are held back and written
+        in a single storage transaction when the block exits (together with
+        anything else still buffered). If the block raises, they are dropped.
+        Nested blocks join the outer one.
+        """
+        if getattr(self.local, 'transaction', None) is not None:
+            yield self
+            return
+        self.local.transaction = {}
+        try:
+            yield self
+            with self.lock:
+                entries = self.pending
+                for key, entry in self.local.transaction.items():
+                    self._stage(entries, entry['phone_number'], entry['fields'], entry['upsert'])
+                self.pending = {}
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                self._write_entries(list(entries.values()))
+        finally:
+            self.local.transaction = None
+
     def upsert_response(self, response_data):
         """Insert or update a response based on phone number"""
         phone_number = response_data.get('phone_number')
-       
+
         if not phone_number:
-            print("⚠️ Response missing 'phone_number', skipping...")
+            logger.warning("⚠️ Response missing 'phone_number', skipping...")
             return
-            
+
         # Upsert operation (update if exists, insert otherwise)
-        self.db.upsert(
-            response_data,
-            self.query['phone_number'] == phone_number
-        )
+        self._buffer_write(phone_number, response_data, upsert=True)
+
+    def upsert_many(self, responses):
+        """Insert or update several responses"""
+        valid = [response for response in responses if response.get('phone_number')]
+        if len(valid) < len(responses):
+            logger.warning(f"⚠️ {len(responses) - len(valid)} responses missing 'phone_number', skipping...")
+        for response in valid:
+            self._buffer_write(response['phone_number'], response, upsert=True)
+
+    def update_response(self, phone_number, fields):
+        """Update fields of the response with the given phone number"""
+        self._buffer_write(phone_number, fields, upsert=False)
+
+    def update_many(self, updates):
+        """Update several responses, given as (phone_number, fields) pairs"""
+        for phone_number, fields in updates:
+            self._buffer_write(phone_number, fields, upsert=False)
+
+    def get_response(self, phone_number):
+        """Return the response with the given phone number, or None"""
+        with self.lock:
+            buffered = self._buffered(phone_number)
+            stored = self.storage.get(phone_number)
+        if buffered is None:
+            return stored
+        if stored is None and not buffered['upsert']:
+            # An update of a response that does not exist is a no-op
+            return None
+        return {**(stored or {}), **buffered['fields']}
+
+    def find_by_email(self, email):
+        """Return all responses submitted with the given email address"""
+        self.flush()
+        return self.storage.find_by_email(email)
+
+    def find_by_status(self, status):
+        """Return all responses in the given pipeline status (see derive_status)"""
+        self.flush()
+        return self.storage.find_by_status(status)
+
+    def count_by_status(self):
+        """Return {status: number of responses}, e.g. for queue depth metrics"""
+        self.flush()
+        return self.storage.count_by_status()
+
+    def claim(self, status, worker_id, limit=1, lease_seconds=config.QUEUE_LEASE_SECONDS,
+              max_attempts=config.QUEUE_MAX_ATTEMPTS, backfill_before=None):
+        """Lease up to `limit` unclaimed responses in `status` to a worker, in claim_order() (see jobqueue)"""
+        self.flush()
+        return self.storage.claim(status, worker_id, limit, lease_seconds, max_attempts, backfill_before)
+
+    def renew(self, phone_numbers, worker_id, lease_seconds=config.QUEUE_LEASE_SECONDS):
+        """Extend a worker's leases on responses it is still working on"""
+        return self.storage.renew(phone_numbers, worker_id, lease_seconds)
+
+    def complete(self, phone_number, fields, worker_id):
+        """Store the result of a claimed job and release the claim (False if the claim was lost)"""
+        self.flush()
+        with metrics.timer('stage_duration_seconds', stage='db_write'):
+            return self.storage.complete(phone_number, fields, worker_id)
+
+    def release(self, phone_number, worker_id, available_at=None):
+        """
+        Release a claimed job without a result, so it is retried later (at `available_at` if given).
+        Returns its failed attempts so far (None if the worker did not hold it).
+        """
+        self.flush()
+        return self.storage.release(phone_number, worker_id, available_at)
+
+    def dead_letters(self, max_attempts=config.QUEUE_MAX_ATTEMPTS):
+        """Return {status: number of responses} that failed too often to be claimed again"""
+        self.flush()
+        return self.storage.dead_letters(max_attempts)
+
+    def retry_dead_letters(self, max_attempts=config.QUEUE_MAX_ATTEMPTS):
+        """Give the dead letters a fresh set of attempts; returns how many there were"""
+        return self.storage.retry_dead_letters(max_attempts)
+
+    def claimed_workers(self):
+        return self.storage.claimed_workers()
+
+    def release_claims(self, worker_ids):
+        self.storage.release_claims(worker_ids)
+
+    def data_version(self):
+        """Counter that changes when another process writes to the database"""
+        return self.storage.data_version()
+
+    def changed_since(self, seq):
+        """
+        Return (responses written after change sequence `seq`, new sequence).
+
+        Pass the returned sequence to the next call to get only what changed
+        in between (-1 the first time gets every response).
+        """
+        self.flush()
+        return self.storage.changed_since(seq)
+
+    def find_top_scored(self, limit=10, position=None):
+        """Return the best scored evaluated responses, optionally for one position"""
+        self.flush()
+        return self.storage.find_top_scored(limit, position)
+
+    def all_responses(self):
+        self.flush()
+        return self.storage.all()
+
+    def get_meta(self, key, default=None):
+        """Return a bookkeeping value (e.g. a sheet sync cursor)"""
+        return self.storage.get_meta(key, default)
+
+    def set_meta(self, key, value):
+        """Store a JSON-serialisable bookkeeping value (after the buffered writes, so a cursor never gets ahead of them)"""
+        self.flush()
+        self.storage.set_meta(key, value)
+
+    def close(self):
+        self.flush()
+        self.storage.close()
 
     def check_duplicate(self, phone_number, timestamp):
         """
         Check if a response already exists in the database using phone number and timestamp.
-       
+
         Args:
             phone_number (str): phone_number to check
             timestamp (str): timestamp to check
-       
+
         Returns:
             bool: True if a duplicate exists, False otherwise
         """
-        # Use TinyDB's query interface
-        result = self.db.search(
-            (self.query['phone_number'] == phone_number) & 
-            (self.query['timestamp'] == timestamp)
-        )
-        
+        with self.lock:
+            buffered = self._buffered(phone_number)
+            if buffered and _key(buffered['fields'].get('timestamp')) == _key(timestamp):
+                result = [self.get_response(phone_number)]
+            else:
+                result = self.storage.find_by_phone_and_timestamp(phone_number, timestamp)
+
         # For debugging
-        print(f"Checking for Phone: {phone_number}, timestamp: {timestamp}")
-        print(f"Found matches: {len(result)}")
-        if result:
-            print(f"First match: {result[0]}")
-            
-        return len(result) > 0
\ No newline at end of file
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Checking for Phone: {phone_number}, timestamp: {timestamp}")
+            logger.debug(f"Found matches: {len(result)}")
+            if result:
+                logger.debug(f"First match: {result[0]}")
+
+        return len(result) > 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Response database maintenance")
+    parser.add_argument("--migrate", action="store_true", help="Migrate the TinyDB JSON file into SQLite")
+    parser.add_argument("--source", default=config.DATABASE_FILE, help="TinyDB JSON file to migrate from")
+    parser.add_argument("--target", default=config.SQLITE_DATABASE_FILE, help="SQLite database to migrate into")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help=f"Queue the responses that failed {config.QUEUE_MAX_ATTEMPTS} times again")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(message)s")
+    if args.migrate:
+        count = migrate_tinydb_to_sqlite(args.source, args.target)
+        print(f"Migrated {count} responses")
+    if args.retry_failed:
+        db = ResponseDB()
+        print(f"Queued {db.retry_dead_letters()} failed responses again")
+        db.close()
@@ -0,0 +1,101 @@
+"""
+Per-candidate deadlines.
+
+A Deadline is the time budget of one candidate's pass through a stage
+(Drive download, text extraction, LLM calls). It is handed down to every
+step, and each step gives up once the budget has run out instead of
+hanging. Downloads stop between chunks, extraction gets the remaining time
+as its timeout, and LLM calls are cancelled. The candidate's row is then
+given back to the job queue and retried later.
+
+Time spent waiting for a turn (e.g. in the LLM scheduler, see paused())
+doesn't count: a candidate starved by higher priority work is not cut off.
+
+Functions that take a `deadline` argument fall back to the one applied to
+the running work (see applied()) when they are not given one.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+import metrics
+
+_current = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """Expires `seconds` from now, not counting the time spent inside paused()."""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.pauses = 0  # paused() blocks running now, they may overlap
+        self.paused_at = None
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        with self.lock:
+            now = self.paused_at if self.pauses else time.monotonic()
+            return max(0.0, self.expires_at - now)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    @contextmanager
+    def paused(self):
+        """Stop the clock inside the block."""
+        with self.lock:
+            if not self.pauses:
+                self.paused_at = time.monotonic()
+            self.pauses += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.pauses -= 1
+                if not self.pauses:
+                    self.expires_at += time.monotonic() - self.paused_at
+
+    def timeout(self, limit=None):
+        """Seconds a blocking step may take: the time left, capped at `limit`."""
+        return self.remaining() if limit is None else min(limit, self.remaining())
+
+    def check(self, step):
+        """Raise DeadlineExceeded if the deadline has passed; `step` names the step that is cut off."""
+        if self.expired():
+            metrics.inc('deadline_exceeded_total', step=step)
+            raise DeadlineExceeded(f"{step} cut off by the {self.seconds:g}s deadline")
+
+
+@contextmanager
+def applied(deadline):
+    """Make `deadline` the default of the deadline-aware functions called inside the block."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def paused(deadline=None):
+    """Stop the clock of `deadline` (the applied one if not given) inside the block, e.g. while queued."""
+    deadline = resolve(deadline)
+    if deadline is None:
+        yield None
+        return
+    with deadline.paused():
+        yield deadline
+
+
+def current():
+    """The deadline applied to the running work, or None."""
+    return _current.get()
+
+
+def resolve(deadline=None):
+    """`deadline` if given, otherwise the applied one (None if there is neither)."""
+    return deadline if deadline is not None else _current.get()
@@ -0,0 +1,172 @@
+"""
+Chunked, resumable Google Drive downloads.
+
+A file is fetched with HTTP range requests of config.DOWNLOAD_CHUNK_SIZE
+bytes and every chunk is written straight into `<destination>.part`, which
+is renamed to the destination once complete. No copy of the file is held in
+memory. A failed chunk request is retried from the last byte received
+(up to config.DOWNLOAD_RETRIES times in a row, with backoff), so a dropped
+connection doesn't start the download over.
+
+Files of config.DOWNLOAD_PARALLEL_THRESHOLD bytes or more are split into
+segments fetched at the same time by config.DOWNLOAD_RANGE_WORKERS threads.
+A Drive service's HTTP connection can't be shared between threads, so the
+extra segments borrow their own service from the pool in services.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+import metrics
+import services
+from deadlines import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class _Cancelled(Exception):
+    """Another segment of the same download failed."""
+
+
+def _retryable(error):
+    from googleapiclient.errors import HttpError
+
+    if isinstance(error, HttpError):
+        return error.resp.status in (408, 429) or error.resp.status >= 500
+    return not isinstance(error, (DeadlineExceeded, ValueError))
+
+
+def _fetch(request, start, end):
+    """
+    GET bytes start..end (inclusive) of a media request.
+
+    Returns:
+        tuple (content, total size of the file)
+    """
+    from googleapiclient.errors import HttpError
+
+    headers = dict(getattr(request, 'headers', None) or {})
+    headers['range'] = f"bytes={start}-{end}"
+    response, content = request.http.request(request.uri, 'GET', headers=headers)
+    if response.status == 206:
+        return content, int(response['content-range'].rsplit('/', 1)[1])
+    if response.status == 200 and start == 0:
+        # The server ignored the range and sent the whole file
+        return content, len(content)
+    if response.status == 416 and response.get('content-range', '').endswith('/0'):
+        # Range Not Satisfiable: an empty file
+        return b'', 0
+    raise HttpError(response, content, uri=request.uri)
+
+
+def _download_range(request, path, start, end=None, deadline=None, cancelled=None):
+    """
+    Download bytes start..end (inclusive, to the end of the file if None) into `path` at their offset.
+
+    Returns:
+        total size of the file
+    """
+    offset = start
+    failures = 0
+    total = None
+    with open(path, 'r+b') as f:
+        while end is None or offset <= end:
+            if deadline:
+                deadline.check('drive_download')
+            if cancelled is not None and cancelled.is_set():
+                raise _Cancelled()
+            last = offset + config.DOWNLOAD_CHUNK_SIZE - 1
+            if end is not None:
+                last = min(last, end)
+            try:
+                content, total = _fetch(request, offset, last)
+                if not content and offset < total:
+                    raise ConnectionError("empty response")
+            except Exception as e:
+                failures += 1
+                if failures > config.DOWNLOAD_RETRIES or not _retryable(e):
+                    raise
+                metrics.inc('download_retries_total')
+                delay = config.DOWNLOAD_RETRY_DELAY * 2 ** (failures - 1)
+                logger.warning(f"🔁 Download chunk at byte {offset} failed ({e}), resuming in {delay:g}s")
+                time.sleep(delay)
+                continue
+
+            failures = 0
+            f.seek(offset)
+            f.write(content)
+            offset += len(content)
+            if end is None:
+                end = total - 1
+    return total
+
+
+def _segments(size, workers):
+    """Split `size` bytes into at most `workers` (start, end) ranges of whole chunks."""
+    chunk = config.DOWNLOAD_CHUNK_SIZE
+    chunks = -(-size // chunk)
+    per_segment = -(-chunks // max(1, min(workers, chunks))) * chunk
+    return [(start, min(start + per_segment, size) - 1) for start in range(0, size, per_segment)]
+
+
+def download(service, file_id, destination, size=None, deadline=None):
+    """
+    Download a Drive file to `destination`, chunk by chunk.
+
+    Args:
+        service: Google Drive service instance (used for the first segment)
+        file_id: ID of the file to download
+        destination: Path to write the file to
+        size: File size in bytes if known (Drive metadata 'size'). Only
+              files of known size are downloaded in parallel segments.
+        deadline: Deadline checked before every chunk request
+
+    Returns:
+        size of the downloaded file in bytes
+
+    Raises:
+        DeadlineExceeded: the deadline passed before the download finished
+    """
+    part = f"{destination}.part"
+    open(part, 'wb').close()
+    try:
+        request = service.files().get_media(fileId=file_id)
+        if size is None or size < config.DOWNLOAD_PARALLEL_THRESHOLD or config.DOWNLOAD_RANGE_WORKERS < 2:
+            size = _download_range(request, part, 0, deadline=deadline)
+        else:
+            os.truncate(part, size)
+            cancelled = threading.Event()
+
+            def fetch_segment(segment):
+                start, end = segment
+                try:
+                    with services.drive_service() as segment_service:
+                        segment_request = segment_service.files().get_media(fileId=file_id)
+                        _download_range(segment_request, part, start, end, deadline, cancelled)
+                except Exception:
+                    cancelled.set()
+                    raise
+
+            first, *rest = _segments(size, config.DOWNLOAD_RANGE_WORKERS)
+            with ThreadPoolExecutor(max_workers=len(rest) or 1) as pool:
+                futures = [pool.submit(fetch_segment, segment) for segment in rest]
+                try:
+                    _download_range(request, part, *first, deadline, cancelled)
+                except _Cancelled:
+                    pass
+                except Exception:
+                    cancelled.set()
+                    raise
+                # Raise the error that stopped the download, not the segments it cancelled
+                errors = [future.exception() for future in futures]
+                error = next((e for e in errors if e and not isinstance(e, _Cancelled)), None)
+                if error:
+                    raise error
+        os.replace(part, destination)
+        return size
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
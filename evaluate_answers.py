@@ -1,6 +1,24 @@
 # Okay, here we go...
 import llm
 import regex
+import config
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Judgement and scores in one structured reply
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "commentary": {"type": "string"},
+        "per_question_scores": {"type": "array", "items": {"type": "number"}},
+        "overall_score": {"type": "number"},
+    },
+    "required": ["commentary", "per_question_scores", "overall_score"],
+    "additionalProperties": False,
+}
+
 def prompt_for_evaluation(q:str, a:str):
     system_prompt = f"You are Assistant, you will judge the given parsed answers from the questions.\n\nYour judgement will be written in an explanatory format, highlight both the good and the bad. The judgement must contain:\n1. Measure how relevant the answer from the question asked.\n2. How much it highlights their experience or if it more focused on theories\n3. How 'honest' it sounds or if it actually sound like something overly glorified/made up\nDO NOT make any comment on resume formatting/structure/etc."
     user_prompt = f"User: <parsed_question> {q} </parsed_question>\n<parsed_answer>{a}</parsed_answer> Based on the given data, write down your judgement"
@@ -21,16 +39,209 @@ def prompt_for_scoring(com:str):
         {"role": "assistant", "content": assist_prompt},
     ]
 
+def prompt_for_scored_evaluation(q, a):
+    system_prompt = f"You are Assistant, you will judge the given parsed answers from the questions and score them.\n\nYour judgement will be written in an explanatory format, highlight both the good and the bad. The judgement must contain:\n1. Measure how relevant the answer from the question asked.\n2. How much it highlights their experience or if it more focused on theories\n3. How 'honest' it sounds or if it actually sound like something overly glorified/made up\nDO NOT make any comment on resume formatting/structure/etc.\n\nThen score every answer from 0 to 100 in question order, and give an overall score from 0 to 100 based on your judgement.\n\nReply with a JSON object only: {{\"commentary\": \"...\", \"per_question_scores\": [80, 65, ...], \"overall_score\": 72}}"
+    user_prompt = f"User: <parsed_question> {q} </parsed_question>\n<parsed_answer>{a}</parsed_answer> Based on the given data, write down your judgement and scores"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+def _clamp_score(value):
+    return max(0.0, min(100.0, float(value)))
+
+def parse_evaluation(evaluation, question_count=None):
+    """
+    Validate a structured evaluation reply.
+
+    Returns:
+        dict with 'eval' (commentary), 'score' (overall, 0-100) and
+        'per_question_scores' (list of 0-100 numbers), or None if invalid
+    """
+    if not isinstance(evaluation, dict):
+        return None
+    commentary = evaluation.get('commentary')
+    scores = evaluation.get('per_question_scores')
+    overall = evaluation.get('overall_score')
+    if not isinstance(commentary, str) or not commentary.strip() or not isinstance(scores, list):
+        return None
+    if isinstance(overall, bool) or not isinstance(overall, (int, float)):
+        return None
+    if any(isinstance(score, bool) or not isinstance(score, (int, float)) for score in scores):
+        return None
+    if question_count and len(scores) != question_count:
+        return None
+    return {
+        'eval': commentary,
+        'score': _clamp_score(overall),
+        'per_question_scores': [_clamp_score(score) for score in scores],
+    }
+
 def make_commentary(question, answer):
     q = question
     a = answer
     prompt = prompt_for_evaluation(q,a)
-    result = llm.send_prompt(prompt)
+    result = llm.send_prompt(prompt, prompt_type='evaluation', validate=lambda reply: bool(reply.strip()))
     return result
 
 def score_question(commentary_string):
-    print(commentary_string)
+    logger.debug(commentary_string)
     com = commentary_string
     prompt = prompt_for_scoring(com)
-    result = llm.send_prompt(prompt)
-    return result
\ No newline at end of file
+    result = llm.send_prompt(prompt, prompt_type='scoring',
+                             validate=lambda reply: regex.extract_score(reply) is not None)
+    return result
+
+def _chain_evaluations(candidates):
+    """Two-step chain: all judgements concurrently, then all scoring prompts."""
+    # Only usable replies get cached, see llm.send_prompts
+    commentaries = llm.send_prompts([prompt_for_evaluation(q, a) for q, a in candidates], prompt_type='evaluation',
+                                    validate=lambda i, reply: bool(reply.strip()))
+
+    ready = [i for i, com in enumerate(commentaries) if com]
+    scores = llm.send_prompts([prompt_for_scoring(commentaries[i]) for i in ready], prompt_type='scoring',
+                              validate=lambda i, reply: regex.extract_score(reply) is not None)
+
+    results = [None] * len(candidates)
+    for i, score in zip(ready, scores):
+        score = regex.extract_score(score)
+        if score is not None:
+            results[i] = {
+                'eval': commentaries[i],
+                'score': _clamp_score(score),
+                'per_question_scores': []
+            }
+    return results
+
+def _evaluate_fused(candidates):
+    """
+    Evaluate many candidates concurrently, one prompt holding all Q/A per candidate.
+
+    With EVALUATION_MODE 'structured' each candidate costs one request that
+    returns the judgement, per-question scores and overall score as JSON.
+    Invalid replies (and every candidate once structured output turns out to
+    be unsupported) fall back to the judgement -> scoring chain, whose
+    '[Score: 87]' reply is parsed into a number.
+
+    Args:
+        candidates: list of (questions, answers) tuples
+
+    Returns:
+        list of {'eval', 'score', 'per_question_scores'} dicts in the same
+        order (scores are numbers), None where a call failed
+    """
+    results = [None] * len(candidates)
+    pending = list(range(len(candidates)))
+
+    if config.EVALUATION_MODE == 'structured' and llm.structured_output_supported():
+        question_counts = [
+            len(candidates[i][0]) if isinstance(candidates[i][0], list) else None for i in pending
+        ]
+        evaluations = llm.send_structured_prompts(
+            [prompt_for_scored_evaluation(*candidates[i]) for i in pending],
+            "evaluation",
+            EVALUATION_SCHEMA,
+            prompt_type='scored_evaluation',
+            validate=lambda n, evaluation: parse_evaluation(evaluation, question_counts[n]) is not None
+        )
+        for i, evaluation, question_count in zip(pending, evaluations, question_counts):
+            results[i] = parse_evaluation(evaluation, question_count)
+        pending = [i for i in pending if results[i] is None]
+        if pending:
+            logger.warning(f"↩️ Structured evaluation unusable for {len(pending)} candidates, falling back to the two-step chain")
+
+    if pending:
+        for i, result in zip(pending, _chain_evaluations([candidates[i] for i in pending])):
+            results[i] = result
+    return results
+
+def pair_questions_and_answers(questions, answers):
+    """
+    Split a candidate's submission into (question, answer) pairs.
+
+    Answers given as a list are matched by position. An answer text is split
+    on numbered markers at the start of a line ("1.", "2)", "[3." ...), which
+    must run 1..N in order. Any other marker, e.g. a numbered list inside an
+    answer, makes the split ambiguous, so the submission is not split.
+
+    Returns:
+        list of (question, answer) tuples, or None if the answers can't be
+        matched one-to-one with the questions (it is then evaluated fused)
+    """
+    if not isinstance(questions, list) or not questions:
+        return None
+    if isinstance(answers, list):
+        return list(zip(questions, answers)) if len(answers) == len(questions) else None
+    if not isinstance(answers, str):
+        return None
+
+    markers = list(re.finditer(r'^\s*\[?\s*(\d+)\s*[.):\]]', answers, re.MULTILINE))
+    if [int(marker.group(1)) for marker in markers] != list(range(1, len(questions) + 1)):
+        return None
+    return [
+        (question, answers[marker.end():following.start() if following else len(answers)].strip())
+        for question, marker, following in zip(questions, markers, markers[1:] + [None])
+    ]
+
+def should_split(questions, answers):
+    """Split mode pays off once the fused prompt gets long (EVALUATION_SPLIT_TOKENS)."""
+    if config.EVALUATION_SPLIT_MODE == 'fused':
+        return False
+    if config.EVALUATION_SPLIT_MODE == 'split':
+        return True
+    prompt = prompt_for_scored_evaluation(questions, answers)
+    return llm.estimate_prompt_tokens(prompt) > config.EVALUATION_SPLIT_TOKENS
+
+def _merge_question_results(pairs, results):
+    """Combine per-question evaluations into one candidate record."""
+    scores = [result['score'] for result in results]
+    commentary = "\n\n".join(
+        f"{question}\n{result['eval']}" for (question, _), result in zip(pairs, results)
+    )
+    return {
+        'eval': commentary,
+        'score': sum(scores) / len(scores),
+        'per_question_scores': scores,
+    }
+
+def evaluate_candidates(candidates):
+    """
+    Evaluate many candidates concurrently.
+
+    Long submissions are split into one request per question/answer pair
+    (see should_split), all sent concurrently and merged back into one
+    record, so no single prompt has to carry every answer. Short ones, and
+    answers that can't be matched to their questions, are evaluated fused.
+
+    Args:
+        candidates: list of (questions, answers) tuples
+
+    Returns:
+        list of {'eval', 'score', 'per_question_scores'} dicts in the same
+        order (scores are numbers), None where a call failed
+    """
+    # Every candidate becomes one unit (fused) or one unit per question (split)
+    units = []
+    split_pairs = {}
+    for i, (questions, answers) in enumerate(candidates):
+        pairs = pair_questions_and_answers(questions, answers) if should_split(questions, answers) else None
+        if pairs:
+            split_pairs[i] = pairs
+            units.extend((i, ([question], answer)) for question, answer in pairs)
+        else:
+            units.append((i, (questions, answers)))
+
+    unit_results = _evaluate_fused([unit for _, unit in units])
+
+    results = [None] * len(candidates)
+    per_candidate = {}
+    for (i, _), result in zip(units, unit_results):
+        per_candidate.setdefault(i, []).append(result)
+    for i, unit_results in per_candidate.items():
+        if any(result is None for result in unit_results):
+            continue
+        if i in split_pairs:
+            results[i] = _merge_question_results(split_pairs[i], unit_results)
+        else:
+            results[i] = unit_results[0]
+    return results
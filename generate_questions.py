@@ -2,6 +2,31 @@
 
 import llm
 import regex
+import config
+import logging
+import metrics
+import time
+from compaction import compact_resume
+
+logger = logging.getLogger(__name__)
+
+QUESTION_COUNT = 5
+
+# Commentary and questions in one structured reply
+INTERVIEW_PACKAGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "commentary": {"type": "string"},
+        "questions": {
+            "type": "array",
+            "items": {"type": "string"},
+            "minItems": QUESTION_COUNT,
+            "maxItems": QUESTION_COUNT,
+        },
+    },
+    "required": ["commentary", "questions"],
+    "additionalProperties": False,
+}
 
 def prompt_for_commentary(res:str, des:str):
     system_prompt = f"You are Assistant, you will compare the given parsed resume with the desired job position and write down commentaries and summaries on it.\n\nThe summary/commentary must contain:\n1. The job seeker's background\n2. The job seeker's related experience with the position  they're applying (if any)\n3. The job seeker's additional and adjacent experience with similar stuff\n4. Any critique or praise for the resume\n5. Missing information if any\n\nImportant: DO NOT make any decision on job acceptance or not. Assistant only comments, Assistant does not make any accepting-related comment. Also DO NOT make any comment on resume formatting/structure/etc."
@@ -23,21 +48,193 @@ def prompt_for_questions(com:str):
         {"role": "assistant", "content": assist_prompt},
     ]
 
+def prompt_for_interview_package(res:str, des:str):
+    system_prompt = f"You are Assistant, you will compare the given parsed resume with the desired job position, write down commentaries and summaries on it, then create 5 interview questions from that commentary.\n\nThe summary/commentary must contain:\n1. The job seeker's background\n2. The job seeker's related experience with the position  they're applying (if any)\n3. The job seeker's additional and adjacent experience with similar stuff\n4. Any critique or praise for the resume\n5. Missing information if any\n\nThe 5 interview  question must contain:\n1. Asking for missing details in the resume if any\n2. Asking in more detail about the job seeker's experience\n3. Asking in more detail about the job seeker's prior experience\n4. Asking in more detail about the job seeker's motivation\n5. All questions must refer to the job seeker's resume and desired job position\n\nImportant: DO NOT make any decision on job acceptance or not. Assistant only comments, Assistant does not make any accepting-related comment. Also DO NOT make any comment on resume formatting/structure/etc.\n\nReply with a JSON object only: {{\"commentary\": \"...\", \"questions\": [\"1. ...\", \"2. ...\", \"3. ...\", \"4. ...\", \"5. ...\"]}}"
+    user_prompt = f"User: <parsed_resume> {res} </parsed_resume>\n<parsed_job_position>{des}</parsed_job_position> Based on the given data, write down your commentary and 5 interview questions"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+def parse_interview_package(package):
+    """Validate a structured reply: a non-empty commentary and exactly 5 non-empty questions."""
+    if not isinstance(package, dict):
+        return None
+    commentary = package.get('commentary')
+    questions = package.get('questions')
+    if not isinstance(commentary, str) or not commentary.strip() or not isinstance(questions, list):
+        return None
+    questions = [q.strip() for q in questions if isinstance(q, str) and q.strip()]
+    if len(questions) != QUESTION_COUNT:
+        return None
+    return {'commentary': commentary, 'questions': questions}
+
+def usable_questions(items):
+    """The first QUESTION_COUNT non-empty questions of a reply, or None if it has fewer."""
+    questions = [q.strip() for q in items or [] if q.strip()][:QUESTION_COUNT]
+    return questions if len(questions) == QUESTION_COUNT else None
+
+# validate callbacks: the LLM cache only keeps replies that pass them
+def _has_text(i, reply):
+    return bool(reply.strip())
+
+def _has_questions(i, reply):
+    return usable_questions(regex.extract_bracketed_text(reply)) is not None
+
 def make_commentary(resume_cv_string, desired_position_string):
-    res = resume_cv_string
+    res, stats = compact_resume(resume_cv_string)
+    metrics.inc('resume_tokens_saved_total', stats['tokens_saved'])
     des = desired_position_string
     prompt = prompt_for_commentary(res,des)
-    result = llm.send_prompt(prompt)
+    result = llm.send_prompt(prompt, prompt_type='commentary', validate=lambda reply: _has_text(0, reply))
     return result
 
 def make_question(commentary_string):
 
     com = commentary_string
     prompt = prompt_for_questions(com)
-    result = llm.send_prompt(prompt)
-    return result
+    validate = lambda reply: _has_questions(0, reply)
+    if not config.LLM_STREAMING:
+        return llm.send_prompt(prompt, prompt_type='questions', validate=validate)
+
+    # Stop reading as soon as the fifth question is closed
+    parser = regex.BracketParser()
+    chunks = []
+    started = time.monotonic()
+    for chunk in llm.stream_prompt(prompt, prompt_type='questions', validate=validate):
+        chunks.append(chunk)
+        closed = parser.feed(chunk)
+        if closed and len(parser.items) == len(closed):
+            _record_first_question(time.monotonic() - started)
+        if len(parser.items) >= QUESTION_COUNT:
+            break
+    return ''.join(chunks) or None
 
 def create_interview_question(resume,position):
-    raw_questions = make_question(make_commentary(resume,position))
-    cleaned_questions_array = regex.extract_bracketed_text(raw_questions)
-    return cleaned_questions_array
\ No newline at end of file
+    package = create_interview_packages([(resume, position)])[0]
+    return package['questions'] if package else None
+
+def create_interview_questions(candidates):
+    """
+    Batch version of create_interview_question.
+
+    Args:
+        candidates: list of (resume, position) tuples
+
+    Returns:
+        list of question lists in the same order, None where a call failed
+    """
+    return [package['questions'] if package else None for package in create_interview_packages(candidates)]
+
+def _record_first_question(seconds):
+    """Time from sending a streamed question prompt until its first question closed."""
+    metrics.observe('llm_time_to_first_question_seconds', seconds)
+
+def stream_questions(commentaries):
+    """
+    Generate the questions for many commentaries concurrently over streamed responses.
+
+    Questions are parsed as their closing bracket arrives, and each stream is
+    cancelled once it produced QUESTION_COUNT questions, so trailing chatter
+    is never generated.
+
+    Returns:
+        list of question lists in the same order, None where a call failed
+    """
+    parsers = [regex.BracketParser() for _ in commentaries]
+    started = time.monotonic()
+
+    def on_chunk(i, chunk):
+        closed = parsers[i].feed(chunk)
+        if closed and len(parsers[i].items) == len(closed):
+            _record_first_question(time.monotonic() - started)
+        return len(parsers[i].items) >= QUESTION_COUNT
+
+    raw_questions = llm.stream_prompts(
+        [prompt_for_questions(com) for com in commentaries], on_chunk, prompt_type='questions',
+        validate=_has_questions
+    )
+    return [
+        parser.items[:QUESTION_COUNT] if raw is not None else None
+        for parser, raw in zip(parsers, raw_questions)
+    ]
+
+def _chain_packages(candidates):
+    """Two-step chain: all commentaries concurrently, then all question prompts."""
+    commentaries = llm.send_prompts(
+        [prompt_for_commentary(res, des) for res, des in candidates], prompt_type='commentary',
+        validate=_has_text
+    )
+
+    ready = [i for i, com in enumerate(commentaries) if com]
+    if config.LLM_STREAMING:
+        questions = stream_questions([commentaries[i] for i in ready])
+    else:
+        questions = [
+            regex.extract_bracketed_text(raw) if raw is not None else None
+            for raw in llm.send_prompts(
+                [prompt_for_questions(commentaries[i]) for i in ready], prompt_type='questions',
+                validate=_has_questions
+            )
+        ]
+
+    results = [None] * len(candidates)
+    for i, question_list in zip(ready, questions):
+        # A reply without (enough) bracketed questions is a failed call
+        question_list = usable_questions(question_list)
+        if question_list:
+            results[i] = {
+                'commentary': commentaries[i],
+                'questions': question_list
+            }
+    return results
+
+def compact_candidates(candidates):
+    """Compact every resume to config.RESUME_TOKEN_BUDGET and report the tokens saved."""
+    compacted = []
+    for i, (resume, position) in enumerate(candidates):
+        resume, stats = compact_resume(resume)
+        metrics.inc('resume_tokens_saved_total', stats['tokens_saved'])
+        if stats['tokens_saved']:
+            logger.debug(f"🗜️ Candidate {i + 1}: resume compacted from {stats['tokens_before']} to "
+                         f"{stats['tokens_after']} tokens ({stats['tokens_saved']} saved)")
+        compacted.append((resume, position))
+    return compacted
+
+def create_interview_packages(candidates):
+    """
+    Generate the resume commentary and interview questions for many candidates.
+
+    With QUESTION_MODE 'structured' each candidate costs one request that
+    returns both as JSON. Candidates whose reply fails validation, and every
+    candidate once the model turns out not to support structured output, go
+    through the two-step commentary -> questions chain instead.
+
+    Args:
+        candidates: list of (resume, position) tuples
+
+    Returns:
+        list of {'commentary', 'questions'} dicts in the same order, None where a call failed
+    """
+    candidates = compact_candidates(candidates)
+    results = [None] * len(candidates)
+    pending = list(range(len(candidates)))
+
+    if config.QUESTION_MODE == 'structured' and llm.structured_output_supported():
+        packages = llm.send_structured_prompts(
+            [prompt_for_interview_package(*candidates[i]) for i in pending],
+            "interview_package",
+            INTERVIEW_PACKAGE_SCHEMA,
+            validate=lambda i, package: parse_interview_package(package) is not None
+        )
+        for i, package in zip(pending, packages):
+            results[i] = parse_interview_package(package)
+        pending = [i for i in pending if results[i] is None]
+        if pending:
+            logger.warning(f"↩️ Structured reply unusable for {len(pending)} candidates, falling back to the two-step chain")
+
+    if pending:
+        for i, package in zip(pending, _chain_packages([candidates[i] for i in pending])):
+            results[i] = package
+    return results
+
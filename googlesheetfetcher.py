@@ -1,20 +1,46 @@
-import gspread
-from gspread.utils import GridRangeType
-from oauth2client.service_account import ServiceAccountCredentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from PyPDF2 import PdfReader
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+import mmap
 import re
+import signal
+import tempfile
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
 import json
+import logging
 import os
 from datetime import datetime
-from datamanager import ResponseDB
+from datamanager import ResponseDB, ANSWER_MISSING
+from attachment_cache import AttachmentCache
+from deadlines import Deadline, DeadlineExceeded
 import config
+import deadlines
+import drive_download
+import metrics
+import services
+
+logger = logging.getLogger(__name__)
 # Configuration constants
 # Field mappings for form responses
 # Add/modify fields here when form questions change
 FIELD_MAPPINGS = config.FIELD_MAPPINGS
+ANSWER_FIELD_MAPPINGS = config.ANSWER_FIELD_MAPPINGS
+
+# Drive MIME types of the attachment formats we accept
+MIME_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+# WordprocessingML namespace used in word/document.xml
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# Separates the pages of extracted PDF text, so compaction can tell running headers/footers
+# from repeated content (a form feed on a line of its own)
+PAGE_BREAK = '\n\f\n'
 
 def sanitize_field_name(field_name):
     """Convert field names to lowercase with underscores instead of spaces."""
@@ -25,76 +51,182 @@ def setup_directories():
     for directory in [config.OUTPUT_DIR, config.RESUME_CV_DIR, config.ANSWERS_DIR]:
         if not os.path.exists(directory):
             os.makedirs(directory)
-            print(f"Created directory: {directory}")
+            logger.info(f"Created directory: {directory}")
+
+def load_credentials():
+    """Return the service account credentials (read once, see services)."""
+    return services.credentials()
+
+def build_drive_service(creds):
+    """Build a new Google Drive service (not thread-safe, use one per thread)."""
+    return services.build_drive_service(creds)
 
 def initialize_google_services():
-    """Initialize and return Google Sheets and Drive services."""
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        config.CREDENTIALS_FILE,
-        config.SCOPES
-    )
-    
-    sheets_client = gspread.authorize(creds)
-    drive_service = build('drive', 'v3', credentials=creds)
+    """Return the shared Google Sheets client and a Drive service of the caller's own."""
+    sheets_client = services.sheets_client()
+    drive_service = services.build_drive_service(services.credentials())
     
     return sheets_client, drive_service
 
-def download_file_from_drive(service, file_id, mime_type='application/pdf'):
+def get_file_metadata(service, file_id):
+    """Fetch the type and version (md5Checksum/modifiedTime) of a Drive file in one request."""
+    return service.files().get(
+        fileId=file_id,
+        fields='mimeType,md5Checksum,modifiedTime,size'
+    ).execute()
+
+def download_file_from_drive(service, file_id, mime_type='application/pdf', file_metadata=None,
+                             destination=None, deadline=None):
     """
     Download a file from Google Drive using the Drive API.
+
+    The file is streamed to disk in resumable chunks, large files in
+    parallel range requests (see drive_download).
     
     Args:
         service: Google Drive service instance
         file_id: ID of the file to download
         mime_type: Expected MIME type of the file
+        file_metadata: Result of get_file_metadata, fetched if not given
+        destination: Path to stream the file to. If not given, the file
+                     goes to a temporary one and its content is returned.
+        deadline: Deadline checked before every chunk (the applied one if not given)
     
     Returns:
-        BytesIO object containing the file content
+        destination if given, otherwise the file content as bytes
+
+    Raises:
+        DeadlineExceeded: the deadline passed before the download finished
     """
+    deadline = deadlines.resolve(deadline)
     try:
         # Verify file type
-        file_metadata = service.files().get(fileId=file_id, fields='mimeType').execute()
+        file_metadata = file_metadata or get_file_metadata(service, file_id)
         if file_metadata['mimeType'] != mime_type:
             raise ValueError(f"File is not the expected type. Expected: {mime_type}, Got: {file_metadata['mimeType']}")
 
-        # Download file
-        request = service.files().get_media(fileId=file_id)
-        file_content = BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
-        
-        # Show download progress
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                print(f"Download Progress: {int(status.progress() * 100)}%")
-                
-        file_content.seek(0)
-        return file_content.read()
+        size = int(file_metadata['size']) if file_metadata.get('size') else None
+        if destination:
+            drive_download.download(service, file_id, destination, size, deadline)
+            return destination
+
+        fd, path = tempfile.mkstemp(suffix='.download')
+        os.close(fd)
+        try:
+            drive_download.download(service, file_id, path, size, deadline)
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
         
     except Exception as e:
-        print(f"Error downloading file: {str(e)}")
+        logger.error(f"Error downloading file: {str(e)}")
         raise
 
-def extract_text_from_pdf(pdf_content):
-    """Extract text content from a PDF file."""
+@contextmanager
+def _time_limit(seconds):
+    """
+    Raise TimeoutError in the block after `seconds`.
+
+    Uses SIGALRM, so it only interrupts a stuck parser in a process's main
+    thread (which is where the extraction pool runs jobs). Elsewhere it is a
+    no-op and join_text_with_budget's per-page deadline check applies instead.
+    """
+    if (not seconds or not hasattr(signal, 'setitimer')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise TimeoutError(f"extraction timed out after {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def join_text_with_budget(pieces, max_chars=None, timeout=None, separator='\n'):
+    """
+    Join text pieces (pages, paragraphs) with `separator` until the character budget is used up.
+
+    `pieces` is consumed lazily, so the pages after the cutoff are never
+    parsed.
+
+    Args:
+        pieces: iterable of text pieces
+        max_chars: character budget (config.EXTRACT_MAX_CHARS)
+        timeout: seconds after which reading stops with a TimeoutError (config.EXTRACT_TIMEOUT)
+
+    Returns:
+        str: the joined text, cut off at the budget
+    """
+    max_chars = max_chars or config.EXTRACT_MAX_CHARS
+    timeout = timeout or config.EXTRACT_TIMEOUT
+    deadline = time.monotonic() + timeout
+    parts = []
+    used = 0
+    with _time_limit(timeout):
+        for piece in pieces:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"extraction timed out after {timeout}s")
+            if used + len(piece) >= max_chars:
+                parts.append(piece[:max_chars - used])
+                logger.debug(f"✂️ Text cut off at {max_chars} characters")
+                break
+            parts.append(piece)
+            used += len(piece) + len(separator)
+    if hasattr(pieces, 'close'):
+        pieces.close()
+    return separator.join(parts)
+
+def extract_text_from_pdf(pdf_content, max_chars=None, timeout=None):
+    """Extract text content from a PDF file, parsing each page once and stopping at the budget."""
     try:
         with BytesIO(pdf_content) as pdf_file:
-            reader = PdfReader(pdf_file)
-            return '\n'.join(
-                page.extract_text() for page in reader.pages
-                if page.extract_text()
-            )
+            return join_text_with_budget(iter_pdf_pages(pdf_file), max_chars, timeout, PAGE_BREAK)
     except Exception as e:
         return f"Error processing PDF: {str(e)}"
 
-def extract_text_from_docx(docx_content):
-    """Extract text content from a DOCX file."""
-    document = Document(docx_content)
+def iter_pdf_pages(pdf_file):
+    """Yield the text of each page of a PDF (path or file object), one page at a time."""
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(pdf_file)
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            yield text
+
+def iter_docx_paragraphs(docx_file):
+    """
+    Yield the text of each paragraph of a DOCX (path or file object).
+
+    word/document.xml is parsed incrementally and every paragraph is
+    discarded once read, so large documents never sit fully in memory.
+    """
+    with zipfile.ZipFile(docx_file) as archive, archive.open('word/document.xml') as document:
+        parts = []
+        for _, element in ET.iterparse(document, events=('end',)):
+            if element.tag == W_NS + 't':
+                parts.append(element.text or '')
+            elif element.tag == W_NS + 'tab':
+                parts.append('\t')
+            elif element.tag in (W_NS + 'br', W_NS + 'cr'):
+                parts.append('\n')
+            elif element.tag == W_NS + 'p':
+                text = ''.join(parts)
+                parts = []
+                element.clear()
+                if text:
+                    yield text
+
+def extract_text_from_docx(docx_file, max_chars=None, timeout=None):
+    """Extract text content from a DOCX file (path or file object), stopping at the budget."""
     try:
-        return '\n'.join(
-            paragraph.text for paragraph in document.paragraphs
-            if paragraph.text)
+        return join_text_with_budget(iter_docx_paragraphs(docx_file), max_chars, timeout)
     except Exception as e:
         return f"Error processing DOCX: {str(e)}"
 
@@ -112,15 +244,34 @@ def extract_file_id(url):
             return match.group(1)
     return None
 
-def process_attachment(drive_service, url, field_config, response_id):
+def extract_text_from_file(filepath, max_chars=None, timeout=None):
     """
-    Process an attachment field from the form response.
+    Extract text from a saved PDF or DOCX, streaming it from disk.
+
+    PDFs are memory-mapped rather than read into memory, and only the pages
+    needed to fill the character budget are parsed. Module level so a
+    process pool can run it.
+    """
+    if filepath.endswith('.docx'):
+        return extract_text_from_docx(filepath, max_chars, timeout)
+    try:
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pdf_file:
+            return join_text_with_budget(iter_pdf_pages(pdf_file), max_chars, timeout, PAGE_BREAK)
+    except Exception as e:
+        return f"Error processing PDF: {str(e)}"
+
+def download_attachment(drive_service, url, field_config, response_id, cache=None, deadline=None):
+    """
+    Download and save an attachment field from the form response.
     
     Args:
         drive_service: Google Drive service instance
         url: URL of the attachment
         field_config: Configuration for this field
         response_id: Unique identifier for this response
+        cache: Optional AttachmentCache. On a hit the download is skipped and
+               'extracted_text' is filled from the memoized text if available.
+        deadline: Optional Deadline of the download
         
     Returns:
         dict containing processed attachment information
@@ -136,52 +287,352 @@ def process_attachment(drive_service, url, field_config, response_id):
         file_id = extract_file_id(url)
         if not file_id:
             raise ValueError("Could not extract file ID from URL")
-            
-        # Download file
-        content = download_file_from_drive(
-            drive_service, 
-            file_id, 
-            f"application/{field_config['format']}"
+
+        file_metadata = get_file_metadata(drive_service, file_id)
+        version = file_metadata.get('md5Checksum') or file_metadata.get('modifiedTime')
+
+        # A field accepts one 'format' or a list of 'formats' (e.g. pdf or docx)
+        formats = field_config.get('formats', [field_config.get('format')])
+        file_format = next(
+            (fmt for fmt in formats if MIME_TYPES.get(fmt) == file_metadata['mimeType']),
+            formats[0]
         )
-        
-        # Save file
+        mime_type = MIME_TYPES.get(file_format, f"application/{file_format}")
+
+        if cache and version and file_metadata['mimeType'] == mime_type:
+            cached = cache.lookup(file_id, version)
+            if cached:
+                result.update(cached)
+                return result
+            
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{response_id}_{timestamp}.{field_config['format']}"
-        filepath = os.path.join(config.RESUME_CV_DIR, filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(content)
+        filename = f"{response_id}_{timestamp}.{file_format}"
+        directory = cache.directory if cache and version else field_config.get('directory', config.RESUME_CV_DIR)
+        filepath = os.path.join(directory, filename)
+
+        # Download file, streamed straight to disk
+        try:
+            with metrics.timer('stage_duration_seconds', stage='drive_download'):
+                download_file_from_drive(
+                    drive_service, 
+                    file_id, 
+                    mime_type,
+                    file_metadata,
+                    destination=filepath,
+                    deadline=deadline
+                )
+        except Exception:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            raise
         
+        # Move it into the cache
+        if cache and version:
+            result['content_hash'], result['local_path'] = cache.store_file(
+                file_id, version, filepath, file_format
+            )
+            return result
+
         result['local_path'] = filepath
-        
-        # Extract text if configured
-        if field_config.get('extract_text'):
-            result['extracted_text'] = extract_text_from_pdf(content)
             
     except Exception as e:
         result['error'] = str(e)
         
     return result
 
-def process_responses():
-    """Main function to process form responses"""
+def extract_text_timed(filepath, timeout=None):
+    """extract_text_from_file plus its duration, so pool workers can report timings back."""
+    started = time.perf_counter()
+    text = extract_text_from_file(filepath, timeout=timeout)
+    return text, time.perf_counter() - started
+
+def _extraction_timeout(deadline):
+    """Timeout for extracting a document: EXTRACT_TIMEOUT, or less if the deadline is closer."""
+    if deadline is None:
+        return None
+    deadline.check('extract')
+    return deadline.timeout(config.EXTRACT_TIMEOUT)
+
+def _record_extraction(text, seconds):
+    metrics.observe('stage_duration_seconds', seconds, stage='extract')
+    if text is None or text.startswith("Error processing"):
+        metrics.inc('failures_total', stage='extract')
+
+def _memoize_text(cache, result):
+    """Store freshly extracted text in the cache, unless extraction failed."""
+    text = result.get('extracted_text')
+    if cache and result.get('content_hash') and text is not None and not text.startswith("Error processing"):
+        cache.store_text(result['content_hash'], text)
+
+def process_attachment(drive_service, url, field_config, response_id, cache=None, deadline=None):
+    """
+    Process an attachment field from the form response.
+    
+    Args:
+        drive_service: Google Drive service instance
+        url: URL of the attachment
+        field_config: Configuration for this field
+        response_id: Unique identifier for this response
+        cache: Optional AttachmentCache to reuse earlier downloads and text
+        deadline: Deadline of the download and extraction (the applied one if not given)
+        
+    Returns:
+        dict containing processed attachment information
+    """
+    deadline = deadlines.resolve(deadline)
+    result = download_attachment(drive_service, url, field_config, response_id, cache, deadline)
+    
+    # Extract text if configured (and not already memoized)
+    if result['local_path'] and field_config.get('extract_text') and result['extracted_text'] is None:
+        try:
+            result['extracted_text'], seconds = extract_text_timed(result['local_path'], _extraction_timeout(deadline))
+            _record_extraction(result['extracted_text'], seconds)
+            _memoize_text(cache, result)
+        except Exception as e:
+            result['error'] = str(e)
+        
+    return result
+
+def process_attachments_concurrently(jobs, drive_service_factory=None, cache=None,
+                                     download_workers=None, extract_workers=None, deadline=None):
+    """
+    Run attachment jobs through a staged worker pool.
+
+    Drive downloads run in a bounded thread pool (one Drive service per
+    thread, the client is not thread-safe), borrowed from the shared pool in
+    services unless a factory is given. Text extraction is CPU-bound and
+    runs in a process pool. A failure only marks that item's result['error'],
+    the same way process_attachment does.
+
+    Every job gets config.ATTACHMENT_DEADLINE (or what is left of `deadline`)
+    once its download starts. A job still running past it is abandoned with
+    a deadline error, so one stuck download can't hold up the others.
+
+    Args:
+        jobs: list of (key, url, field_config, response_id) tuples
+        drive_service_factory: callable returning a new Drive service
+                               (services.acquire_drive_service if not given)
+        cache: Optional AttachmentCache, hits skip both download and extraction
+        download_workers: max concurrent downloads (config.DOWNLOAD_WORKERS)
+        extract_workers: max concurrent extractions (config.EXTRACT_WORKERS)
+        deadline: Deadline of all the jobs (the applied one if not given)
+
+    Yields:
+        (key, result) pairs as each attachment finishes
+    """
+    if not jobs:
+        return
+
+    deadline = deadlines.resolve(deadline)
+    local = threading.local()
+    borrowed = []
+    job_deadlines = {}  # key -> Deadline, set when its download starts
+    abandoned = False
+
+    def download(key, url, field_config, response_id):
+        seconds = config.ATTACHMENT_DEADLINE
+        if deadline is not None:
+            seconds = min(seconds, deadline.remaining())
+        job_deadline = job_deadlines[key] = Deadline(seconds)
+        if not hasattr(local, 'drive_service'):
+            local.drive_service = (drive_service_factory or services.acquire_drive_service)()
+            borrowed.append(local.drive_service)
+        return download_attachment(local.drive_service, url, field_config, response_id, cache, job_deadline)
+
+    def expired(key):
+        metrics.inc('deadline_exceeded_total', step='attachment')
+        return f"attachment cut off by the {job_deadlines[key].seconds:g}s deadline"
+
+    download_pool = ThreadPoolExecutor(max_workers=download_workers or config.DOWNLOAD_WORKERS)
+    extract_pool = ProcessPoolExecutor(max_workers=extract_workers or config.EXTRACT_WORKERS)
+    try:
+        downloads = {
+            download_pool.submit(download, key, url, field_config, response_id): (key, field_config)
+            for key, url, field_config, response_id in jobs
+        }
+        extractions = {}
+        running = set(downloads)
+
+        # Hand each download to the extraction stage as soon as it finishes
+        while running:
+            done, running = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in downloads:
+                    key, field_config = downloads.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        yield key, {'original_url': None, 'local_path': None, 'extracted_text': None, 'error': str(e)}
+                        continue
+
+                    if (result['local_path'] and field_config.get('extract_text')
+                            and result['extracted_text'] is None):
+                        try:
+                            timeout = _extraction_timeout(job_deadlines[key])
+                        except DeadlineExceeded as e:
+                            result['error'] = str(e)
+                            yield key, result
+                            continue
+                        extraction = extract_pool.submit(extract_text_timed, result['local_path'], timeout)
+                        extractions[extraction] = (key, result)
+                        running.add(extraction)
+                    else:
+                        yield key, result
+                else:
+                    key, result = extractions.pop(future)
+                    try:
+                        result['extracted_text'], seconds = future.result()
+                        _record_extraction(result['extracted_text'], seconds)
+                        _memoize_text(cache, result)
+                    except Exception as e:
+                        result['error'] = str(e)
+                    yield key, result
+
+            # Give up on jobs that overran their deadline (a hung download or parser)
+            for future in list(running):
+                key = downloads[future][0] if future in downloads else extractions[future][0]
+                if key in job_deadlines and job_deadlines[key].expired():
+                    running.discard(future)
+                    future.cancel()
+                    abandoned = True
+                    if future in downloads:
+                        del downloads[future]
+                        yield key, {'original_url': None, 'local_path': None, 'extracted_text': None,
+                                    'error': expired(key)}
+                    else:
+                        _, result = extractions.pop(future)
+                        result['error'] = expired(key)
+                        yield key, result
+    finally:
+        # Don't wait for abandoned jobs, their threads/processes finish (or time out) on their own
+        download_pool.shutdown(wait=not abandoned, cancel_futures=True)
+        extract_pool.shutdown(wait=not abandoned, cancel_futures=True)
+        # The download threads are done, the Drive services can go back to the pool. If a job
+        # was abandoned its thread may still be using one, so they are dropped instead.
+        if drive_service_factory is None and not abandoned:
+            for drive_service in borrowed:
+                services.release_drive_service(drive_service)
+
+
+def reprocess_attachments(rows, cache=None, deadline=None):
+    """
+    Download and extract the attachment fields of stored responses again.
+
+    Used for responses whose attachments failed the first time round.
+
+    Args:
+        rows: stored response dicts
+        cache: AttachmentCache to use (the resume cache if not given)
+        deadline: Deadline of the downloads and extractions (the applied one if not given)
+
+    Returns:
+        list of {field_name: attachment result} dicts in the same order
+    """
+    jobs = []
+    for i, row in enumerate(rows):
+        for field_name, field_config in FIELD_MAPPINGS.items():
+            if field_config['type'] != 'attachment':
+                continue
+            url = ((row.get(field_name) or {}).get('original_url')
+                   or row.get(config.KEYMAP.get(sanitize_field_name(field_name))))
+            if url:
+                jobs.append(((i, field_name), url, field_config, row.get('phone_number')))
+
+    results = [{} for _ in rows]
+    cache = cache or AttachmentCache(config.RESUME_CV_DIR)
+    for (i, field_name), result in process_attachments_concurrently(jobs, cache=cache, deadline=deadline):
+        results[i][field_name] = result
+    return results
+
+def _first_cell(value_range):
+    """Return the first cell of a batch_get value range as a string ('' if empty)."""
+    if value_range and value_range[0]:
+        return str(value_range[0][0])
+    return ''
+
+def fetch_new_responses(sheet, db, full_resync=False):
+    """
+    Fetch only the rows added to a worksheet since the last sync.
+
+    The last processed row number (and its timestamp) is kept as a cursor in
+    the database. Before fetching, one cheap batch request probes the cursor
+    row and the row after it: if the cursor row still holds the same
+    timestamp and the next row is empty, nothing changed and the fetch is
+    skipped. If the cursor row changed (rows deleted/sorted), we fall back to
+    a full re-sync, which is safe because rows are still duplicate-checked.
+
+    Args:
+        sheet: gspread worksheet
+        db: ResponseDB holding the cursor
+        full_resync: Ignore the cursor and fetch every row
+
+    Returns:
+        tuple (responses, cursor): list of (row_number, response dict) pairs
+        and the cursor to store once they are processed (None if nothing new)
+    """
+    cursor_key = f"sheet_cursor:{sheet.title}"
+    cursor = None if full_resync else db.get_meta(cursor_key)
+
+    if cursor:
+        cursor_cell, next_cell = sheet.batch_get([f"A{cursor['row']}", f"A{cursor['row'] + 1}"])
+        if _first_cell(cursor_cell) != str(cursor['timestamp']):
+            logger.warning(f"⚠️ Rows in '{sheet.title}' changed since the last sync, running a full re-sync...")
+            cursor = None
+        elif not _first_cell(next_cell):
+            return [], None
+
+    from gspread.utils import numericise_all
+
+    first_row = cursor['row'] + 1 if cursor else 2
+    header_range, data_range = sheet.batch_get(["1:1", f"A{first_row}:ZZZ"])
+    header = header_range[0] if header_range else []
+
+    responses = []
+    for row_number, row in enumerate(data_range, first_row):
+        if not any(row):
+            continue
+        # Pad trimmed trailing cells and numericise like get_all_records() does
+        row = numericise_all(row + [''] * (len(header) - len(row)), default_blank='')
+        responses.append((row_number, dict(zip(header, row))))
+
+    if not responses:
+        return [], None
+
+    last_row, last_response = responses[-1]
+    return responses, {'row': last_row, 'timestamp': last_response.get('Timestamp', '')}
+
+def process_responses(db=None, full_resync=False):
+    """
+    Main function to process form responses
+
+    Args:
+        db: ResponseDB to store responses in (a new one is opened if not given)
+        full_resync: Re-read every row of the sheet instead of only the new ones
+    """
     setup_directories()
-    sheets_client, drive_service = initialize_google_services()
-    db = ResponseDB()
+    db = db or ResponseDB()
 
-    # Get form responses
-    sheet = sheets_client.open(config.SPREADSHEET_NAME).worksheet("Form Responses 1") # Changed to use worksheet name instead of number
-    responses = sheet.get_all_records()
+    # Get form responses (the worksheet is opened once and reused every cycle)
+    sheet = services.worksheet(config.RESPONSE_WORKSHEET_NAME)
+    with metrics.timer('stage_duration_seconds', stage='sheet_fetch'):
+        rows, cursor = fetch_new_responses(sheet, db, full_resync)
+    responses = [response for _, response in rows]
+    row_numbers = [row_number for row_number, _ in rows]
 
-    # list_of_lists = sheet.get(return_type=GridRangeType.ListOfLists)
-    # responses = [dict(zip(list_of_lists[0], row)) for row in list_of_lists[1:]]
+    if not responses:
+        logger.info("📭 No new responses since the last sync")
+        return
 
-    print(f"📥 Found {len(responses)} responses to process...")
+    logger.info(f"📥 Found {len(responses)} responses to process...")
 
     # Track processed and skipped responses
     processed_count = 0
     skipped_count = 0
 
+    # Responses waiting for their attachments, and the attachment jobs
+    pending = {}
+    attachment_jobs = []
+
     # Process each response
     for idx, response in enumerate(responses, 1):
         phone_number = str(response.get('Phone Number', ''))  # Convert to string for consistency
@@ -190,12 +641,13 @@ def process_responses():
         # Check if response already exists
 
         if db.check_duplicate(phone_number, timestamp):
-            print(f"⏭️ Skipping duplicate response {idx}/{len(responses)} "
-                  f"(Phone: {phone_number}, Timestamp: {timestamp})")
+            logger.debug(f"⏭️ Skipping duplicate response {idx}/{len(responses)} "
+                         f"(Phone: {phone_number}, Timestamp: {timestamp})")
             skipped_count += 1
             continue
 
-        response_id = response.get('id', datetime.now().strftime('%Y%m%d_%H%M%S'))
+        # Row number keeps ids unique for rows fetched within the same second
+        response_id = response.get('id', f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{row_numbers[idx - 1]}")
 
         KEYMAP = config.KEYMAP
         processed_response = {}
@@ -204,6 +656,17 @@ def process_responses():
             field_name = sanitize_field_name(key)
             processed_response[KEYMAP.get(field_name)] = value
         
+        # A resubmission replaces the stored response; keep the questions it got, so the
+        # question stage can reuse them if the resume barely changed (see MainPipeline.match_near_duplicate)
+        earlier = db.get_response(phone_number)
+        if earlier and earlier.get('questions') and earlier.get('resume_commentary'):
+            processed_response["previous_submission"] = {
+                key: earlier.get(key)
+                for key in ('timestamp', 'posisi_yang_diinginkan', 'questions', 'resume_commentary')
+            }
+        elif earlier and earlier.get('previous_submission'):
+            processed_response["previous_submission"] = earlier['previous_submission']
+
         # Add extra fields with default values
         processed_response["answer_file"] = ""
         processed_response["questions"] = ""
@@ -211,41 +674,196 @@ def process_responses():
         processed_response["eval"] = ""
         processed_response["score"] = 0
         
-        # Process special fields
+        # Queue special fields for the attachment workers
+        fields = []
         for field_name, field_config in FIELD_MAPPINGS.items():
             if field_name in response and response[field_name]:
                 if field_config['type'] == 'attachment':
-                    processed_response[field_name] = process_attachment(
-                        drive_service,
+                    attachment_jobs.append((
+                        (idx, field_name),
                         response[field_name],
                         field_config,
                         response_id
-                    )
-        
-        # Save to database
+                    ))
+                    fields.append(field_name)
+
+        pending[idx] = (processed_response, response_id, set(fields))
+
+    # Save responses as they become complete (ResponseDB batches the writes)
+    def commit(idx):
+        nonlocal processed_count
+        processed_response, response_id, _ = pending.pop(idx)
         db.upsert_response(processed_response)
-        print(f"✅ Processed response {idx}/{len(responses)} (ID: {response_id})")
+        logger.debug(f"✅ Processed response {idx}/{len(responses)} (ID: {response_id})")
         processed_count += 1
 
-    print(f"\n🎉 Processing complete:")
-    print(f"   ✅ Successfully processed: {processed_count} responses")
-    print(f"   ⏭️ Skipped duplicates: {skipped_count} responses")
-    print(f"💾 Database saved to: {config.DATABASE_FILE}")
+    for idx in [idx for idx, (_, _, fields) in pending.items() if not fields]:
+        commit(idx)
+
+    cache = AttachmentCache(config.RESUME_CV_DIR)
+    results = process_attachments_concurrently(attachment_jobs, cache=cache)
+    for (idx, field_name), result in results:
+        processed_response, _, fields = pending[idx]
+        processed_response[field_name] = result
+        fields.discard(field_name)
+        if not fields:
+            commit(idx)
+
+    logger.info(f"🎉 Processing complete:")
+    logger.info(f"   ✅ Successfully processed: {processed_count} responses")
+    logger.info(f"   ⏭️ Skipped duplicates: {skipped_count} responses")
+    logger.info(f"💾 Database saved to: {db.storage.db_path}")
+
+    # Only move the cursor once every fetched row has been stored
+    db.set_meta(f"sheet_cursor:{sheet.title}", cursor)
+
+def match_candidate(db, response):
+    """
+    Find the stored candidate an answer-sheet row belongs to.
+
+    Matches by email first (indexed), then by phone number. If an email was
+    used for several submissions, the one waiting for answers wins.
+    """
+    email = str(response.get('Email Address', '')).strip()
+    if email:
+        candidates = db.find_by_email(email)
+        if candidates:
+            waiting = [c for c in candidates if c.get('questions') and not c.get('answers')]
+            return (waiting or candidates)[-1]
+
+    phone_number = str(response.get('Phone Number', ''))
+    if phone_number:
+        return db.get_response(phone_number)
+    return None
+
+def process_answer_responses(db=None, full_resync=False):
+    """
+    Process responses from the answer sheet.
+
+    New rows are read incrementally, matched to their candidate, and the
+    answer files are downloaded and extracted through the same worker pools
+    as resumes. The extracted text is stored as the candidate's 'answers',
+    which puts the candidate in the 'answered' status for AnswerPipeline.
+    A row without an answer file is stored too, as answer_status 'missing'
+    (status 'no_answer').
+
+    A row whose download or extraction fails keeps the cursor before it so
+    the next sync retries it. After config.QUEUE_MAX_ATTEMPTS failed syncs
+    it is parked as a dead letter: its error is stored in 'answer_file' and
+    the cursor moves on. `--answers --full-resync` tries parked rows again.
 
-def process_answer_responses():
-    """Process responses from the answer sheet."""
+    Args:
+        db: ResponseDB to store answers in (a new one is opened if not given)
+        full_resync: Re-read every row of the sheet instead of only the new ones
+    """
     setup_directories()
-    sheets_client, drive_service = initialize_google_services()
-    db = ResponseDB()
+    db = db or ResponseDB()
+
+    # Get answer responses
+    sheet = services.worksheet(config.ANSWER_WORKSHEET_NAME)
+    with metrics.timer('stage_duration_seconds', stage='sheet_fetch'):
+        rows, cursor = fetch_new_responses(sheet, db, full_resync)
 
-    # Get form responses
-    sheet = sheets_client.open(config.SPREADSHEET_NAME).worksheet("Form Response 2")
-    responses = sheet.get_all_records()
+    if not rows:
+        logger.info("📭 No new answers since the last sync")
+        return
 
-    print(f"📥 Found {len(responses)} responses to process...")
+    logger.info(f"📥 Found {len(rows)} answers to process...")
 
     # Track processed and skipped responses
     processed_count = 0
     skipped_count = 0
+    unmatched_count = 0
+
+    updates = {}
+    attachment_jobs = []
+    for row_number, response in rows:
+        candidate = match_candidate(db, response)
+        if candidate is None:
+            logger.warning(f"❓ No candidate found for answer row {row_number} "
+                           f"(Email: {response.get('Email Address', '')}, Phone: {response.get('Phone Number', '')})")
+            unmatched_count += 1
+            continue
+
+        timestamp = response.get('Timestamp', '')
+        if candidate.get('answer_timestamp') == timestamp:
+            logger.debug(f"⏭️ Skipping already ingested answer row {row_number}")
+            skipped_count += 1
+            continue
+
+        fields = updates[row_number] = {'phone_number': candidate['phone_number'], 'answer_timestamp': timestamp}
+        jobs = [
+            ((row_number, field_name), response[field_name], field_config, candidate['phone_number'])
+            for field_name, field_config in ANSWER_FIELD_MAPPINGS.items()
+            if response.get(field_name) and field_config['type'] == 'attachment'
+        ]
+        if not jobs:
+            logger.warning(f"📭 Answer row {row_number} has no answer file")
+            fields['answer_status'] = ANSWER_MISSING
+        attachment_jobs.extend(jobs)
+
+    # Failed syncs so far of each answer row, by "phone:timestamp"
+    failures_key = f"answer_failures:{sheet.title}"
+    failures = db.get_meta(failures_key, {})
+    failed_rows = set()
+    parked_count = 0
+    cache = AttachmentCache(config.ANSWERS_DIR)
+    results = process_attachments_concurrently(attachment_jobs, cache=cache)
+    for (row_number, field_name), result in results:
+        fields = updates[row_number]
+        fields['answer_file'] = result
+        key = f"{fields['phone_number']}:{fields['answer_timestamp']}"
+        if result['error'] or not result['extracted_text'] or result['extracted_text'].startswith("Error processing"):
+            attempts = failures[key] = failures.get(key, 0) + 1
+            logger.error(f"❌ Answer row {row_number} (attempt {attempts}): {result['error'] or result['extracted_text']}")
+            if attempts < config.QUEUE_MAX_ATTEMPTS:
+                failed_rows.add(row_number)
+                continue
+            # Dead letter: store the error, but no answer_timestamp so a full re-sync tries it again
+            del failures[key], fields['answer_timestamp']
+            parked_count += 1
+            metrics.inc('dead_letters_total', status='answer_download')
+            logger.error(f"🪦 Answer row {row_number} failed {attempts} times, parked until retried "
+                         f"with `python googlesheetfetcher.py --answers --full-resync`")
+        else:
+            failures.pop(key, None)
+            fields['answers'] = result['extracted_text']
+            fields['answer_status'] = None
+
+    stored = [fields for row_number, fields in updates.items() if row_number not in failed_rows]
+    with db.transaction():
+        db.upsert_many(stored)
+    processed_count = sum(1 for fields in stored if 'answers' in fields)
+    missing_count = sum(1 for fields in stored if fields.get('answer_status') == ANSWER_MISSING)
+
+    logger.info(f"🎉 Answer processing complete:")
+    logger.info(f"   ✅ Successfully processed: {processed_count} answers")
+    logger.info(f"   📭 Without an answer file: {missing_count} answers")
+    logger.info(f"   🪦 Parked after {config.QUEUE_MAX_ATTEMPTS} failures: {parked_count} answers")
+    logger.info(f"   ⏭️ Skipped duplicates: {skipped_count} answers")
+    logger.info(f"   ❓ Unmatched: {unmatched_count} answers")
+
+    db.set_meta(failures_key, failures)
+
+    # Keep the cursor before the first failed download so it is retried next time
+    if failed_rows:
+        first_failed = min(failed_rows)
+        done = [(row_number, response) for row_number, response in rows if row_number < first_failed]
+        if not done:
+            return
+        cursor = {'row': done[-1][0], 'timestamp': done[-1][1].get('Timestamp', '')}
+    db.set_meta(f"sheet_cursor:{sheet.title}", cursor)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch new form responses into the database")
+    parser.add_argument("--full-resync", action="store_true", help="Re-read every row instead of only the new ones")
+    parser.add_argument("--answers", action="store_true", help="Fetch the answer sheet instead of the resume sheet")
+    args = parser.parse_args()
 
-    
\ No newline at end of file
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(message)s")
+    if args.answers:
+        process_answer_responses(full_resync=args.full_resync)
+    else:
+        process_responses(full_resync=args.full_resync)
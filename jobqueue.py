@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+import config
+import metrics
+from datamanager import derive_status, retry_delay
+
+logger = logging.getLogger(__name__)
+
+# Shared by every JobQueue in the process so any write wakes every stage
+_condition = threading.Condition()
+_generation = 0
+
+
+class JobQueue:
+    """
+    Persistent work queue on top of ResponseDB.
+
+    A response's pipeline status (fetched -> extracted -> questions_generated
+    -> answered -> evaluated) is its position in the queue. Workers claim rows
+    of one status atomically, and a job's result is stored in the same
+    transaction that drops the claim, so finished work is never redone after
+    a crash. Instead of sleeping on a timer, idle workers block until a new
+    job is enqueued or a stage finishes a job.
+
+    Claims are leases: a worker renews them while it works, and rows whose
+    lease expired (the worker's process died or hung) are claimed again.
+    A job that failed config.QUEUE_MAX_ATTEMPTS times is parked as a dead
+    letter (e.g. a scanned resume without a text layer) until someone
+    queues it again with `python datamanager.py --retry-failed`.
+    This is what lets several processes share one SQLite database; writes
+    made by other processes are noticed through the database's data_version.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.postponed = {}  # phone number -> deadline misses in a row (see postpone)
+
+    def generation(self):
+        """Event token; pass it to wait() to not miss events fired while claiming."""
+        with _condition:
+            generation = _generation
+        return generation, self.db.data_version()
+
+    def notify(self):
+        """Wake every idle worker (new rows were enqueued or moved to another stage)."""
+        global _generation
+        with _condition:
+            _generation += 1
+            _condition.notify_all()
+
+    def wait(self, seen, timeout=config.QUEUE_IDLE_TIMEOUT):
+        """
+        Block until an event newer than `seen` (from generation()), a write by
+        another process, or the timeout (for due retries and expired leases).
+        """
+        seen_generation, seen_version = seen
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            with _condition:
+                if _condition.wait_for(lambda: _generation != seen_generation,
+                                       min(remaining, config.QUEUE_POLL_INTERVAL)):
+                    return
+            if self.db.data_version() != seen_version:
+                return
+
+    def claim(self, status, worker_id, limit=config.QUEUE_BATCH_SIZE, backfill_after=None):
+        """
+        Lease rows of a status to a worker. Desired positions take turns (see
+        datamanager.claim_order), and rows submitted more than `backfill_after`
+        seconds ago only go once no fresher row is waiting.
+        """
+        backfill_before = time.time() - backfill_after if backfill_after is not None else None
+        return self.db.claim(status, worker_id, limit, config.QUEUE_LEASE_SECONDS, config.QUEUE_MAX_ATTEMPTS,
+                             backfill_before)
+
+    def renew(self, rows, worker_id):
+        """Extend the leases on rows a worker is still working on."""
+        return self.db.renew([row.get('phone_number') for row in rows], worker_id, config.QUEUE_LEASE_SECONDS)
+
+    def complete(self, row, fields, worker_id):
+        """Store a job's result, which moves the row on to its next stage."""
+        with self.lock:
+            self.postponed.pop(row.get('phone_number'), None)
+        if not self.db.complete(row.get('phone_number'), fields, worker_id):
+            logger.warning(f"⚠️ Lease on {row.get('phone_number')} expired before {worker_id} finished, result dropped")
+        self.notify()
+
+    def fail(self, row, worker_id):
+        """Give a job back; it is retried after an exponential backoff, or parked once it failed too often."""
+        with self.lock:
+            self.postponed.pop(row.get('phone_number'), None)
+        attempts = self.db.release(row.get('phone_number'), worker_id)
+        if attempts is not None and attempts >= config.QUEUE_MAX_ATTEMPTS:
+            status = derive_status(row)
+            metrics.inc('dead_letters_total', status=status)
+            logger.error(f"🪦 {row.get('phone_number')} failed {attempts} times in {status}, "
+                         f"parked until retried with `python datamanager.py --retry-failed`")
+
+    def defer(self, row, worker_id, until):
+        """Give a job back without counting a failed attempt; it can be claimed again at `until` (epoch seconds)."""
+        self.db.release(row.get('phone_number'), worker_id, until)
+
+    def postpone(self, row, worker_id):
+        """
+        Give back a job its deadline cut off. It is retried after an exponential
+        backoff, without counting a failed attempt, so slow work (an overloaded
+        model) is retried rather than parked as a dead letter.
+        """
+        key = row.get('phone_number')
+        with self.lock:
+            misses = self.postponed[key] = self.postponed.get(key, 0) + 1
+        self.defer(row, worker_id, time.time() + retry_delay(misses))
+
+    def depths(self):
+        """Number of responses in each pipeline status."""
+        return self.db.count_by_status()
+
+    def dead_letters(self):
+        """Number of parked (failed too often) responses in each pipeline status."""
+        return self.db.dead_letters(config.QUEUE_MAX_ATTEMPTS)
+
+    def recover(self):
+        """Release claims held by worker processes that are no longer running (see worker ids in pipeline)."""
+        dead = [worker_id for worker_id in self.db.claimed_workers() if not _process_alive(worker_id)]
+        if dead:
+            self.db.release_claims(dead)
+
+
+def _process_alive(worker_id):
+    """Worker ids start with the worker's pid; other hosts' workers are left to lease expiry."""
+    try:
+        pid = int(worker_id.split(':', 1)[0])
+    except ValueError:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -1,20 +1,770 @@
-from openai import OpenAI
+import asyncio
+import email.utils
+import json
 import os
+import queue
+import random
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
+from llm_cache import LLMCache, cache_key
+from llm_scheduler import BudgetExhausted, DailyBudget, FairScheduler, current_work, within
+import config
+import deadlines
+import logging
+import metrics
 load_dotenv()
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key= os.getenv("API_KEY"),
-)
 
-def send_prompt(prompt_array):
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limits and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(error):
+    """Read the server's Retry-After (seconds or HTTP date) from an API error, if any."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
     try:
-        completion = client.chat.completions.create(
-        extra_body={},
-        model="google/gemini-2.0-flash-exp:free",
-        messages=prompt_array
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+class AsyncLLMClient:
+    """
+    asyncio client for an OpenAI-compatible endpoint.
+
+    One AsyncOpenAI client (and so one connection pool) is shared by every
+    request. A semaphore caps the requests in flight, the scheduler hands out
+    the request rate by priority and position (see llm_scheduler) and charges
+    the daily budget, and 429/5xx/connection errors are retried with
+    exponential backoff and jitter, honouring Retry-After when the server
+    sends it.
+    """
+    def __init__(self, base_url=config.LLM_BASE_URL, api_key=None, model=config.LLM_MODEL,
+                 max_in_flight=config.LLM_MAX_IN_FLIGHT,
+                 requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+                 max_retries=config.LLM_MAX_RETRIES,
+                 timeout=config.LLM_TIMEOUT,
+                 budget=None):
+        # Imported on first use, importing llm (e.g. for estimate_tokens) stays cheap
+        from openai import AsyncOpenAI
+
+        self.model = model
+        self.max_retries = max_retries
+        # Retries are handled here so they share the rate limiter
+        self.client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key or os.getenv("API_KEY"),
+            timeout=timeout,
+            max_retries=0,
         )
-        return completion.choices[0].message.content
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.budget = budget
+        self.scheduler = FairScheduler(requests_per_minute / 60, max_in_flight, budget)
+
+    def backoff(self, attempt):
+        delay = min(config.LLM_BACKOFF_MAX, config.LLM_BACKOFF_BASE * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def _with_retries(self, send):
+        """Run `send()` under the scheduler and semaphore, retrying 429/5xx/connection errors."""
+        from openai import APIStatusError, APIConnectionError
+
+        for attempt in range(self.max_retries + 1):
+            # Waiting for a turn doesn't count against the candidate's deadline
+            with deadlines.paused():
+                await self.scheduler.acquire()
+                await self.semaphore.acquire()
+            try:
+                return await send()
+            except APIStatusError as e:
+                if e.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    raise
+                delay = retry_after_seconds(e) or self.backoff(attempt)
+            except APIConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+            finally:
+                self.semaphore.release()
+            metrics.inc('llm_retries_total')
+            logger.warning(f"⏳ LLM request failed, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def complete(self, prompt_array, **params):
+        """
+        Send one chat completion request.
+
+        Returns:
+            str: the message content
+
+        Raises:
+            The last API error once retries are exhausted, or immediately for
+            errors that are not worth retrying (e.g. 400/401).
+            BudgetExhausted if the work's priority class is over its daily budget.
+        """
+        async def send():
+            completion = await self.client.chat.completions.create(
+                extra_body={},
+                model=self.model,
+                messages=prompt_array,
+                **params
+            )
+            if not completion.choices:
+                raise ValueError(f"Empty completion: {completion}")
+            content = completion.choices[0].message.content
+            if self.budget:
+                usage = getattr(completion, 'usage', None)
+                self.budget.charge_tokens(
+                    usage.total_tokens if usage and usage.total_tokens
+                    else estimate_prompt_tokens(prompt_array) + estimate_tokens(content or '')
+                )
+            return content
+
+        return await self._with_retries(send)
+
+    async def stream(self, prompt_array, **params):
+        """
+        Send one chat completion request and yield the content as it arrives.
+
+        Only opening the stream is retried. Closing the generator early
+        closes the HTTP response, so the server stops generating.
+        """
+        async def send():
+            return await self.client.chat.completions.create(
+                extra_body={},
+                model=self.model,
+                messages=prompt_array,
+                stream=True,
+                **params
+            )
+
+        response = await self._with_retries(send)
+        received = 0
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    received += len(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            await response.close()
+            if self.budget:
+                self.budget.charge_tokens(estimate_prompt_tokens(prompt_array) + received // 4 + 1)
+
+
+class ModelStats:
+    """
+    Rolling latency (per prompt type) and error rate of one model.
+
+    A model whose error rate passes config.LLM_ROUTER_MAX_ERROR_RATE is
+    unhealthy for config.LLM_ROUTER_COOLDOWN seconds, then gets a fresh start.
+    """
+    def __init__(self, window=config.LLM_ROUTER_WINDOW):
+        self.window = window
+        self.latencies = {}  # prompt type -> deque of seconds
+        self.outcomes = deque(maxlen=window)  # True for a success
+        self.cooldown_until = 0
+        self.structured_off_until = 0  # set while the model rejects JSON-schema response_format
+
+    def record(self, prompt_type, seconds, ok=True):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.setdefault(prompt_type, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, prompt_type, quantile):
+        """Latency percentile for a prompt type, None until there are enough samples."""
+        samples = self.latencies.get(prompt_type, ())
+        if len(samples) < config.LLM_ROUTER_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+    def error_rate(self):
+        if len(self.outcomes) < config.LLM_ROUTER_MIN_SAMPLES:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def structured_output(self):
+        return time.monotonic() >= self.structured_off_until
+
+    def healthy(self):
+        now = time.monotonic()
+        if now < self.cooldown_until:
+            return False
+        if self.error_rate() > config.LLM_ROUTER_MAX_ERROR_RATE:
+            self.cooldown_until = now + config.LLM_ROUTER_COOLDOWN
+            self.outcomes.clear()
+            return False
+        return True
+
+
+def rejects_response_format(error):
+    """Whether an API error is the endpoint refusing the response_format parameter (not e.g. a too long prompt)."""
+    from openai import APIStatusError
+
+    if not isinstance(error, APIStatusError) or error.status_code not in (400, 422):
+        return False
+    message = f"{error} {getattr(error, 'body', '')}".lower()
+    return any(word in message for word in ('response_format', 'json_schema', 'structured output'))
+
+
+def llm_endpoints():
+    """The configured model pool (config.LLM_ENDPOINTS), defaults filled in from the single-model settings."""
+    return [
+        {
+            'model': endpoint.get('model', config.LLM_MODEL),
+            'base_url': endpoint.get('base_url', config.LLM_BASE_URL),
+            'api_key_env': endpoint.get('api_key_env', 'API_KEY'),
+            'requests_per_minute': endpoint.get('requests_per_minute', config.LLM_REQUESTS_PER_MINUTE),
+            'max_in_flight': endpoint.get('max_in_flight', config.LLM_MAX_IN_FLIGHT),
+        }
+        for endpoint in config.LLM_ENDPOINTS or [{}]
+    ]
+
+
+class ModelRouter:
+    """
+    Sends each request to the best model of an ordered pool of endpoints.
+
+    Models are tried in preference order, except that a healthy model is
+    passed over while its p50 latency for the prompt type is more than
+    config.LLM_ROUTER_SLOWDOWN times the fastest one's. A request that fails
+    falls back to the next model. One that has not answered by the model's
+    p95 latency (config.LLM_HEDGE_AFTER until known) is hedged: the next
+    model is asked as well and the first reply wins, the other is cancelled.
+    Requests with a response_format skip models that rejected it within
+    config.LLM_STRUCTURED_OUTPUT_RETRY seconds.
+    A pool of one model hedges by sending the request to it a second time
+    (config.LLM_HEDGE_SAME_MODEL), a slow reply is often a slow replica.
+
+    Every model has its own AsyncLLMClient (connection pool, rate limit,
+    retries); they share the daily budget.
+    """
+    def __init__(self, endpoints, budget=None):
+        self.clients = [
+            AsyncLLMClient(
+                base_url=endpoint['base_url'],
+                api_key=os.getenv(endpoint['api_key_env']),
+                model=endpoint['model'],
+                max_in_flight=endpoint['max_in_flight'],
+                requests_per_minute=endpoint['requests_per_minute'],
+                max_retries=config.LLM_MAX_RETRIES,
+                timeout=config.LLM_TIMEOUT,
+                budget=budget,
+            )
+            for endpoint in endpoints
+        ]
+        self.stats = [ModelStats() for _ in self.clients]
+        self.budget = budget
+        # Responses are cached under the preferred model, whichever model gave them
+        self.model = self.clients[0].model
+
+    def ranked(self, prompt_type):
+        """Indices of the clients to try for a prompt type, best first."""
+        healthy = [i for i, stats in enumerate(self.stats) if stats.healthy()]
+        p50 = {i: self.stats[i].percentile(prompt_type, 0.5) for i in healthy}
+        known = [latency for latency in p50.values() if latency is not None]
+        fastest = min(known) if known else None
+
+        def slow(i):
+            return fastest is not None and p50[i] is not None and p50[i] > fastest * config.LLM_ROUTER_SLOWDOWN
+
+        ordered = sorted(healthy, key=lambda i: (slow(i), p50[i] if slow(i) else 0, i))
+        # Unhealthy models are the last resort
+        return ordered + [i for i in range(len(self.clients)) if i not in p50]
+
+    def structured_output(self):
+        """Whether a model of the pool currently takes JSON-schema response_format."""
+        return any(stats.structured_output() for stats in self.stats)
+
+    def hedge_after(self, i, prompt_type):
+        p95 = self.stats[i].percentile(prompt_type, 0.95)
+        return config.LLM_HEDGE_AFTER if p95 is None else max(p95, config.LLM_HEDGE_MIN_SECONDS)
+
+    async def _timed(self, i, prompt_type, prompt_array, params):
+        started = time.perf_counter()
+        try:
+            result = await self.clients[i].complete(prompt_array, **params)
+        except asyncio.CancelledError:
+            # Lost a hedge: it took at least this long
+            self.stats[i].record(prompt_type, time.perf_counter() - started)
+            raise
+        except BudgetExhausted:
+            raise
+        except Exception:
+            self.stats[i].record(prompt_type, time.perf_counter() - started, ok=False)
+            raise
+        self.stats[i].record(prompt_type, time.perf_counter() - started)
+        return result
+
+    async def complete(self, prompt_array, prompt_type='other', **params):
+        """
+        Send one chat completion request, falling back and hedging across the pool.
+
+        Returns:
+            str: the message content
+
+        Raises:
+            The last model's error once every model failed.
+            BudgetExhausted if the work's priority class is over its daily budget.
+        """
+        remaining = self.ranked(prompt_type)
+        if 'response_format' in params:
+            remaining = [i for i in remaining if self.stats[i].structured_output()]
+            if not remaining:
+                raise ValueError("no model of the pool takes response_format right now")
+        if len(remaining) == 1 and config.LLM_HEDGE_SAME_MODEL:
+            remaining = remaining * 2
+        running = {}  # task -> client index
+        launched = set()
+        error = None
+
+        def launch():
+            i = remaining.pop(0)
+            running[asyncio.ensure_future(self._timed(i, prompt_type, prompt_array, params))] = i
+            launched.add(i)
+            return i
+
+        latest = launch()
+        try:
+            while running:
+                timeout = self.hedge_after(latest, prompt_type) if remaining else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.inc('llm_hedges_total', prompt_type=prompt_type)
+                    if remaining[0] == latest:
+                        logger.info(f"🐢 {self.clients[latest].model} is slow on a {prompt_type} prompt, sending it again")
+                    else:
+                        logger.info(f"🐢 {self.clients[latest].model} is slow on a {prompt_type} prompt, "
+                                    f"asking {self.clients[remaining[0]].model} as well")
+                    latest = launch()
+                    continue
+                for task in done:
+                    i = running.pop(task)
+                    try:
+                        return task.result()
+                    except BudgetExhausted:
+                        raise
+                    except Exception as e:
+                        error = e
+                        if 'response_format' in params and rejects_response_format(e):
+                            # Callers switch to their plain-text prompts while no model takes it
+                            retry = config.LLM_STRUCTURED_OUTPUT_RETRY
+                            self.stats[i].structured_off_until = time.monotonic() + retry
+                            logger.warning(f"📋 {self.clients[i].model} rejected response_format, "
+                                           f"no structured prompts go to it for {retry:g}s")
+                        metrics.inc('llm_fallbacks_total', model=self.clients[i].model)
+                        logger.warning(f"↪️ {self.clients[i].model} failed on a {prompt_type} prompt: {e}")
+                if not running:
+                    # Asking a model that just failed again is no fallback
+                    remaining = [i for i in remaining if i not in launched]
+                    if remaining:
+                        latest = launch()
+            raise error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def stream(self, prompt_array, prompt_type='other', **params):
+        """
+        Stream one chat completion, falling back to the next model if one fails before its first chunk.
+
+        Streams are not hedged, their chunks can't be merged across models.
+        """
+        error = None
+        for i in self.ranked(prompt_type):
+            started = time.perf_counter()
+            chunks = self.clients[i].stream(prompt_array, **params)
+            received = False
+            try:
+                async for chunk in chunks:
+                    received = True
+                    yield chunk
+                return
+            except BudgetExhausted:
+                raise
+            except Exception as e:
+                if received:
+                    raise
+                error = e
+                self.stats[i].record(prompt_type, time.perf_counter() - started, ok=False)
+                metrics.inc('llm_fallbacks_total', model=self.clients[i].model)
+                logger.warning(f"↪️ {self.clients[i].model} failed on a {prompt_type} stream: {e}")
+            finally:
+                await chunks.aclose()
+                if received:
+                    self.stats[i].record(prompt_type, time.perf_counter() - started)
+        raise error
+
+    def collect_metrics(self):
+        """Expose the rolling model statistics as gauges."""
+        for client, stats in zip(self.clients, self.stats):
+            metrics.set_gauge('llm_model_healthy', int(stats.healthy()), model=client.model)
+            metrics.set_gauge('llm_model_error_rate', stats.error_rate(), model=client.model)
+            for prompt_type in list(stats.latencies):
+                for quantile in (0.5, 0.95):
+                    latency = stats.percentile(prompt_type, quantile)
+                    if latency is not None:
+                        metrics.set_gauge('llm_model_latency_seconds', latency, model=client.model,
+                                          prompt_type=prompt_type, quantile=str(quantile))
+
+
+class _EventLoopThread:
+    """Runs an asyncio loop in a daemon thread so synchronous code can submit coroutines."""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """Schedule `coro` on the loop; it keeps the caller's LLM work label (see llm_scheduler.work)."""
+        return asyncio.run_coroutine_threadsafe(within(current_work(), coro), self.loop)
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+
+_runner = None
+_router = None
+_cache = None
+_init_lock = threading.Lock()
+
+
+def _get_runner():
+    """Create the background loop and the shared router on first use."""
+    global _runner, _router, _cache
+    with _init_lock:
+        if _runner is None:
+            if config.LLM_CACHE_ENABLED:
+                _cache = LLMCache()
+            _runner = _EventLoopThread()
+            # The clients' semaphores/locks must be created on the loop thread
+            _router = _runner.run(_create_router())
+            metrics.register_collector(_router.collect_metrics)
+    return _runner
+
+
+async def _create_router():
+    # Read the limits now, main.py divides them between worker processes
+    budget = None
+    if config.LLM_DAILY_REQUEST_BUDGET is not None or config.LLM_DAILY_TOKEN_BUDGET is not None:
+        budget = DailyBudget()
+    return ModelRouter(llm_endpoints(), budget)
+
+
+async def _until(deadline, coro):
+    """
+    Await `coro`, cancelling it once `deadline` passes (asyncio.TimeoutError).
+
+    `coro` runs with the deadline applied, so the clients can pause it while
+    a request waits for the scheduler; the time left is re-read until it runs out.
+    """
+    if deadline is None:
+        return await coro
+    with deadlines.applied(deadline):
+        # The task copies the context, deadline included
+        task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=deadline.remaining())
+            if done:
+                return task.result()
+            if deadline.expired():
+                raise asyncio.TimeoutError()
+    finally:
+        if not task.done():
+            task.cancel()
+            # Let it unwind (close its stream) before returning, as asyncio.wait_for does
+            await asyncio.wait({task})
+
+
+def _log_deadline_exceeded(deadline, prompt_type):
+    metrics.inc('deadline_exceeded_total', step='llm')
+    logger.warning(f"⏰ {prompt_type} prompt cancelled, its {deadline.seconds:g}s deadline passed")
+
+
+def _usable(validate, reply):
+    return validate is None or validate(reply)
+
+
+def _for_prompt(validate, i):
+    """Bind a validate(index, reply) callback to one prompt."""
+    return None if validate is None else lambda reply: validate(i, reply)
+
+
+async def _complete_or_none(prompt_array, bypass_cache, prompt_type, deadline, validate=None, **params):
+    key = cache_key(_router.model, prompt_array, params) if _cache else None
+    if key and not bypass_cache:
+        cached = _cache.get(key)
+        if cached is not None and _usable(validate, cached):
+            return cached
+
+    started = time.perf_counter()
+    try:
+        result = await _until(deadline, _router.complete(prompt_array, prompt_type, **params))
+    except asyncio.TimeoutError:
+        _log_deadline_exceeded(deadline, prompt_type)
+        return None
+    except BudgetExhausted:
+        # Not a failure, the caller defers the work
+        raise
     except Exception as e:
-        print("Error fetching response:", e)
-        return None
\ No newline at end of file
+        metrics.inc('failures_total', stage='llm')
+        logger.error(f"Error fetching response: {e}")
+        return None
+    finally:
+        metrics.observe('llm_request_duration_seconds', time.perf_counter() - started, prompt_type=prompt_type)
+
+    # An unusable reply is not cached, or every retry would get it again
+    if key and result is not None and _usable(validate, result):
+        _cache.put(key, result)
+    return result
+
+
+async def _stream_or_none(prompt_array, on_chunk, bypass_cache, prompt_type, deadline, validate=None, **params):
+    """
+    Stream one completion into `on_chunk` until it returns True.
+
+    The text received up to that point is what the caller used, so it is
+    what gets cached if it passes `validate` (a cache hit replays it as a
+    single chunk).
+    """
+    key = cache_key(_router.model, prompt_array, params) if _cache else None
+    if key and not bypass_cache:
+        cached = _cache.get(key)
+        if cached is not None and _usable(validate, cached):
+            on_chunk(cached)
+            return cached
+
+    parts = []
+    started = time.perf_counter()
+    chunks = _router.stream(prompt_array, prompt_type, **params)
+
+    async def consume():
+        async for chunk in chunks:
+            parts.append(chunk)
+            if on_chunk(chunk):
+                break
+
+    try:
+        await _until(deadline, consume())
+    except asyncio.TimeoutError:
+        _log_deadline_exceeded(deadline, prompt_type)
+        return None
+    except BudgetExhausted:
+        raise
+    except Exception as e:
+        metrics.inc('failures_total', stage='llm')
+        logger.error(f"Error fetching response: {e}")
+        return None
+    finally:
+        await chunks.aclose()
+        metrics.observe('llm_request_duration_seconds', time.perf_counter() - started, prompt_type=prompt_type)
+
+    result = ''.join(parts)
+    if key and _usable(validate, result):
+        _cache.put(key, result)
+    return result
+
+
+async def _gather(coros):
+    """
+    Run coroutines concurrently. If one raised (BudgetExhausted), the others
+    still finish, so the requests already sent are cached, before it is re-raised.
+    """
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def _stream_all(prompt_arrays, on_chunk, bypass_cache, prompt_type, deadline, validate, **params):
+    return await _gather(
+        _stream_or_none(prompt, lambda chunk, i=i: on_chunk(i, chunk), bypass_cache, prompt_type, deadline,
+                        _for_prompt(validate, i), **params)
+        for i, prompt in enumerate(prompt_arrays)
+    )
+
+
+async def _complete_all(prompt_arrays, bypass_cache, prompt_type, deadline, validate, **params):
+    return await _gather(
+        _complete_or_none(prompt, bypass_cache, prompt_type, deadline, _for_prompt(validate, i), **params)
+        for i, prompt in enumerate(prompt_arrays)
+    )
+
+
+def send_prompts(prompt_arrays, bypass_cache=False, prompt_type='other', deadline=None, validate=None, **params):
+    """
+    Send many prompts concurrently and wait for all of them.
+
+    Responses are served from the persistent cache when the same messages,
+    model and params were sent before.
+
+    Args:
+        prompt_arrays: list of message arrays
+        bypass_cache: Skip cache lookups and regenerate (the cache is still refreshed)
+        prompt_type: what the prompts are for (e.g. 'commentary'), used to label metrics
+        deadline: Deadline after which unanswered prompts are cancelled and
+                  count as failed (the applied one if not given, see deadlines)
+        validate: called as validate(index, reply); replies it rejects are
+                  returned but not cached, so a retry asks the model again
+        params: extra chat completion parameters (temperature, ...)
+
+    Returns:
+        list of response strings in the same order, None for failed prompts
+
+    Raises:
+        BudgetExhausted: the caller's priority class (see llm_scheduler.work)
+        used up its daily budget; the work should be deferred, not failed
+    """
+    if not prompt_arrays:
+        return []
+    bypass_cache = bypass_cache or config.LLM_CACHE_BYPASS
+    deadline = deadlines.resolve(deadline)
+    return _get_runner().run(_complete_all(prompt_arrays, bypass_cache, prompt_type, deadline, validate, **params))
+
+
+def send_prompt(prompt_array, bypass_cache=False, prompt_type='other', deadline=None, validate=None, **params):
+    """send_prompts for one prompt; `validate` takes just the reply."""
+    validate_one = None if validate is None else lambda i, reply: validate(reply)
+    return send_prompts([prompt_array], bypass_cache, prompt_type, deadline, validate_one, **params)[0]
+
+
+def stream_prompts(prompt_arrays, on_chunk, bypass_cache=False, prompt_type='other', deadline=None,
+                   validate=None, **params):
+    """
+    Stream many prompts concurrently, stopping each one as soon as its consumer has enough.
+
+    Args:
+        prompt_arrays: list of message arrays
+        on_chunk: called as on_chunk(index, chunk) on the LLM thread for every
+                  piece of text; return True to cancel that stream
+        bypass_cache: Skip cache lookups and regenerate
+        prompt_type: what the prompts are for, used to label metrics
+        deadline: Deadline after which unfinished streams are cancelled and count as failed
+        validate: called as validate(index, text received); text it rejects is not cached
+        params: extra chat completion parameters
+
+    Returns:
+        list of the text received per prompt (cut short where cancelled), None for failed prompts
+    """
+    if not prompt_arrays:
+        return []
+    bypass_cache = bypass_cache or config.LLM_CACHE_BYPASS
+    deadline = deadlines.resolve(deadline)
+    return _get_runner().run(_stream_all(prompt_arrays, on_chunk, bypass_cache, prompt_type, deadline, validate,
+                                         **params))
+
+
+def stream_prompt(prompt_array, bypass_cache=False, prompt_type='other', deadline=None, validate=None, **params):
+    """
+    Stream one prompt, yielding the response text chunk by chunk.
+
+    Closing the generator early (e.g. breaking out of the loop) cancels the
+    request. Yields nothing if the request failed. The text received is only
+    cached if validate(text) accepts it.
+    """
+    runner = _get_runner()
+    deadline = deadlines.resolve(deadline)
+    chunks = queue.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def on_chunk(chunk):
+        chunks.put(chunk)
+        return stop.is_set()
+
+    async def produce():
+        try:
+            await _stream_or_none(prompt_array, on_chunk, bypass_cache or config.LLM_CACHE_BYPASS, prompt_type,
+                                  deadline, validate, **params)
+        finally:
+            chunks.put(done)
+
+    future = runner.submit(produce())
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+        # Re-raise BudgetExhausted
+        future.result()
+    finally:
+        stop.set()
+        if not future.done():
+            future.cancel()
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting prompts."""
+    return len(text) // 4 + 1
+
+
+def estimate_prompt_tokens(prompt_array):
+    return sum(estimate_tokens(message['content']) for message in prompt_array)
+
+
+def structured_output_supported():
+    """
+    False while every model of the pool rejects JSON-schema response_format
+    (see ModelRouter), or if disabled in config.
+    """
+    return config.LLM_STRUCTURED_OUTPUT and (_router is None or _router.structured_output())
+
+
+def parse_json_response(text):
+    """Parse a JSON reply, tolerating a ```json fence around it. Returns None if invalid."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def send_structured_prompts(prompt_arrays, schema_name, schema, bypass_cache=False, prompt_type=None,
+                            deadline=None, validate=None, **params):
+    """
+    Send many prompts that must answer with JSON matching `schema`.
+
+    Only valid JSON replies are cached, and only those `validate(index,
+    parsed object)` accepts if given.
+
+    Returns:
+        list of parsed JSON objects in the same order, None where the call
+        failed or the reply was not valid JSON
+    """
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": schema_name, "strict": True, "schema": schema},
+    }
+
+    def validate_json(i, reply):
+        parsed = parse_json_response(reply)
+        return parsed is not None and (validate is None or validate(i, parsed))
+
+    results = send_prompts(prompt_arrays, bypass_cache, prompt_type or schema_name, deadline, validate_json,
+                           response_format=response_format, **params)
+    return [parse_json_response(result) if result is not None else None for result in results]
+
+
+def cache_stats():
+    """Hit/miss/eviction counters of the response cache since start-up."""
+    return dict(_cache.stats) if _cache else {}
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import config
+import metrics
+
+
+def cache_key(model, prompt_array, params):
+    """Hash of everything that determines a completion: model, messages and sampling params."""
+    payload = json.dumps(
+        {'model': model, 'messages': prompt_array, 'params': params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Disk-backed cache of LLM responses (SQLite).
+
+    Entries expire after `ttl_seconds`. Once the stored responses exceed
+    `max_bytes`, the least recently used entries are evicted.
+    """
+    def __init__(self, db_path=config.LLM_CACHE_FILE,
+                 ttl_seconds=config.LLM_CACHE_TTL_DAYS * 24 * 3600,
+                 max_bytes=config.LLM_CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        self.conn = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+
+    def get(self, key):
+        """Return the cached response, or None on a miss (or an expired entry)."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                with self.conn:
+                    self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self.stats['hits'] += 1
+                metrics.inc('cache_requests_total', cache='llm', result='hit')
+                return row[0]
+            if row:
+                with self.conn:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats['evictions'] += 1
+            self.stats['misses'] += 1
+            metrics.inc('cache_requests_total', cache='llm', result='miss')
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now)
+                )
+            self._evict(now)
+
+    def _evict(self, now):
+        with self.conn:
+            expired = self.conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+            self.stats['evictions'] += expired
+
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats['evictions'] += 1
+                total -= size
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
@@ -0,0 +1,230 @@
+"""
+Scheduling of LLM requests: priority classes, fair share between positions
+and a daily budget.
+
+Every request waits for the scheduler, which hands out the rate limit.
+Higher priority classes always go first: answer evaluation, then question
+generation for fresh applicants, then backfill of older ones. Within a
+class, positions share the requests by weighted fair queuing, so a burst
+of applicants for one position does not hold up everyone else.
+
+The daily budget is counted in SQLite, so every worker process draws from
+the same budget and it survives restarts. Each class may use its share of
+it (config.LLM_BUDGET_SHARES). Past that share its requests raise
+BudgetExhausted, and the pipeline defers those rows to the next day
+instead of failing them.
+
+Callers label their work with work(priority, position). The label is a
+context variable, so it follows the call onto the LLM event loop.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import config
+import metrics
+
+# Priority classes, most urgent first
+EVALUATION = 'evaluation'
+QUESTIONS = 'questions'
+BACKFILL = 'backfill'
+PRIORITIES = (EVALUATION, QUESTIONS, BACKFILL)
+
+_work = contextvars.ContextVar('llm_work', default=(QUESTIONS, None))
+
+
+class BudgetExhausted(Exception):
+    """A priority class used up its share of the daily LLM budget; it resets at `reset_at` (epoch seconds)."""
+    def __init__(self, priority, reset_at):
+        super().__init__(f"daily LLM budget for {priority} work used up until "
+                         f"{datetime.fromtimestamp(reset_at):%Y-%m-%d %H:%M}")
+        self.priority = priority
+        self.reset_at = reset_at
+
+
+@contextmanager
+def work(priority, position=None):
+    """Label the LLM requests made inside the block with a priority class and desired position."""
+    token = _work.set((priority, position))
+    try:
+        yield
+    finally:
+        _work.reset(token)
+
+
+def current_work():
+    """(priority, position) label of the running code, (QUESTIONS, None) if unlabelled."""
+    return _work.get()
+
+
+async def within(label, coro):
+    """Await `coro` under a work label, e.g. one taken from a caller on another thread."""
+    _work.set(label)
+    return await coro
+
+
+def next_reset():
+    """Epoch seconds of the next UTC midnight, when the daily budget starts over."""
+    tomorrow = datetime.now(timezone.utc).date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=timezone.utc).timestamp()
+
+
+class DailyBudget:
+    """
+    Requests and (estimated) tokens used per UTC day (SQLite).
+
+    try_charge() checks a class's share and counts the request in one
+    transaction, so concurrent processes cannot overshoot the budget.
+    """
+    def __init__(self, db_path=config.LLM_BUDGET_FILE,
+                 requests=config.LLM_DAILY_REQUEST_BUDGET,
+                 tokens=config.LLM_DAILY_TOKEN_BUDGET,
+                 shares=None):
+        self.requests = requests
+        self.tokens = tokens
+        self.shares = config.LLM_BUDGET_SHARES if shares is None else shares
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT,
+                                    check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            "day TEXT PRIMARY KEY, requests INTEGER NOT NULL DEFAULT 0, tokens INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date().isoformat()
+
+    def _usage(self, day):
+        row = self.conn.execute("SELECT requests, tokens FROM usage WHERE day = ?", (day,)).fetchone()
+        return row or (0, 0)
+
+    def usage(self):
+        """(requests, tokens) used today."""
+        with self.lock:
+            return self._usage(self._today())
+
+    def _charge(self, day, requests, tokens):
+        self.conn.execute(
+            "INSERT INTO usage (day, requests, tokens) VALUES (?, ?, ?) "
+            "ON CONFLICT(day) DO UPDATE SET requests = requests + excluded.requests, "
+            "tokens = tokens + excluded.tokens",
+            (day, requests, tokens)
+        )
+
+    def try_charge(self, priority):
+        """Count one request of `priority` if its share of today's budget allows it. Returns False if not."""
+        share = self.shares.get(priority, 1.0)
+        day = self._today()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                requests, tokens = self._usage(day)
+                if ((self.requests is not None and requests >= share * self.requests)
+                        or (self.tokens is not None and tokens >= share * self.tokens)):
+                    return False
+                self._charge(day, 1, 0)
+                return True
+            finally:
+                self.conn.execute("COMMIT")
+
+    def charge_tokens(self, tokens):
+        """Add the tokens of a finished request to today's usage."""
+        with self.lock:
+            self._charge(self._today(), 0, tokens)
+
+    def close(self):
+        self.conn.close()
+
+
+class FairScheduler:
+    """
+    Hands out the rate limit (a token bucket of `rate` requests per second,
+    bursts up to `capacity`) by priority class, then by weighted fair
+    queuing between positions.
+
+    Fair queuing is self-clocked: a request is tagged with its position's
+    previous tag (or the tag served last, if that is later) plus 1 / weight,
+    and the smallest tag is served first. A position with a backlog gets its
+    weight's share of the class's requests and the others are not pushed
+    to the back of the line.
+
+    Must be used from a single event loop.
+    """
+    def __init__(self, rate, capacity, budget=None, weights=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.budget = budget
+        self.weights = config.LLM_POSITION_WEIGHTS if weights is None else weights
+        self.waiting = []  # heap of (class rank, tag, arrival, future, priority)
+        self.last_tags = {}  # (priority, position) -> tag of its latest request
+        self.served_tags = {}  # priority -> tag of the request served last
+        self.arrivals = itertools.count()
+        self.dispatcher = None
+
+    async def acquire(self):
+        """
+        Wait until the running work (see work()) may send a request.
+
+        Raises:
+            BudgetExhausted: its priority class used up its daily budget share
+        """
+        priority, position = current_work()
+        if priority not in PRIORITIES:
+            priority = QUESTIONS
+        flow = (priority, position)
+        tag = max(self.last_tags.get(flow, 0), self.served_tags.get(priority, 0)) + 1 / self.weights.get(position, 1)
+        self.last_tags[flow] = tag
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (PRIORITIES.index(priority), tag, next(self.arrivals), future, priority))
+        if self.dispatcher is None:
+            self.dispatcher = asyncio.ensure_future(self._dispatch())
+        started = time.perf_counter()
+        try:
+            await future
+        finally:
+            metrics.observe('llm_queue_wait_seconds', time.perf_counter() - started, priority=priority)
+
+    async def _dispatch(self):
+        """Grant the waiting requests one rate-limit token at a time, best (class, tag) first."""
+        try:
+            while self.waiting:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    continue
+
+                _, tag, _, future, priority = heapq.heappop(self.waiting)
+                if future.done():
+                    # Its caller was cancelled
+                    continue
+                if self.budget and not self.budget.try_charge(priority):
+                    future.set_exception(BudgetExhausted(priority, next_reset()))
+                    continue
+                self.tokens -= 1
+                self.served_tags[priority] = tag
+                future.set_result(None)
+        finally:
+            self.dispatcher = None
+
+
+if __name__ == "__main__":
+    budget = DailyBudget()
+    requests, tokens = budget.usage()
+    print(f"Today (UTC): {requests} requests"
+          f"{f' of {budget.requests}' if budget.requests is not None else ''}, "
+          f"~{tokens} tokens{f' of {budget.tokens}' if budget.tokens is not None else ''}")
+    for priority in PRIORITIES:
+        share = budget.shares.get(priority, 1.0)
+        print(f"  {priority}: may use {share:.0%}")
@@ -1,17 +1,127 @@
-from pipeline  import MainPipeline
+from pipeline  import MainPipeline, AnswerPipeline
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
 import time
+import config
+import metrics
 
+ROLES = ('sync', 'questions', 'answers')
+
+
+def _stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_worker(roles, sync, workers, index):
+    """Entry point of a worker process: Ctrl+C is handled by the parent, which sends SIGTERM."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    run(roles, sync, workers, index)
+
+
+def start_metrics(queue, index=None):
+    """Serve this process's metrics and write periodic JSON snapshots (per worker when index is set)."""
+    def collect_queue_depth():
+        for status, count in queue.depths().items():
+            metrics.set_gauge('queue_depth', count, status=status)
+        for status, count in queue.dead_letters().items():
+            metrics.set_gauge('queue_dead_letters', count, status=status)
+
+    metrics.register_collector(collect_queue_depth)
+    if index is None:
+        metrics.start_http_server(config.METRICS_PORT)
+        metrics.start_snapshot_writer(config.METRICS_SNAPSHOT_FILE)
+    else:
+        root, extension = os.path.splitext(config.METRICS_SNAPSHOT_FILE)
+        metrics.start_http_server(config.METRICS_PORT + index)
+        metrics.start_snapshot_writer(f"{root}.{index}{extension}")
 
-if __name__ == "__main__":
 
-    # Instantiate the pipeline with the path to your TinyDB JSON file.
-    pipeline = MainPipeline(5)
-    pipeline.start()
+def run(roles, sync, workers=1, index=None):
+    """
+    Run the pipelines for the given roles until interrupted.
+
+    :param roles: Roles of this process: 'sync' (form and answer sheet sync),
+                  'questions' (resume stages), 'answers' (evaluation stage).
+    :param sync: Whether this process runs the sheet syncs, which must only
+                 run in one process of a deployment.
+    :param workers: Number of worker processes sharing the LLM limits.
+    :param index: Worker number when running as one of several processes.
+    """
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(message)s")
+
+    # The LLM rate limits are per process, split them between the workers
+    config.LLM_REQUESTS_PER_MINUTE = config.LLM_REQUESTS_PER_MINUTE / workers
+    config.LLM_MAX_IN_FLIGHT = max(1, config.LLM_MAX_IN_FLIGHT // workers)
+    if config.LLM_ENDPOINTS:
+        endpoints = [dict(endpoint) for endpoint in config.LLM_ENDPOINTS]
+        for endpoint in endpoints:
+            if 'requests_per_minute' in endpoint:
+                endpoint['requests_per_minute'] /= workers
+            if 'max_in_flight' in endpoint:
+                endpoint['max_in_flight'] = max(1, endpoint['max_in_flight'] // workers)
+        config.LLM_ENDPOINTS = endpoints
+
+    sync = sync and 'sync' in roles
+    pipelines = []
+    # Sheet sync + resume stages, and answer sync + evaluation stage
+    if sync or 'questions' in roles:
+        pipelines.append(MainPipeline(5, sync=sync, workers='questions' in roles))
+    if sync or 'answers' in roles:
+        pipelines.append(AnswerPipeline(5, sync=sync, workers='answers' in roles))
+    for pipeline in pipelines:
+        pipeline.start()
+    if config.METRICS_ENABLED and pipelines:
+        start_metrics(pipelines[0].queue, index)
 
     try:
         # Keep the main thread alive while the background thread runs.
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        pipeline.stop()
-        print("Pipeline stopped.")
\ No newline at end of file
+        for pipeline in pipelines:
+            pipeline.stop()
+        print("Pipeline stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the resume and answer pipelines")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes sharing the database (default 1)")
+    parser.add_argument("--role", default=",".join(ROLES),
+                        help="Comma-separated roles to run: sync, questions, answers (default all)")
+    args = parser.parse_args()
+
+    roles = [role.strip() for role in args.role.split(",") if role.strip()]
+    unknown = set(roles) - set(ROLES)
+    if unknown:
+        parser.error(f"unknown role(s): {', '.join(sorted(unknown))}")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and config.STORAGE_BACKEND != 'sqlite':
+        parser.error("the TinyDB backend is single-process, set STORAGE_BACKEND = 'sqlite' to use --workers")
+
+    if args.workers == 1:
+        run(roles, sync=True)
+    else:
+        # The first process also runs the sheet syncs
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(roles, i == 0, args.workers, i), name=f"worker-{i}")
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # Let every worker stop its pipelines gracefully
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+            print("Workers stopped.")
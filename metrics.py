@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# name -> (type, help)
+METRICS = {
+    'stage_duration_seconds': ('histogram', "Duration of pipeline steps (sheet_fetch, drive_download, extract, db_write)"),
+    'llm_request_duration_seconds': ('histogram', "Duration of LLM calls, including retries, by prompt type"),
+    'cache_requests_total': ('counter', "Cache lookups by cache and result (hit/miss)"),
+    'llm_retries_total': ('counter', "LLM requests retried after a rate limit or transient error"),
+    'llm_time_to_first_question_seconds': ('histogram', "Time from sending a streamed question prompt until its first question closed"),
+    'resume_tokens_saved_total': ('counter', "Estimated prompt tokens removed from resumes by compaction"),
+    'llm_queue_wait_seconds': ('histogram', "Time LLM requests waited for the scheduler, by priority class"),
+    'llm_deferred_total': ('counter', "Rows deferred because their priority class used up its daily LLM budget"),
+    'llm_hedges_total': ('counter', "LLM requests also sent to the next model (or again to the only one) after passing the latency deadline"),
+    'llm_fallbacks_total': ('counter', "LLM requests that failed on a model and moved on to the next, by model"),
+    'llm_model_latency_seconds': ('gauge', "Rolling latency percentiles of each model, by prompt type"),
+    'llm_model_error_rate': ('gauge', "Rolling error rate of each model"),
+    'llm_model_healthy': ('gauge', "1 while a model is used, 0 while it cools down after too many errors"),
+    'download_retries_total': ('counter', "Drive download chunks retried after a failed request"),
+    'failures_total': ('counter', "Failed operations by stage"),
+    'deadline_exceeded_total': ('counter', "Steps cut off by a candidate's deadline, by step"),
+    'near_duplicates_total': ('counter', "Resumes matching an earlier candidate's, by whether its questions were reused"),
+    'queue_depth': ('gauge', "Responses waiting in each pipeline status"),
+    'queue_dead_letters': ('gauge', "Responses parked after failing config.QUEUE_MAX_ATTEMPTS times, by status"),
+    'dead_letters_total': ('counter', "Jobs parked after failing config.QUEUE_MAX_ATTEMPTS times, by status"),
+}
+
+_lock = threading.Lock()
+# name -> {labels tuple: value}; histogram values are [bucket counts..., sum, count]
+_values = {name: {} for name in METRICS}
+_collectors = []
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram."""
+    key = _labels_key(labels)
+    with _lock:
+        series = _values[name].get(key)
+        if series is None:
+            series = _values[name][key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+def inc(name, amount=1, **labels):
+    """Increase a counter."""
+    key = _labels_key(labels)
+    with _lock:
+        _values[name][key] = _values[name].get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _values[name][_labels_key(labels)] = value
+
+
+@contextmanager
+def timer(name, **labels):
+    """Time the block into histogram `name`; failures also count in failures_total."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc('failures_total', stage=labels.get('stage') or labels.get('prompt_type') or name)
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def register_collector(collect):
+    """Register a function called before every scrape/snapshot (e.g. to refresh gauges)."""
+    _collectors.append(collect)
+
+
+def _collect():
+    for collect in list(_collectors):
+        try:
+            collect()
+        except Exception as e:
+            logger.warning(f"⚠️ Metrics collector failed: {e}")
+
+
+def snapshot():
+    """
+    Current values of every metric as a JSON-serialisable dict.
+
+    Histograms are reported as count, sum and approximate p50/p95/p99
+    (upper bound of the bucket the quantile falls in).
+    """
+    _collect()
+    with _lock:
+        values = {name: {key: list(v) if isinstance(v, list) else v for key, v in series.items()}
+                  for name, series in _values.items()}
+
+    result = {'timestamp': time.time(), 'pid': os.getpid()}
+    for name, series in values.items():
+        entries = []
+        for key, value in series.items():
+            entry = {'labels': dict(key)}
+            if METRICS[name][0] == 'histogram':
+                count = value[-1]
+                entry.update(count=count, sum=value[-2])
+                for quantile in (0.5, 0.95, 0.99):
+                    entry[f"p{int(quantile * 100)}"] = next(
+                        (bound for bound, cumulative in zip(DURATION_BUCKETS, value) if cumulative >= quantile * count),
+                        float('inf') if count else None
+                    )
+            else:
+                entry['value'] = value
+            entries.append(entry)
+        result[name] = entries
+    return result
+
+
+def _format_labels(key, extra=()):
+    labels = list(key) + list(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in labels) + '}'
+
+
+def render_prometheus():
+    """Every metric in the Prometheus text exposition format."""
+    _collect()
+    lines = []
+    with _lock:
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in _values[name].items():
+                if kind == 'histogram':
+                    for bound, cumulative in zip(DURATION_BUCKETS, value):
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {value[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {value[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body = json.dumps(snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_http_server(port=config.METRICS_PORT, host=config.METRICS_HOST):
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"📈 Metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def start_snapshot_writer(path=config.METRICS_SNAPSHOT_FILE, interval=config.METRICS_SNAPSHOT_INTERVAL):
+    """Write snapshot() to `path` every `interval` seconds from a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot(), f, indent=2)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not write metrics snapshot: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -1,135 +1,395 @@
-from tinydb import TinyDB, Query
 import threading
+import itertools
+import logging
+import os
 import time
-from googlesheetfetcher import process_responses
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from googlesheetfetcher import process_responses, process_answer_responses, reprocess_attachments
+from datamanager import (ResponseDB, has_extracted_text, derive_status, submitted_at,
+                         STATUS_FETCHED, STATUS_EXTRACTED, STATUS_ANSWERED)
+from jobqueue import JobQueue
+from deadlines import Deadline, DeadlineExceeded
 import config
+import deadlines
+import metrics
+import llm_scheduler
+import services
+import similarity
 import generate_questions
 import evaluate_answers
+
+logger = logging.getLogger(__name__)
+
+_worker_ids = itertools.count(1)
+
+
+class StageWorkers:
+    """Pool of worker threads draining one pipeline status from the job queue."""
+    def __init__(self, queue, status, handler, workers=1, batch_size=config.QUEUE_BATCH_SIZE, priority=None,
+                 backfill_after=None):
+        """
+        :param queue: JobQueue to claim rows from.
+        :param status: Status of the rows this stage works on.
+        :param handler: Function that processes a list of claimed rows. Should return
+                        one dict of fields to store per row, or None for rows that failed.
+                        Fields that leave the row in this stage count as a failure.
+        :param workers: Number of worker threads.
+        :param batch_size: Rows claimed by a worker at once (they go to the LLM concurrently).
+        :param priority: Function giving the LLM priority class of a row (see llm_scheduler),
+                         None for stages that do not call the LLM.
+        :param backfill_after: Age in seconds after which rows are only claimed once no fresher
+                               row is waiting (see JobQueue.claim), None to ignore their age.
+
+        Each claimed row runs under its own config.CANDIDATE_DEADLINE deadline (see deadlines);
+        rows it cuts off are postponed with backoff, which does not count as a failed attempt.
+        """
+        self.queue = queue
+        self.status = status
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.priority = priority
+        self.backfill_after = backfill_after
+        self.running = False
+        self.stopping = threading.Event()  # cuts a worker's error backoff short on stop()
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        self.stopping.clear()
+        for _ in range(self.workers):
+            worker_id = f"{os.getpid()}:{self.status}:{next(_worker_ids)}"
+            thread = threading.Thread(target=self.run_worker, args=(worker_id,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        self.stopping.set()
+        self.queue.notify()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def run_worker(self, worker_id):
+        errors = 0
+        while self.running:
+            try:
+                self.work_once(worker_id)
+                errors = 0
+            except Exception:
+                # e.g. "database is locked": keep the worker alive, rows it held come back when their lease expires
+                errors += 1
+                delay = min(config.QUEUE_IDLE_TIMEOUT, 2 ** (errors - 1))
+                logger.exception(f"❌ {worker_id} failed, retrying in {delay:g}s")
+                self.stopping.wait(delay)
+
+    def work_once(self, worker_id):
+        """Claim a batch of rows, run the handler on it and store the results (or wait for work)."""
+        seen = self.queue.generation()
+        rows = self.queue.claim(self.status, worker_id, self.batch_size, self.backfill_after)
+        if not rows:
+            self.queue.wait(seen)
+            return
+
+        # Keep the leases alive while the handler works
+        done = threading.Event()
+        renewer = threading.Thread(target=self.renew_leases, args=(rows, worker_id, done), daemon=True)
+        renewer.start()
+        try:
+            results = self.run_handler(rows)
+        finally:
+            done.set()
+            renewer.join()
+
+        for row, fields in zip(rows, results):
+            try:
+                self.store_result(row, fields, worker_id)
+            except Exception:
+                # The other rows of the batch are still stored; this one is claimed again once its lease expires
+                logger.exception(f"❌ Could not store the {self.status} result of {row.get('phone_number')}")
+
+    def store_result(self, row, fields, worker_id):
+        if isinstance(fields, llm_scheduler.BudgetExhausted):
+            self.queue.defer(row, worker_id, fields.reset_at)
+        elif isinstance(fields, DeadlineExceeded):
+            self.queue.postpone(row, worker_id)
+        elif fields is None:
+            self.queue.fail(row, worker_id)
+        elif derive_status({**row, **fields}) == self.status:
+            # Stored as is, the row would stay in this stage and be claimed again right away
+            logger.warning(f"⚠️ {self.status} result of {row.get('phone_number')} is incomplete, retrying later")
+            self.queue.fail(row, worker_id)
+        else:
+            self.queue.complete(row, fields, worker_id)
+
+    def run_handler(self, rows):
+        """
+        Run the handler on each claimed row concurrently (see run_row).
+
+        Returns:
+            one result per row: the fields to store, None if it failed, or the
+            BudgetExhausted/DeadlineExceeded error that stopped it
+        """
+        if len(rows) == 1:
+            return [self.run_row(rows[0])]
+        with ThreadPoolExecutor(len(rows)) as pool:
+            return list(pool.map(self.run_row, rows))
+
+    def run_row(self, row):
+        """
+        Run the handler on one row under its own config.CANDIDATE_DEADLINE deadline,
+        labelled with llm_scheduler.work() so the LLM scheduler can order its requests.
+
+        The deadline starts here, when work on the row begins, not when it was claimed.
+        """
+        label = nullcontext()
+        if self.priority:
+            label = llm_scheduler.work(self.priority(row), row.get('posisi_yang_diinginkan'))
+        deadline = Deadline(config.CANDIDATE_DEADLINE)
+        try:
+            # Applied here, in the thread running the handler: context variables do not follow into pools
+            with label, deadlines.applied(deadline):
+                [fields] = self.handler([row])
+        except DeadlineExceeded:
+            fields = None
+        except llm_scheduler.BudgetExhausted as e:
+            metrics.inc('llm_deferred_total', priority=e.priority)
+            logger.warning(f"💤 {e}, deferring {self.status} row {row.get('phone_number')}")
+            return e
+        except Exception as e:
+            logger.error(f"❌ {self.status} stage failed on {row.get('phone_number')}: {e}")
+            return None
+        # The download and LLM helpers turn a step cut off by the deadline into a failed result
+        if fields is None and deadline.expired():
+            logger.warning(f"⏰ {self.status} of {row.get('phone_number')} ran past its "
+                           f"{deadline.seconds:g}s deadline, retrying later")
+            return DeadlineExceeded(f"{self.status} cut off by the {deadline.seconds:g}s deadline")
+        return fields
+
+    def renew_leases(self, rows, worker_id, done):
+        while not done.wait(config.QUEUE_LEASE_SECONDS / 3):
+            try:
+                self.queue.renew(rows, worker_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not renew leases of {worker_id}: {e}")
+
+
 class MainPipeline:
-    def __init__(self,interval=180):
+    def __init__(self,interval=180, sync=True, workers=True):
         """
-        :param db_path: Path to your TinyDB JSON file.
-        :param question_func: Function that processes a row missing 'questions'.
-                              Should accept a row dict and return a string.
-        :param eval_func: Function that processes a row with both 'questions' and 'answers'.
-                          Should accept a row dict and return a dict with keys 'eval' and 'score'.
-        :param interval: Time interval between checks in seconds (default is 180 seconds).
+        Syncs the form sheet and runs the resume stages of the job queue:
+        fetched -> extracted (attachment retries) -> questions_generated.
+
+        :param interval: Time interval between sheet checks in seconds (default is 180 seconds).
+                         Database work is event driven and does not wait for it.
+        :param sync: Run the sheet sync (only one process of a deployment should).
+        :param workers: Run the stage workers.
         """
-        self.db = TinyDB(config.DATABASE_FILE)
+        self.db = ResponseDB()
+        self.queue = JobQueue(self.db)
         self.interval = interval
+        self.sync = sync
+        self.full_resync = False
         self.running = False
         self.thread = None
+        self.wake = threading.Event()
+        self.resumes = similarity.ResumeIndex() if workers else None
+        self.stages = [
+            StageWorkers(self.queue, STATUS_FETCHED, self.extract_func, config.EXTRACT_STAGE_WORKERS),
+            StageWorkers(self.queue, STATUS_EXTRACTED, self.question_func, config.QUESTION_STAGE_WORKERS,
+                         priority=self.question_priority, backfill_after=config.LLM_BACKFILL_AGE_HOURS * 3600),
+        ] if workers else []
 
     def start(self):
         """Starts the background pipeline."""
         self.running = True
-        self.thread = threading.Thread(target=self.run_pipeline, daemon=True)
-        self.thread.start()
+        self.queue.recover()
+        for stage in self.stages:
+            stage.start()
+        if self.sync:
+            self.thread = threading.Thread(target=self.run_pipeline, daemon=True)
+            self.thread.start()
+
+    def request_full_resync(self):
+        """Makes the next sheet check re-read every row instead of only the new ones."""
+        self.full_resync = True
+        self.wake.set()
 
     def stop(self):
         """Stops the pipeline gracefully."""
         self.running = False
+        self.wake.set()
         if self.thread:
             self.thread.join()
+        for stage in self.stages:
+            stage.stop()
+        self.db.flush()
 
     def run_pipeline(self):
-        """Main loop that periodically checks the database."""
+        """Main loop that periodically checks the sheet and enqueues new responses."""
         while self.running:
-            self.check_sheets()
-            self.check_missing_questions()
-            self.check_complete_entries()
-            time.sleep(self.interval)
+            try:
+                self.check_sheets()
+            except Exception as e:
+                logger.error(f"❌ Sheet check failed: {e}")
+                # Rebuild the Google clients next time, in case they are what broke
+                services.reset()
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def extract_func(self, rows):
+        """Retries the attachments of rows whose download or text extraction failed."""
+        results = reprocess_attachments(rows)
+        return [
+            fields if fields and has_extracted_text({**row, **fields}) else None
+            for row, fields in zip(rows, results)
+        ]
 
-    def check_missing_questions(self):
+    def question_func(self, rows):
         """
-        Looks for rows where the 'questions' field is empty,
-        runs the question_func on each row, and updates the database.
+        Generates the commentary and questions based on given cv/resume for each row.
+
+        Rows whose resume near-duplicates an earlier candidate's reuse that
+        candidate's commentary and questions (see match_near_duplicate).
         """
-        Q = Query()
-        # Adjust the search criteria if your definition of "empty" is different.
-        results = self.db.search(Q.questions == "")
-        for row in results:
-            print("Hunyaaa~")
-            new_question = self.question_func() # [Chuck notes] URGENT!!! Fix this asap
-            # Update the row using the primary key 'phone_number'
-            self.db.update({'questions': new_question}, Q.phone_number == row.get('phone_number'))
-
-    def check_complete_entries(self):
+        results = [self.match_near_duplicate(row) for row in rows]
+        pending = [i for i, fields in enumerate(results) if 'questions' not in fields]
+        packages = generate_questions.create_interview_packages([
+            (rows[i].get('Resume/CV').get('extracted_text'), rows[i].get('posisi_yang_diinginkan'))
+            for i in pending
+        ])
+        for i, package in zip(pending, packages):
+            # A package without questions is a failed prompt: the row is retried, never stored as done
+            results[i] = {
+                **results[i],
+                'questions': package['questions'],
+                'resume_commentary': package['commentary']
+            } if package and package['questions'] else None
+        return results
+
+    def question_priority(self, row):
+        """Question generation is 'backfill' for applicants older than config.LLM_BACKFILL_AGE_HOURS."""
+        submitted = submitted_at(row)
+        if submitted is not None and time.time() - submitted > config.LLM_BACKFILL_AGE_HOURS * 3600:
+            return llm_scheduler.BACKFILL
+        return llm_scheduler.QUESTIONS
+
+    def match_near_duplicate(self, row):
         """
-        Looks for rows where 'answers' is filled and 'questions' is filled.
-        Runs the eval_func on each row and updates the 'eval' and 'score' fields.
+        Index a row's resume and look for an earlier submission with a near-identical one.
+
+        The candidate's own previous submission (same phone number, older
+        timestamp) is looked at first: resubmitting a barely changed resume
+        is the most common duplicate. Its questions come from the
+        'previous_submission' kept when the new response replaced it.
+
+        :return: Fields to store: 'near_duplicate_of' and 'resume_similarity' if a
+                 match was found, plus its 'questions' and 'resume_commentary' when
+                 config.NEAR_DUP_REUSE is on and it applied for the same position.
         """
-        Q = Query()
-        results = self.db.search((Q.answers != "") & (Q.questions != ""))
-        for row in results:
-            result_dict = self.eval_func(row)
-            # We assume result_dict contains keys 'eval' and 'score'
-            self.db.update(
-                {
-                    'eval': result_dict.get('eval'),
-                    'score': result_dict.get('score')
-                },
-                Q.phone_number == row.get('phone_number'))
-            
-    def eval_func(self,row):
-
-        return {
-            'eval':"Humu humu!",
-            'score':"8.9"
-        }
-
-    def question_func(self):
-        Q = Query()
-        """Generates questions based on given cv/resume."""
-        results = self.db.search(Q.questions == "")
-        for row in results:
-            extracted_text = row.get('Resume/CV').get('extracted_text')
-            position = row.get('posisi_yang_diinginkan')
-            
-            response = generate_questions.create_interview_question(extracted_text,position)
-    
-            question = response
-            self.db.update({'question': question}, Q.phone_number == row.get('phone_number'))
+        signature = similarity.minhash(similarity.resume_text(row))
+        if signature is None:
+            return {}
+        own = str(row.get('phone_number'))
+        # Only this very submission is left out, a retry must not match itself
+        matches = self.resumes.query(signature, exclude=(own, row.get('timestamp')))
+        self.resumes.add(own, signature, row.get('timestamp'))
+        if not matches:
+            return {}
+
+        matches.sort(key=lambda match: match[0] != own)
+        phone_number, score = matches[0]
+        fields = {'near_duplicate_of': phone_number, 'resume_similarity': round(score, 3)}
+        for phone_number, score in matches if config.NEAR_DUP_REUSE else []:
+            earlier = row.get('previous_submission') if phone_number == own else self.db.get_response(phone_number)
+            if (earlier and earlier.get('questions') and earlier.get('resume_commentary')
+                    and earlier.get('posisi_yang_diinginkan') == row.get('posisi_yang_diinginkan')):
+                fields.update({
+                    'near_duplicate_of': phone_number,
+                    'resume_similarity': round(score, 3),
+                    'questions': earlier['questions'],
+                    'resume_commentary': earlier['resume_commentary'],
+                })
+                break
+
+        reused = 'questions' in fields
+        metrics.inc('near_duplicates_total', reused=str(reused).lower())
+        earlier = 'their previous submission' if fields['near_duplicate_of'] == own else fields['near_duplicate_of']
+        logger.info(f"♻️ Resume of {own} is a near-duplicate of {earlier} "
+                    f"({fields['resume_similarity']:.0%} similar){', questions reused' if reused else ''}")
+        return fields
 
     def check_sheets(self):
-        process_responses()
+        full_resync, self.full_resync = self.full_resync, False
+        process_responses(self.db, full_resync=full_resync)
+        # New rows are in the queue now
+        self.queue.notify()
 
 
 class AnswerPipeline:
-    def __init__(self,interval=180):
-        self.db = TinyDB(config.DATABASE_FILE)
+    def __init__(self, interval=180, sync=True, workers=True):
+        """
+        Syncs the answer sheet and runs the evaluation stage of the job queue:
+        answered -> evaluated.
+
+        :param interval: Time interval between answer sheet checks in seconds (default is 180 seconds).
+        :param sync: Run the answer sheet sync (only one process of a deployment should).
+        :param workers: Run the evaluation workers.
+        """
+        self.db = ResponseDB()
+        self.queue = JobQueue(self.db)
         self.interval = interval
+        self.sync = sync
         self.running = False
         self.thread = None
+        self.wake = threading.Event()
+        self.stages = [
+            StageWorkers(self.queue, STATUS_ANSWERED, self.eval_func, config.EVALUATION_STAGE_WORKERS,
+                         priority=lambda row: llm_scheduler.EVALUATION)
+        ] if workers else []
 
     def start(self):
         """Starts the background pipeline."""
         self.running = True
-        self.thread = threading.Thread(target=self.run_pipeline, daemon=True)
-        self.thread.start()
+        self.queue.recover()
+        for stage in self.stages:
+            stage.start()
+        if self.sync:
+            self.thread = threading.Thread(target=self.run_pipeline, daemon=True)
+            self.thread.start()
 
     def stop(self):
         """Stops the pipeline gracefully."""
         self.running = False
+        self.wake.set()
         if self.thread:
             self.thread.join()
+        for stage in self.stages:
+            stage.stop()
+        self.db.flush()
 
     def run_pipeline(self):
-        """Main loop that periodically checks the database."""
+        """Main loop that periodically checks the answer sheet and enqueues new answers."""
         while self.running:
-            self.eval_func()
-            time.sleep(self.interval)
-
-    def eval_func(self,row):
-        """Evaluates the answers based on the questions and the cv/resume."""
-        questions = row.get('questions')
-        answers = row.get('answers')
-        comment = evaluate_answers.make_commentary(questions,answers)
-        score = evaluate_answers.score_question(comment)
-         # [Chuck notes: prompt engineering needed]
-        
-        return {
-            'eval':comment,
-            'score':score # Remind me to regex this part
-        }
+            try:
+                self.check_answers()
+            except Exception as e:
+                logger.error(f"❌ Answer sheet check failed: {e}")
+                # Rebuild the Google clients next time, in case they are what broke
+                services.reset()
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def check_answers(self):
+        process_answer_responses(self.db)
+        # Answered rows are in the queue now
+        self.queue.notify()
 
+    def eval_func(self, rows):
+        """Evaluates the answers based on the questions, sending all rows to the LLM concurrently."""
+        # {'eval', 'score', 'per_question_scores'} with numeric scores, or None
+        return evaluate_answers.evaluate_candidates(
+            [(row.get('questions'), row.get('answers')) for row in rows]
+        )
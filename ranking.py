@@ -0,0 +1,270 @@
+import re
+import threading
+import zlib
+import numpy as np
+import config
+from datamanager import ResponseDB, STATUS_EVALUATED, derive_status
+from similarity import resume_text
+
+MAX_QUESTIONS = 10  # per-question score columns kept per candidate
+
+
+def hashed_term_frequencies(text, dimensions=config.RANKING_HASH_DIMENSIONS):
+    """
+    Hashing-trick term vector of a text: sublinear term frequencies
+    (1 + log tf) of its words, hashed into `dimensions` signed buckets.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    words = [word for word in re.findall(r'\w+', (text or '').casefold()) if len(word) > 1 and not word.isdigit()]
+    if not words:
+        return vector
+    hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words), dtype=np.uint32, count=len(words))
+    buckets, counts = np.unique(hashes, return_counts=True)
+    # The top bit of the hash picks the sign, so collisions tend to cancel out
+    signs = np.where(buckets & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, (buckets % dimensions).astype(np.intp), signs * (1 + np.log(counts)).astype(np.float32))
+    return vector
+
+
+def _normalise_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+class CandidateRanking:
+    """
+    Columnar in-memory snapshot of candidate features for ranking queries.
+
+    One row per candidate: evaluation score, per-question scores, desired
+    position and a hashed term-frequency vector of the resume text. TF-IDF
+    weights come from document frequencies over the whole snapshot, and
+    every query (shortlists, resume/position similarity) runs as NumPy
+    operations over the columns instead of scanning and sorting records.
+
+    The snapshot is refreshed incrementally: refresh() only reloads the
+    responses written since the last refresh (ResponseDB.changed_since).
+    """
+    def __init__(self, db=None, dimensions=config.RANKING_HASH_DIMENSIONS):
+        self.db = db or ResponseDB()
+        self.dimensions = dimensions
+        self.lock = threading.RLock()
+        self.seq = -1
+        self.size = 0
+        self.rows = {}  # phone number -> row
+        self.phone_numbers = []
+        self.names = []
+        self.timestamps = []
+        self.positions = []  # position names, indexed by position code
+        self.position_codes = {}
+        # Columns, the first `size` rows are in use
+        self.score = np.empty(0, dtype=np.float32)
+        self.question_scores = np.empty((0, MAX_QUESTIONS), dtype=np.float32)
+        self.position = np.empty(0, dtype=np.int32)
+        self.term_frequencies = np.empty((0, dimensions), dtype=np.float32)
+        self._allocate(64)
+        # TF-IDF matrix and position vectors, dropped on every change
+        self._weighted = None
+        self._idf = None
+        self._position_vectors = None
+
+    def _allocate(self, capacity):
+        """Grow the columns to `capacity` rows (doubling keeps appends amortised O(1))."""
+        def grow(column, fill):
+            new = np.full((capacity,) + column.shape[1:], fill, dtype=column.dtype)
+            new[:self.size] = column[:self.size]
+            return new
+
+        self.score = grow(self.score, np.nan)
+        self.question_scores = grow(self.question_scores, np.nan)
+        self.position = grow(self.position, -1)
+        self.term_frequencies = grow(self.term_frequencies, 0)
+
+    def _position_code(self, position):
+        position = str(position or '').strip()
+        if position not in self.position_codes:
+            self.position_codes[position] = len(self.positions)
+            self.positions.append(position)
+        return self.position_codes[position]
+
+    def _set_row(self, response):
+        phone_number = str(response.get('phone_number'))
+        row = self.rows.get(phone_number)
+        if row is None:
+            if self.size == len(self.score):
+                self._allocate(len(self.score) * 2)
+            row = self.rows[phone_number] = self.size
+            self.size += 1
+            self.phone_numbers.append(phone_number)
+            self.names.append(None)
+            self.timestamps.append(None)
+
+        self.names[row] = response.get('nama_lengkap')
+        self.timestamps[row] = response.get('timestamp')
+        self.position[row] = self._position_code(response.get('posisi_yang_diinginkan'))
+
+        score = response.get('score')
+        evaluated = derive_status(response) == STATUS_EVALUATED and isinstance(score, (int, float))
+        self.score[row] = float(score) if evaluated and not isinstance(score, bool) else np.nan
+        per_question = response.get('per_question_scores') or []
+        self.question_scores[row] = np.nan
+        values = [float(value) for value in per_question[:MAX_QUESTIONS] if isinstance(value, (int, float))]
+        self.question_scores[row, :len(values)] = values
+        self.term_frequencies[row] = hashed_term_frequencies(resume_text(response), self.dimensions)
+
+    def refresh(self):
+        """Load the responses written since the last refresh. Returns how many rows changed."""
+        with self.lock:
+            responses, seq = self.db.changed_since(self.seq)
+            for response in responses:
+                self._set_row(response)
+            self.seq = seq
+            if responses:
+                self._weighted = None
+                self._position_vectors = None
+            return len(responses)
+
+    def _tfidf(self):
+        """Row-normalised TF-IDF matrix of the snapshot, and the IDF weights."""
+        if self._weighted is None:
+            matrix = self.term_frequencies[:self.size]
+            document_frequency = np.count_nonzero(matrix, axis=0)
+            self._idf = (np.log((1 + self.size) / (1 + document_frequency)) + 1).astype(np.float32)
+            self._weighted = _normalise_rows(matrix * self._idf)
+        return self._weighted, self._idf
+
+    def _query_vectors(self, descriptions, idf):
+        return _normalise_rows(np.stack([
+            hashed_term_frequencies(description, self.dimensions) for description in descriptions
+        ]) * idf)
+
+    def _positions_tfidf(self):
+        """Normalised TF-IDF vector of every position's description, indexed by position code."""
+        if self._position_vectors is None:
+            _, idf = self._tfidf()
+            self._position_vectors = self._query_vectors(
+                [config.POSITION_DESCRIPTIONS.get(name, name) for name in self.positions] or [''], idf
+            )
+        return self._position_vectors
+
+    def match_scores(self, description):
+        """Cosine similarity (0-1) of every candidate's resume to a description, as an array."""
+        with self.lock:
+            self.refresh()
+            weighted, idf = self._tfidf()
+            return np.clip(weighted @ self._query_vectors([description], idf)[0], 0, 1)
+
+    def _results(self, rows, match=None, rank=None):
+        return [
+            {
+                'phone_number': self.phone_numbers[row],
+                'nama_lengkap': self.names[row],
+                'posisi_yang_diinginkan': self.positions[self.position[row]],
+                'timestamp': self.timestamps[row],
+                'score': None if np.isnan(self.score[row]) else float(self.score[row]),
+                'per_question_scores': [float(v) for v in self.question_scores[row] if not np.isnan(v)],
+                'match': None if match is None else round(float(match[row]), 3),
+                'rank_score': None if rank is None else round(float(rank[row]), 3),
+            }
+            for row in rows
+        ]
+
+    def _top(self, values, mask, k):
+        """Indices of the k largest values where mask is set, best first."""
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return candidates
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-values[candidates], k - 1)[:k]]
+        return top[np.argsort(-values[top], kind='stable')]
+
+    def shortlist(self, position=None, k=10, min_score=None, match_weight=config.RANKING_MATCH_WEIGHT,
+                  scored_only=True):
+        """
+        Top-k candidates, optionally for one desired position.
+
+        Candidates are ranked by (1 - match_weight) * score / 100 +
+        match_weight * how well the resume matches the position description.
+
+        Args:
+            position: desired position to shortlist for (all candidates if None)
+            k: number of candidates
+            min_score: leave out candidates scored below this
+            match_weight: share of the resume/position match in the rank (0-1)
+            scored_only: leave out candidates that were not evaluated yet
+
+        Returns:
+            list of candidate dicts with 'score', 'match' and 'rank_score', best first
+        """
+        with self.lock:
+            self.refresh()
+            size = self.size
+            mask = np.ones(size, dtype=bool)
+            if position is not None:
+                code = self.position_codes.get(str(position).strip())
+                if code is None:
+                    return []
+                mask &= self.position[:size] == code
+            score = self.score[:size]
+            if scored_only:
+                mask &= ~np.isnan(score)
+            if min_score is not None:
+                mask &= np.nan_to_num(score, nan=-np.inf) >= min_score
+
+            # Each candidate is matched against the position they applied for
+            rows = np.flatnonzero(mask)
+            weighted, _ = self._tfidf()
+            match = np.zeros(size, dtype=np.float32)
+            match[rows] = np.clip(
+                np.einsum('ij,ij->i', weighted[rows], self._positions_tfidf()[self.position[rows]]), 0, 1
+            )
+            rank = (1 - match_weight) * np.nan_to_num(score, nan=0.0) / 100 + match_weight * match
+            return self._results(self._top(rank, mask, k), match, rank)
+
+    def best_matches(self, description, k=10, position=None):
+        """Top-k candidates whose resume matches a free-text description (e.g. a job ad)."""
+        with self.lock:
+            match = self.match_scores(description)
+            mask = np.ones(self.size, dtype=bool)
+            if position is not None:
+                mask &= self.position[:self.size] == self.position_codes.get(str(position).strip(), -2)
+            return self._results(self._top(match, mask, k), match)
+
+    def position_fit(self, phone_number):
+        """How well one candidate's resume matches every known position, best first."""
+        with self.lock:
+            self.refresh()
+            row = self.rows.get(str(phone_number))
+            if row is None:
+                return []
+            weighted, _ = self._tfidf()
+            scores = np.clip(self._positions_tfidf() @ weighted[row], 0, 1)
+            return sorted(
+                ((name, round(float(score), 3)) for name, score in zip(self.positions, scores) if name),
+                key=lambda fit: fit[1], reverse=True
+            )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rank and shortlist candidates")
+    parser.add_argument("--position", help="Desired position to shortlist for (all if not given)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--min-score", type=float)
+    parser.add_argument("--match", metavar="TEXT", help="Rank resumes by similarity to this description instead")
+    parser.add_argument("--fit", metavar="PHONE_NUMBER", help="Show how one candidate fits every position")
+    args = parser.parse_args()
+
+    ranking = CandidateRanking()
+    if args.fit:
+        for name, fit in ranking.position_fit(args.fit):
+            print(f"{fit:.0%}  {name}")
+    else:
+        if args.match:
+            results = ranking.best_matches(args.match, args.top, args.position)
+        else:
+            results = ranking.shortlist(args.position, args.top, args.min_score)
+        for rank, candidate in enumerate(results, 1):
+            score = '-' if candidate['score'] is None else f"{candidate['score']:.0f}"
+            print(f"{rank:>3}. {candidate['nama_lengkap']} ({candidate['phone_number']}, "
+                  f"{candidate['posisi_yang_diinginkan']})  score {score}  match {candidate['match']:.0%}")
@@ -2,4 +2,36 @@ import re
 
 def extract_bracketed_text(text):
 
-    return re.findall(r'\[(.*?)\]', text)
\ No newline at end of file
+    return re.findall(r'\[(.*?)\]', text)
+
+class BracketParser:
+    """
+    Incremental version of extract_bracketed_text for streamed text.
+
+    feed() takes the text chunk by chunk and returns the bracketed items
+    that closed in that chunk. Like the regex, an item cannot span lines.
+    """
+    def __init__(self):
+        self.items = []
+        self.current = None
+
+    def feed(self, chunk):
+        closed = []
+        for char in chunk:
+            if self.current is None:
+                if char == '[':
+                    self.current = []
+            elif char == ']':
+                closed.append(''.join(self.current))
+                self.current = None
+            elif char == '\n':
+                self.current = None
+            else:
+                self.current.append(char)
+        self.items.extend(closed)
+        return closed
+
+def extract_score(text):
+    """Parse the number out of a '[Score: 87]' style reply. Returns None if there is none."""
+    match = re.search(r'\[\s*Score\s*:\s*(\d+(?:\.\d+)?)', text or '', re.IGNORECASE)
+    return float(match.group(1)) if match else None
@@ -0,0 +1,129 @@
+"""
+Long-lived Google API clients shared by every sync cycle.
+
+Credentials are read once, gspread is authorised once and the spreadsheet's
+worksheets are opened once. Drive services are built from the discovery
+document bundled with google-api-python-client (nothing is fetched) and
+pooled: a download thread borrows one and gives it back, so later cycles
+reuse the service and its open connections instead of building new ones.
+
+Both clients refresh their access token themselves when it expires. reset()
+drops everything so the next call starts again from the credentials file;
+the pipelines call it after a failed sheet check.
+
+The Google libraries are imported on first use, so code that never talks to
+Sheets or Drive does not load them.
+"""
+import threading
+from contextlib import contextmanager
+import config
+
+_lock = threading.Lock()
+_credentials = None
+_sheets_client = None
+_spreadsheet = None
+_worksheets = {}
+_idle_drive_services = []
+# id(service) -> generation it was built in; reset() starts a new generation
+_issued_drive_services = {}
+_generation = 0
+
+
+def load_credentials():
+    """Load the service account credentials."""
+    from oauth2client.service_account import ServiceAccountCredentials
+    return ServiceAccountCredentials.from_json_keyfile_name(
+        config.CREDENTIALS_FILE,
+        config.SCOPES
+    )
+
+
+def authorize_sheets(creds):
+    import gspread
+    client = gspread.authorize(creds)
+    client.set_timeout(config.SHEETS_REQUEST_TIMEOUT)
+    return client
+
+
+def build_drive_service(creds):
+    """
+    Build a Google Drive service (not thread-safe, use one per thread).
+
+    Its requests time out after config.DRIVE_REQUEST_TIMEOUT, so a stalled
+    download chunk raises instead of blocking the thread forever.
+    """
+    import httplib2
+    from googleapiclient.discovery import build
+    http = creds.authorize(httplib2.Http(timeout=config.DRIVE_REQUEST_TIMEOUT))
+    return build('drive', 'v3', http=http, cache_discovery=False, static_discovery=True)
+
+
+def credentials():
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            _credentials = load_credentials()
+        return _credentials
+
+
+def sheets_client():
+    global _sheets_client
+    creds = credentials()
+    with _lock:
+        if _sheets_client is None:
+            _sheets_client = authorize_sheets(creds)
+        return _sheets_client
+
+
+def worksheet(title):
+    """A worksheet of config.SPREADSHEET_NAME, opened on first use and kept."""
+    global _spreadsheet
+    client = sheets_client()
+    with _lock:
+        if _spreadsheet is None:
+            _spreadsheet = client.open(config.SPREADSHEET_NAME)
+        if title not in _worksheets:
+            _worksheets[title] = _spreadsheet.worksheet(title)
+        return _worksheets[title]
+
+
+def acquire_drive_service():
+    """Take an idle Drive service from the pool, or build one if none is free."""
+    with _lock:
+        if _idle_drive_services:
+            service = _idle_drive_services.pop()
+            _issued_drive_services[id(service)] = _generation
+            return service
+        generation = _generation
+    service = build_drive_service(credentials())
+    with _lock:
+        _issued_drive_services[id(service)] = generation
+    return service
+
+
+def release_drive_service(service):
+    """Give a Drive service back to the pool (dropped if reset() ran meanwhile)."""
+    with _lock:
+        if _issued_drive_services.pop(id(service), None) == _generation:
+            _idle_drive_services.append(service)
+
+
+@contextmanager
+def drive_service():
+    service = acquire_drive_service()
+    try:
+        yield service
+    finally:
+        release_drive_service(service)
+
+
+def reset():
+    """Forget every client; the next call re-reads the credentials and rebuilds them."""
+    global _credentials, _sheets_client, _spreadsheet, _generation
+    with _lock:
+        _credentials = None
+        _sheets_client = None
+        _spreadsheet = None
+        _worksheets.clear()
+        _idle_drive_services.clear()
+        _generation += 1
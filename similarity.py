@@ -0,0 +1,234 @@
+import array
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import config
+
+# MinHash signature: NUM_PERMUTATIONS hash functions (a * x + b) mod p.
+# LSH splits it into BANDS bands of ROWS values; two resumes become match
+# candidates when any band is identical. With 32 x 4, resumes of 0.5
+# similarity are found ~87% of the time and of 0.8 or more practically always.
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_WORDS = 3
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Fixed seed: signatures must stay comparable across runs and processes
+_rng = random.Random(9000)
+PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def shingles(text):
+    """Set of hashed word 3-grams of the normalised text (case and punctuation ignored)."""
+    words = re.findall(r'\w+', text.casefold())
+    if len(words) < SHINGLE_WORDS:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))} if words else set()
+    return {
+        zlib.crc32(' '.join(words[i:i + SHINGLE_WORDS]).encode('utf-8'))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def minhash(text):
+    """MinHash signature of a text (tuple of NUM_PERMUTATIONS ints), or None if it has no words."""
+    hashes = shingles(text or '')
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS)
+
+
+def estimate_similarity(signature, other):
+    """Estimated Jaccard similarity of the two texts' shingle sets."""
+    return sum(x == y for x, y in zip(signature, other)) / NUM_PERMUTATIONS
+
+
+def band_keys(signature):
+    """One bucket key per LSH band."""
+    return [
+        zlib.crc32(array.array('q', signature[band * ROWS:(band + 1) * ROWS]).tobytes())
+        for band in range(BANDS)
+    ]
+
+
+class ResumeIndex:
+    """
+    Persistent MinHash/LSH index of resume texts (SQLite).
+
+    Every indexed candidate has the signature of its latest submission
+    (and that submission's timestamp) and one bucket row per LSH band. A
+    query only compares against the candidates that share a bucket with it,
+    so lookups stay fast as the number of applicants grows.
+    """
+    def __init__(self, db_path=config.RESUME_INDEX_FILE):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                "phone_number TEXT PRIMARY KEY, signature BLOB NOT NULL, indexed_at REAL NOT NULL, timestamp TEXT)"
+            )
+            columns = [column[1] for column in self.conn.execute("PRAGMA table_info(signatures)")]
+            if 'timestamp' not in columns:
+                self.conn.execute("ALTER TABLE signatures ADD COLUMN timestamp TEXT")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS bands ("
+                "band INTEGER NOT NULL, bucket INTEGER NOT NULL, phone_number TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_bucket ON bands (band, bucket)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_phone ON bands (phone_number)")
+
+    def add(self, phone_number, signature, timestamp=None):
+        """Index (or re-index) a candidate's resume signature; `timestamp` is the submission's form timestamp."""
+        phone_number = str(phone_number)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM bands WHERE phone_number = ?", (phone_number,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO signatures (phone_number, signature, indexed_at, timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (phone_number, array.array('q', signature).tobytes(), time.time(),
+                 None if timestamp is None else str(timestamp))
+            )
+            self.conn.executemany(
+                "INSERT INTO bands (band, bucket, phone_number) VALUES (?, ?, ?)",
+                [(band, bucket, phone_number) for band, bucket in enumerate(band_keys(signature))]
+            )
+
+    def remove(self, phone_number):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM bands WHERE phone_number = ?", (str(phone_number),))
+            self.conn.execute("DELETE FROM signatures WHERE phone_number = ?", (str(phone_number),))
+
+    def signature(self, phone_number):
+        """Stored signature of a candidate, or None if not indexed."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT signature FROM signatures WHERE phone_number = ?", (str(phone_number),)
+            ).fetchone()
+        return tuple(array.array('q', row[0])) if row else None
+
+    def query(self, signature, threshold=None, exclude=None, limit=None):
+        """
+        Find indexed candidates whose resume is similar to the given signature.
+
+        Args:
+            signature: minhash() of the resume to look up
+            threshold: minimum estimated similarity (config.NEAR_DUP_THRESHOLD)
+            exclude: phone number to leave out (the candidate itself), or a
+                     (phone number, timestamp) tuple to leave out only that
+                     submission, so a candidate's earlier submission still matches
+            limit: maximum number of matches
+
+        Returns:
+            list of (phone_number, similarity), most similar first
+        """
+        threshold = config.NEAR_DUP_THRESHOLD if threshold is None else threshold
+        exclude_phone, exclude_timestamp = exclude if isinstance(exclude, tuple) else (exclude, None)
+        exclude_phone = str(exclude_phone) if exclude_phone is not None else None
+        exclude_timestamp = str(exclude_timestamp) if exclude_timestamp is not None else None
+        with self.lock:
+            candidates = set()
+            for band, bucket in enumerate(band_keys(signature)):
+                candidates.update(phone for phone, in self.conn.execute(
+                    "SELECT phone_number FROM bands WHERE band = ? AND bucket = ?", (band, bucket)
+                ))
+            rows = self.conn.execute(
+                f"SELECT phone_number, signature, timestamp FROM signatures "
+                f"WHERE phone_number IN ({','.join('?' * len(candidates))})",
+                list(candidates)
+            ).fetchall() if candidates else []
+
+        matches = []
+        for phone_number, blob, timestamp in rows:
+            if phone_number == exclude_phone and (not isinstance(exclude, tuple) or timestamp == exclude_timestamp):
+                continue
+            similarity = estimate_similarity(signature, array.array('q', blob))
+            if similarity >= threshold:
+                matches.append((phone_number, similarity))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches[:limit] if limit else matches
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def resume_text(response):
+    """Extracted resume text of a stored response, or None if there is none usable."""
+    text = (response.get('Resume/CV') or {}).get('extracted_text')
+    if not text or text.startswith("Error processing"):
+        return None
+    return text
+
+
+def rebuild(db, index):
+    """Index the resume of every stored response. Returns the number indexed."""
+    indexed = 0
+    for response in db.all_responses():
+        signature = minhash(resume_text(response))
+        if signature:
+            index.add(response['phone_number'], signature, response.get('timestamp'))
+            indexed += 1
+    return indexed
+
+
+def similar_candidates(db, index, phone_number, threshold=config.SIMILAR_CANDIDATES_THRESHOLD, limit=10):
+    """
+    Recruiter lookup: stored candidates whose resume resembles this candidate's.
+
+    Returns:
+        list of dicts with 'phone_number', 'nama_lengkap', 'posisi_yang_diinginkan',
+        'timestamp' and 'similarity' (0-1), most similar first
+    """
+    signature = index.signature(phone_number)
+    if signature is None:
+        response = db.get_response(phone_number)
+        signature = minhash(resume_text(response)) if response else None
+    if signature is None:
+        return []
+
+    similar = []
+    for other, similarity in index.query(signature, threshold, exclude=phone_number, limit=limit):
+        response = db.get_response(other) or {}
+        similar.append({
+            'phone_number': other,
+            'nama_lengkap': response.get('nama_lengkap'),
+            'posisi_yang_diinginkan': response.get('posisi_yang_diinginkan'),
+            'timestamp': response.get('timestamp'),
+            'similarity': round(similarity, 3),
+        })
+    return similar
+
+
+if __name__ == "__main__":
+    import argparse
+    from datamanager import ResponseDB
+
+    parser = argparse.ArgumentParser(description="Resume near-duplicate index")
+    parser.add_argument("--rebuild", action="store_true", help="Index the resume of every stored response")
+    parser.add_argument("--similar", metavar="PHONE_NUMBER", help="List candidates with a similar resume")
+    parser.add_argument("--threshold", type=float, default=config.SIMILAR_CANDIDATES_THRESHOLD)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    db = ResponseDB()
+    index = ResumeIndex()
+    if args.rebuild:
+        print(f"🗂️ Indexed {rebuild(db, index)} resumes")
+    if args.similar:
+        matches = similar_candidates(db, index, args.similar, args.threshold, args.limit)
+        if not matches:
+            print("No similar candidates found")
+        for match in matches:
+            print(f"{match['similarity']:.0%}  {match['phone_number']}  {match['nama_lengkap']}  "
+                  f"({match['posisi_yang_diinginkan']}, {match['timestamp']})")